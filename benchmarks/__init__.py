@@ -0,0 +1 @@
+# 离线基准测试：本地模拟服务（mock_server）和计时场景（run）
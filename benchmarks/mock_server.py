@@ -0,0 +1,229 @@
+# 本地模拟的和风天气服务：回放 payloads/ 中录制的响应，可配置延迟、错误率和429限流
+# 单独运行：python -m benchmarks.mock_server --port 8080 --latency 0.05
+import os
+import re
+import json
+import time
+import zlib
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from datetime import datetime, timedelta
+
+PAYLOAD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "payloads")
+
+# 接口路径 -> 录制文件
+ROUTES = {
+    "/v2/city/lookup": "city_lookup.json",
+    "/v7/weather/now": "weather_now.json",
+    "/v7/weather/3d": "weather_3d.json",
+    "/v7/weather/24h": "weather_24h.json",
+    "/v7/indices/1d": "indices_1d.json",
+}
+
+# 其他天数/小时数的预报由 3d / 24h 的录制数据循环展开，如 /v7/weather/15d、/v7/weather/168h
+EXPANDED_ROUTE = re.compile(r"^/v7/weather/(\d+)([dh])$")
+
+# 配置中各接口URL对应的路径
+CONFIG_URLS = {
+    "CITY_SEARCH_URL": "/v2/city/lookup",
+    "WEATHER_URL": "/v7/weather/now",
+    "FORECAST_URL": "/v7/weather/3d",
+    "FORECAST_DAYS_URL": "/v7/weather/{}d",
+    "HOURLY_URL": "/v7/weather/{}h",
+    "INDEX_URL": "/v7/indices/1d",
+}
+
+
+def make_city_id(name):
+    # 录制数据中没有的城市按名称生成稳定的ID
+    return "10" + str(zlib.crc32(name.encode("utf-8")) % 10 ** 7).zfill(7)
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # 响应头和响应体分两次写出，不关闭Nagle算法时每个keep-alive请求都要多等一次延迟ACK（约40毫秒）
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server.mock
+        parts = urlsplit(self.path)
+        params = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        server.record(parts.path)
+        delay = server.get_delay()
+        if delay > 0:
+            time.sleep(delay)
+
+        payload = server.get_payload(parts.path)
+        if payload is None:
+            return self.send_json(404, {"code": "404"})
+        outcome = server.draw_outcome()
+        if outcome == "throttle":
+            return self.send_json(429, {"code": "429"}, {"Retry-After": "1"})
+        if outcome == "error":
+            return self.send_json(500, {"code": "500"})
+        self.send_json(200, server.render(parts.path, payload, params))
+
+    def send_json(self, status, body, headers=None):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+        self.server.mock.record_bytes(len(data))
+
+
+# 默认的监听队列只有5个连接，并发客户端超出后要等TCP重传SYN（约1秒），测到的是模拟服务本身的瓶颈
+class MockHTTPServer(ThreadingHTTPServer):
+    request_queue_size = 128
+    daemon_threads = True
+
+
+class MockQWeatherServer:
+    def __init__(self, latency=0.05, jitter=0.0, error_rate=0.0, throttle_rate=0.0,
+                 seed=None, payload_dir=PAYLOAD_DIR, host="127.0.0.1", port=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.random = random.Random(seed)
+        self.host = host
+        self.port = port
+        self.payloads = {}
+        for path, filename in ROUTES.items():
+            with open(os.path.join(payload_dir, filename), "r", encoding="utf-8") as f:
+                self.payloads[path] = json.load(f)
+        self.counts = {}  # 接口路径 -> 请求次数
+        self.bytes_sent = 0
+        self.lock = threading.Lock()
+        self.httpd = None
+        self.thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.httpd.server_address[1]}"
+
+    def start(self):
+        self.httpd = MockHTTPServer((self.host, self.port), MockHandler)
+        self.httpd.mock = self
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self.base_url
+
+    def stop(self):
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+
+    def apply_to_config(self, config):
+        # 把 weather_core.config 中的接口地址指向本地服务
+        for name, path in CONFIG_URLS.items():
+            setattr(config, name, self.base_url + path)
+
+    def record(self, path):
+        with self.lock:
+            self.counts[path] = self.counts.get(path, 0) + 1
+
+    def record_bytes(self, size):
+        with self.lock:
+            self.bytes_sent += size
+
+    def reset_counts(self):
+        with self.lock:
+            counts, self.counts = self.counts, {}
+            self.bytes_sent = 0
+        return counts
+
+    def get_delay(self):
+        with self.lock:
+            return self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+
+    def draw_outcome(self):
+        with self.lock:
+            value = self.random.random()
+        if value < self.throttle_rate:
+            return "throttle"
+        if value < self.throttle_rate + self.error_rate:
+            return "error"
+        return "ok"
+
+    def get_payload(self, path):
+        if path in self.payloads:
+            return self.payloads[path]
+        match = EXPANDED_ROUTE.match(path)
+        if match is None:
+            return None
+        count, unit = int(match.group(1)), match.group(2)
+        if unit == "d":
+            return self.expand(self.payloads["/v7/weather/3d"], "daily", "fxDate", count, timedelta(days=1))
+        return self.expand(self.payloads["/v7/weather/24h"], "hourly", "fxTime", count, timedelta(hours=1))
+
+    @staticmethod
+    def expand(payload, list_key, time_key, count, step):
+        # 循环使用录制的条目，时间字段按步长顺延
+        items = payload[list_key]
+        time_format = "%Y-%m-%d" if time_key == "fxDate" else "%Y-%m-%dT%H:%M%z"
+        start = datetime.strptime(items[0][time_key].replace("+08:00", "+0800"), time_format)
+        expanded = []
+        for i in range(count):
+            value = (start + step * i).strftime(time_format)
+            if time_key == "fxTime":
+                value = value[:-2] + ":" + value[-2:]
+            expanded.append(dict(items[i % len(items)], **{time_key: value}))
+        return dict(payload, **{list_key: expanded})
+
+    def render(self, path, payload, params):
+        # 按请求参数调整录制的响应：城市搜索返回查询的城市名，生活指数只返回请求的类型
+        if path == "/v2/city/lookup":
+            query = params.get("location", "")
+            locations = [item for item in payload["location"] if item["name"] == query]
+            if not locations:
+                locations = [dict(payload["location"][0], name=query, id=make_city_id(query))]
+            return dict(payload, location=locations)
+        if path == "/v7/indices/1d":
+            types = params.get("type", "").split(",")
+            return dict(payload, daily=[item for item in payload["daily"] if item["type"] in types])
+        return payload
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.mock_server", description="本地模拟的和风天气服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.05, help="每个请求的固定延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="在固定延迟上叠加的随机延迟上限（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回500的比例")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="返回429的比例")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    server = MockQWeatherServer(args.latency, args.jitter, args.error_rate, args.throttle_rate,
+                                args.seed, host=args.host, port=args.port)
+    print(f"模拟服务已启动: {server.start()}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+# 离线基准测试：在本地模拟服务上计时主要的刷新路径，结果可保存为JSON，便于在不同提交之间比较
+#   python -m benchmarks.run --repeat 5 --cities 100 -o results.json
+#   python -m benchmarks.run -o new.json --compare results.json --max-regression 0.2
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import platform
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+from weather_core import config
+
+from .mock_server import MockQWeatherServer
+
+CITY_ID = "101010100"
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {}  # 名称 -> 场景函数
+
+
+class SkipScenario(Exception):
+    pass
+
+
+def scenario(name):
+    def register(func):
+        SCENARIOS[name] = func
+        return func
+    return register
+
+
+# 运行环境：模拟服务、独立的缓存目录，以及按次计时的辅助方法
+class BenchContext:
+    def __init__(self, args, server, cache_dir):
+        self.args = args
+        self.server = server
+        self.cache_dir = cache_dir
+        self.city_ids = [f"1{index:08d}" for index in range(args.cities)]
+
+    def reset_cache(self):
+        # 清空内存缓存和磁盘缓存，模拟冷启动
+        from weather_core.cache import CacheManager
+        from weather_core.history import history_store
+
+        CacheManager.memory.clear()
+        CacheManager.close()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        history_store.last_ts.clear()
+
+    def measure(self, func, setup=None):
+        # 每次计时前执行setup（不计入耗时），返回各次的耗时（秒）
+        samples = []
+        for _ in range(self.args.repeat):
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            func()
+            samples.append(time.perf_counter() - start)
+        return samples
+
+
+@scenario("life_indices_cold")
+def bench_life_indices_cold(ctx):
+    from weather_core.api import get_all_life_indices
+    return ctx.measure(lambda: get_all_life_indices(CITY_ID), setup=ctx.reset_cache)
+
+
+@scenario("life_indices_warm")
+def bench_life_indices_warm(ctx):
+    from weather_core.api import get_all_life_indices
+    ctx.reset_cache()
+    get_all_life_indices(CITY_ID)
+    ctx.server.reset_counts()
+    return ctx.measure(lambda: get_all_life_indices(CITY_ID))
+
+
+@scenario("cache_cold")
+def bench_cache_cold(ctx):
+    # 条目都在磁盘上、内存缓存为空（包括打开缓存数据库的耗时）
+    from weather_core.cache import CacheManager
+    ctx.reset_cache()
+    payload = ctx.server.payloads["/v7/weather/now"]["now"]
+    for city_id in ctx.city_ids:
+        CacheManager.save_to_cache(city_id, payload, "weather")
+
+    def setup():
+        CacheManager.memory.clear()
+        CacheManager.close()
+
+    return ctx.measure(lambda: [CacheManager.get_cache_entry(city_id, "weather") for city_id in ctx.city_ids],
+                       setup=setup)
+
+
+@scenario("cache_warm")
+def bench_cache_warm(ctx):
+    from weather_core.cache import CacheManager
+    ctx.reset_cache()
+    payload = ctx.server.payloads["/v7/weather/now"]["now"]
+    for city_id in ctx.city_ids:
+        CacheManager.save_to_cache(city_id, payload, "weather")
+    return ctx.measure(lambda: [CacheManager.get_cache_entry(city_id, "weather") for city_id in ctx.city_ids])
+
+
+@scenario("bulk_refresh_threaded")
+def bench_bulk_refresh_threaded(ctx):
+    from weather_core.api import get_weather_batch
+    return ctx.measure(lambda: get_weather_batch(ctx.city_ids, max_workers=ctx.args.workers), setup=ctx.reset_cache)
+
+
+@scenario("bulk_refresh_async")
+def bench_bulk_refresh_async(ctx):
+    from weather_core.aio import AsyncWeatherClient, aiohttp
+    if aiohttp is None:
+        raise SkipScenario("未安装aiohttp")
+
+    async def refresh():
+        async with AsyncWeatherClient() as client:
+            return await client.get_weather_batch(ctx.city_ids)
+
+    return ctx.measure(lambda: asyncio.run(refresh()), setup=ctx.reset_cache)
+
+
+# 完整刷新需要加载的数据：实时天气、逐日预报、生活指数三个表格（与按标签页懒加载之前的刷新相同）
+FULL_REFRESH_PARTS = ("current", "forecast", "indices")
+
+
+@scenario("update_all_weather_data")
+def bench_update_all_weather_data(ctx):
+    # 界面的完整刷新：从发起请求到三个表格都更新完成
+    # update_all_weather_data 只请求当前标签页的数据，其余标签页的数据在这里一并请求
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    try:
+        from PyQt5.QtWidgets import QApplication
+    except ImportError:
+        raise SkipScenario("未安装PyQt5")
+    if PROJECT_DIR not in sys.path:
+        sys.path.insert(0, PROJECT_DIR)
+    from weather_app_optimized import WeatherApp
+
+    app = QApplication.instance() or QApplication(["benchmark"])
+    ctx.reset_cache()
+    window = WeatherApp()
+    window.current_city_id = CITY_ID
+    window.current_city_name = "北京"
+    app.processEvents()
+
+    def refresh():
+        window.update_all_weather_data()
+        window.request_parts([name for name in FULL_REFRESH_PARTS if name not in window.loaded_parts])
+        deadline = time.monotonic() + 30
+        while window.pending_updates and time.monotonic() < deadline:
+            app.processEvents()
+            time.sleep(0.001)
+        app.processEvents()
+
+    try:
+        return ctx.measure(refresh, setup=ctx.reset_cache)
+    finally:
+        window.close()
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        "min": ordered[0],
+        "median": statistics.median(ordered),
+        "mean": statistics.mean(ordered),
+        "p95": ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))],
+        "stdev": statistics.stdev(ordered) if len(ordered) > 1 else 0.0,
+    }
+
+
+def run_scenario(name, ctx):
+    from weather_core.metrics import metrics
+
+    metrics.reset()
+    ctx.server.reset_counts()
+    result = {"name": name}
+    try:
+        samples = SCENARIOS[name](ctx)
+    except SkipScenario as e:
+        result.update(status="skipped", reason=str(e))
+        return result
+    requests = ctx.server.reset_counts()
+    result.update(status="ok", samples=samples, **summarize(samples))
+    # 每次运行平均的请求数、重试次数，用于发现缓存或合并请求失效
+    result["requests_per_run"] = {path: count / len(samples) for path, count in sorted(requests.items())}
+    result["retries_per_run"] = sum(value for _, value in metrics.collect("weather_http_retries_total")) / len(samples)
+    return result
+
+
+def get_commit():
+    try:
+        output = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_DIR,
+                                capture_output=True, text=True, timeout=10)
+        return output.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(results, baseline, max_regression):
+    # 按中位数比较，返回超出允许回退比例的场景
+    baseline_scenarios = {item["name"]: item for item in baseline.get("scenarios", []) if item.get("status") == "ok"}
+    regressions = []
+    print(f"\n与基线 {baseline.get('commit') or '-'} 比较（中位数）:")
+    if baseline.get("settings") != results["settings"]:
+        print("  注意：基线的运行参数与本次不同，结果不能直接比较")
+    for item in results["scenarios"]:
+        base = baseline_scenarios.get(item["name"])
+        if item.get("status") != "ok" or base is None:
+            continue
+        ratio = item["median"] / base["median"] if base["median"] else float("inf")
+        flag = ""
+        if max_regression is not None and ratio > 1 + max_regression:
+            flag = "  <- 回退"
+            regressions.append(item["name"])
+        print(f"  {item['name']:<26} {base['median'] * 1000:9.2f} ms -> {item['median'] * 1000:9.2f} ms  x{ratio:.2f}{flag}")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description="在本地模拟服务上运行基准测试")
+    parser.add_argument("-s", "--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="要运行的场景，可重复指定（默认全部）")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="每个场景的计时次数")
+    parser.add_argument("-n", "--cities", type=int, default=100, help="批量刷新和缓存场景的城市数")
+    parser.add_argument("-w", "--workers", type=int, default=8, help="线程批量刷新的线程数")
+    parser.add_argument("--latency", type=float, default=0.05, help="模拟服务每个请求的延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="叠加的随机延迟上限（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="模拟服务返回500的比例")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="模拟服务返回429的比例")
+    parser.add_argument("--seed", type=int, default=0, help="错误注入和随机延迟的随机种子")
+    parser.add_argument("-o", "--output", help="结果写入的JSON文件（- 为标准输出）")
+    parser.add_argument("--compare", help="与之比较的基线结果JSON")
+    parser.add_argument("--max-regression", type=float,
+                        help="允许的中位数回退比例（如0.2），超出时退出码为1")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    names = args.scenario or list(SCENARIOS)
+    cache_dir = tempfile.mkdtemp(prefix="weather-bench-")
+
+    # 在导入请求模块之前修改配置：缓存写到临时目录，配额不限制基准测试
+    # 关闭熔断，注入的500错误偶尔连续出现时不会改变后续请求的行为
+    config.CACHE_DIR = cache_dir
+    config.QUOTA_PER_DAY = 10 ** 9
+    config.QUOTA_PER_MINUTE = 10 ** 9
+    config.QUOTA_ENDPOINT_PER_MINUTE = {}
+    config.BREAKER_ENABLED = False
+
+    server = MockQWeatherServer(args.latency, args.jitter, args.error_rate, args.throttle_rate, args.seed)
+    results = {
+        "commit": get_commit(),
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {key: getattr(args, key) for key in ("repeat", "cities", "workers", "latency", "jitter",
+                                                          "error_rate", "throttle_rate", "seed")},
+        "scenarios": [],
+    }
+    try:
+        with server:
+            server.apply_to_config(config)
+            ctx = BenchContext(args, server, cache_dir)
+            for name in names:
+                result = run_scenario(name, ctx)
+                results["scenarios"].append(result)
+                if result["status"] == "ok":
+                    print(f"{name:<26} median {result['median'] * 1000:9.2f} ms  min {result['min'] * 1000:9.2f} ms  "
+                          f"p95 {result['p95'] * 1000:9.2f} ms", file=sys.stderr)
+                else:
+                    print(f"{name:<26} 跳过: {result['reason']}", file=sys.stderr)
+    finally:
+        from weather_core.cache import CacheManager
+        CacheManager.close()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    if args.output == "-":
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    elif args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.max_regression):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
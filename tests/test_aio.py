@@ -0,0 +1,44 @@
+import asyncio
+import time
+
+import pytest
+
+from weather_core import config
+from weather_core.cache import CacheManager
+from weather_core.cities import CityIndex
+from weather_core.http import ApiClient
+
+pytest.importorskip("aiohttp")
+from weather_core import aio  # noqa: E402
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    # 本地城市索引为空，所有请求都因配额不足被拒绝
+    monkeypatch.setattr(config, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(aio, "city_index", CityIndex(path=str(tmp_path / "missing.csv")))
+    CacheManager.close()
+    CacheManager.memory.clear()
+    client = aio.AsyncWeatherClient()
+
+    async def get_json(url, params, timeout=5, max_retries=None):
+        return None, ApiClient.QUOTA_ERROR
+
+    monkeypatch.setattr(client, "get_json", get_json)
+    yield client
+    CacheManager.close()
+    CacheManager.memory.clear()
+
+
+def test_city_id_falls_back_to_last_known_when_quota_is_exhausted(client):
+    # 超过城市缓存有效期的旧条目
+    expired = time.time() - config.CACHE_TTL["city"] - 60
+    CacheManager.get_backend().save("朝阳区", {"id": "101010300", "name": "朝阳"}, "city", expired)
+
+    async def run():
+        async with client:
+            return await client.get_city_id("朝阳区"), await client.get_city_id("朝阳市")
+
+    found, missing = asyncio.run(run())
+    assert found == ("101010300", "朝阳")
+    assert missing == (None, ApiClient.QUOTA_ERROR)
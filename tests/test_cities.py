@@ -0,0 +1,42 @@
+import pytest
+
+from weather_core import api, config
+from weather_core.cache import CacheManager
+from weather_core.cities import CityIndex, normalize_city_name
+
+
+def test_normalize_keeps_district_and_county_suffixes():
+    assert normalize_city_name("北京市") == normalize_city_name("北京") == "北京"
+    assert normalize_city_name("Bei Jing") == "beijing"
+    assert normalize_city_name("朝阳区") == "朝阳区"
+    assert normalize_city_name("吉林省") != normalize_city_name("吉林市")
+
+
+@pytest.fixture
+def lookup_api(tmp_path, monkeypatch):
+    # 城市搜索API按查询名称返回不同的地点，本地城市索引为空
+    monkeypatch.setattr(config, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(api, "city_index", CityIndex(path=str(tmp_path / "missing.csv")))
+    locations = {"朝阳区": ("101010300", "朝阳"), "朝阳市": ("101071201", "朝阳")}
+    queries = []
+
+    def get_json(url, params, timeout=5, max_retries=3):
+        queries.append(params["location"])
+        location_id, name = locations[params["location"]]
+        return {"code": "200", "location": [{"id": location_id, "name": name}]}, None
+
+    monkeypatch.setattr(api.api_client, "get_json", get_json)
+    CacheManager.close()
+    CacheManager.memory.clear()
+    yield queries
+    CacheManager.close()
+    CacheManager.memory.clear()
+
+
+def test_district_and_prefecture_are_cached_separately(lookup_api):
+    assert api.get_city_id("朝阳区") == ("101010300", "朝阳")
+    assert api.get_city_id("朝阳市") == ("101071201", "朝阳")
+    # 再次查询命中缓存或本地索引，仍然各自对应正确的地点
+    assert api.get_city_id("朝阳区") == ("101010300", "朝阳")
+    assert api.get_city_id("朝阳市") == ("101071201", "朝阳")
+    assert lookup_api == ["朝阳区", "朝阳市"]
@@ -0,0 +1,87 @@
+import threading
+
+from weather_core.concurrency import RequestCancelled, SingleFlight, cancel_scope
+
+
+def run_concurrently(calls):
+    results = [None] * len(calls)
+
+    def run(position, func, args, kwargs):
+        results[position] = func(*args, **kwargs)
+
+    threads = [threading.Thread(target=run, args=(position,) + call) for position, call in enumerate(calls)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return results
+
+
+def make_fetch(single_flight, release):
+    # release 之前被合并的函数不返回，保证各个调用确实是并发的
+    @single_flight.coalesce("index")
+    def fetch(city_id, index_type="5"):
+        release.wait(5)
+        return city_id, index_type
+    return fetch
+
+
+def test_keyword_arguments_are_part_of_the_key():
+    single_flight = SingleFlight()
+    release = threading.Event()
+    fetch = make_fetch(single_flight, release)
+
+    threading.Timer(0.2, release.set).start()
+    results = run_concurrently([(fetch, ("101010100",), {"index_type": "1"}),
+                                (fetch, ("101010100",), {"index_type": "3"})])
+
+    assert results == [("101010100", "1"), ("101010100", "3")]
+    assert single_flight.get_stats()["deduplicated"] == 0
+
+
+def test_keyword_and_positional_arguments_share_a_call():
+    single_flight = SingleFlight()
+    release = threading.Event()
+    fetch = make_fetch(single_flight, release)
+
+    threading.Timer(0.2, release.set).start()
+    results = run_concurrently([(fetch, ("101010100", "5"), {}),
+                                (fetch, ("101010100",), {"index_type": "5"}),
+                                (fetch, ("101010100",), {})])
+
+    assert results == [("101010100", "5")] * 3
+    assert single_flight.get_stats() == {"executed": 1, "deduplicated": 2, "in_flight": 0}
+
+
+def test_follower_reruns_when_the_leader_is_cancelled():
+    single_flight = SingleFlight()
+    leader_started = threading.Event()
+    cancel = threading.Event()
+    calls = []
+
+    @single_flight.coalesce("weather")
+    def fetch(city_id):
+        calls.append(city_id)
+        if len(calls) == 1:
+            leader_started.set()
+            if cancel.wait(5):
+                raise RequestCancelled(city_id)
+        return city_id
+
+    def leader():
+        with cancel_scope(cancel):
+            try:
+                return fetch("101010100")
+            except RequestCancelled as e:
+                return e
+
+    def follower():
+        leader_started.wait(5)
+        threading.Timer(0.2, cancel.set).start()
+        return fetch("101010100")
+
+    results = run_concurrently([(leader, (), {}), (follower, (), {})])
+
+    assert isinstance(results[0], RequestCancelled)
+    assert results[1] == "101010100"
+    assert calls == ["101010100", "101010100"]
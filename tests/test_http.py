@@ -0,0 +1,38 @@
+import threading
+import time
+
+import pytest
+
+from benchmarks.mock_server import MockQWeatherServer
+from weather_core import config
+from weather_core.concurrency import RequestCancelled, cancel_scope
+from weather_core.http import ApiClient, RetryPolicy
+
+
+@pytest.fixture
+def failing_url(tmp_path, monkeypatch):
+    # 所有请求都返回500；配额状态写到临时目录
+    monkeypatch.setattr(config, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "BREAKER_ENABLED", False)
+    server = MockQWeatherServer(latency=0, error_rate=1.0, seed=0)
+    server.start()
+    yield server.base_url + "/v7/weather/now"
+    server.stop()
+
+
+def test_cancel_interrupts_retry_backoff(failing_url):
+    # 重试等待至少5秒，取消后应立即结束
+    client = ApiClient(retry_policy=RetryPolicy(max_retries=3, backoff_base=10, backoff_max=10))
+    cancel = threading.Event()
+    threading.Timer(0.2, cancel.set).start()
+
+    started = time.monotonic()
+    with cancel_scope(cancel), pytest.raises(RequestCancelled):
+        client.get_json(failing_url, {"location": "101010100"})
+    assert time.monotonic() - started < 2
+
+
+def test_requests_outside_a_cancel_scope_are_not_affected(failing_url):
+    client = ApiClient(retry_policy=RetryPolicy(max_retries=2, backoff_base=0))
+    data, error = client.get_json(failing_url, {"location": "101010100"})
+    assert data is None and "500" in error
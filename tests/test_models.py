@@ -0,0 +1,30 @@
+import math
+
+from weather_core.models import NowWeather, DailyForecast, WeatherBatch, format_number
+
+
+def test_now_weather_round_trip():
+    payload = {"obsTime": "2026-10-17T08:00+08:00", "text": "晴", "temp": "20", "precip": "1.5", "windScale": "1-2"}
+    now = NowWeather.from_api(payload)
+
+    assert now.temp == 20.0 and now.precip == 1.5 and now.cloud is None
+    assert now.wind_scale == "1-2"
+    assert now.to_api() == payload
+    assert format_number(now.temp) == "20"
+
+
+def test_daily_forecast_parses_numbers():
+    day = DailyForecast.from_api({"fxDate": "2026-10-17", "tempMin": "8", "tempMax": "19", "uvIndex": "3"})
+
+    assert (day.temp_min, day.temp_max, day.uv_index) == (8.0, 19.0, 3)
+
+
+def test_batch_from_results_keeps_errors():
+    batch = WeatherBatch.from_results({"101010100": ({"temp": "20", "text": "晴"}, None),
+                                       "101020100": (None, "请求超时")})
+
+    assert len(batch) == 1 and "101010100" in batch
+    assert batch.errors == {"101020100": "请求超时"}
+    assert list(batch.column("temp")) == [20.0]
+    assert math.isnan(batch.column("humidity")[0])
+    assert batch.get("101010100").text == "晴"
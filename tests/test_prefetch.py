@@ -0,0 +1,36 @@
+import pytest
+
+from benchmarks.mock_server import CONFIG_URLS, MockQWeatherServer
+from weather_core import api, config
+from weather_core.cache import CacheManager
+from weather_core.prefetch import Prefetcher
+
+
+@pytest.fixture
+def failing_server(tmp_path, monkeypatch):
+    # 所有请求都返回500，每次取数都会重试到上限；关闭熔断和重试等待，只看请求次数
+    monkeypatch.setattr(config, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "BREAKER_ENABLED", False)
+    monkeypatch.setattr(config, "PREFETCH_REQUEST_INTERVAL", 0)
+    monkeypatch.setattr(api.api_client.retry_policy, "backoff_base", 0)
+    for name in CONFIG_URLS:
+        monkeypatch.setattr(config, name, getattr(config, name))
+    server = MockQWeatherServer(latency=0, error_rate=1.0, seed=0)
+    server.start()
+    server.apply_to_config(config)
+    CacheManager.close()
+    CacheManager.memory.clear()
+    yield server
+    server.stop()
+    CacheManager.close()
+    CacheManager.memory.clear()
+
+
+def test_budget_counts_http_attempts_including_retries(failing_server):
+    stats = Prefetcher(max_requests=4).run(["101010100", "101020100"])
+
+    sent = sum(failing_server.reset_counts().values())
+    assert stats["requests"] == sent
+    assert sent <= 4
+    assert stats["stopped"] == "达到请求预算"
+    assert stats["failed"] == 2
@@ -1,31 +1,73 @@
 import sys
-import time
-import json
 import os
-import requests
+import time
+import asyncio
+import functools
+import math
+import threading
+
+# 启动计时起点，包含导入PyQt5等模块的耗时
+STARTUP_STARTED = time.perf_counter()
+
 from datetime import datetime, timedelta
+from urllib.parse import urlsplit
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                             QLabel, QLineEdit, QPushButton, QTabWidget, QGridLayout,
-                            QTableWidget, QTableWidgetItem, QHeaderView, QFrame, QCompleter,
-                            QMessageBox, QSplashScreen, QProgressBar, QStatusBar)
-from PyQt5.QtCore import Qt, QDateTime, QStringListModel, QSize, QTimer
-from PyQt5.QtGui import QFont, QIcon, QPixmap
-
-# API配置
-API_KEY = "yourapikey"
-CITY_SEARCH_URL = "https://geoapi.qweather.com/v2/city/lookup"
-WEATHER_URL = "https://devapi.qweather.com/v7/weather/now"
-FORECAST_URL = "https://devapi.qweather.com/v7/weather/3d"
-INDEX_URL = "https://devapi.qweather.com/v7/indices/1d"
-
-# 缓存配置
-CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
-CACHE_EXPIRY = 30 * 60  # 缓存过期时间（秒）
-
-# 天气图标映射
+                            QHeaderView, QFrame, QCompleter,
+                            QMessageBox, QSplashScreen, QProgressBar, QStatusBar,
+                            QTableView, QAbstractItemView, QComboBox, QFileDialog)
+from PyQt5.QtCore import (Qt, QDateTime, QStringListModel, QTimer,
+                          QObject, QRunnable, QThreadPool, pyqtSignal,
+                          QAbstractTableModel, QModelIndex, QEvent, QPointF, QRectF)
+from PyQt5.QtGui import (QFont, QIcon, QPixmap, QPixmapCache, QImage, QPainter, QPen, QColor,
+                         QPolygonF)
+
+from weather_core import config
+from weather_core.api import (get_city_id, search_cities, suggest_cities, get_weather,
+                              get_daily_forecast, get_hourly_forecast,
+                              get_all_life_indices, fetch_weather, fetch_daily_forecast,
+                              fetch_hourly_forecast, fetch_all_life_indices,
+                              get_cached_snapshot)
+from weather_core.breaker import circuit_breaker
+from weather_core.cache import CacheManager, ensure_cache_dir, get_forecast_cache_key, get_hourly_cache_key
+from weather_core.cities import city_index, normalize_city_name
+from weather_core.concurrency import RequestCancelled, background_refresher, cancel_scope
+from weather_core.history import history_store
+from weather_core.metrics import metrics
+from weather_core.models import NowWeather, DailyForecast, HourlyForecast, format_number
+from weather_core.http import api_client
+from weather_core.prefetch import Prefetcher
+from weather_core.quota import quota_manager
+from weather_core.scheduler import RefreshPlanner
+from weather_core.serialize import dump_json_file, load_json_file
+
+# 多城市看板配置
+DASHBOARD_WORKERS = config.HOST_MAX_CONCURRENCY  # 批量刷新时的后台线程数，多于每个主机的并发上限只会排队
+
+# 输入联想配置
+SUGGEST_DEBOUNCE_MS = 150  # 输入停顿多久后才更新候选（毫秒）
+SUGGEST_REMOTE_MIN = 3  # 本地候选少于该数量时，再通过城市搜索API补充
+
+# 状态文件（历史记录、最后查询的城市、看板城市）的写入延迟（毫秒），期间的多次修改合并为一次写入
+STATE_SAVE_DELAY_MS = 1000
+
+# 历史趋势配置
+HISTORY_CHART_POINTS = 240  # 趋势图最多绘制的点数，查询时按该数量降采样
+HISTORY_MIN_BUCKET = 5 * 60  # 降采样的最小时间粒度（秒）
+HISTORY_RANGES = [("24小时", 24 * 60 * 60), ("48小时", 48 * 60 * 60), ("7天", 7 * 24 * 60 * 60),
+                  ("30天", 30 * 24 * 60 * 60), ("90天", 90 * 24 * 60 * 60)]
+HISTORY_SERIES = [("温度", "temp", "°C"), ("体感温度", "feelsLike", "°C"), ("湿度", "humidity", "%"),
+                  ("风速", "windSpeed", "米/秒"), ("气压", "pressure", "百帕"), ("降水量", "precip", "毫米")]
+
+# 设置 QWEATHER_PROFILE_STARTUP=1 时在标准错误输出启动各阶段耗时
+PROFILE_STARTUP = os.environ.get("QWEATHER_PROFILE_STARTUP") == "1"
+
+# 天气图标映射（按顺序做模糊匹配，前面的优先）
 WEATHER_ICONS = {
     "晴": "sunny.png",
     "多云": "cloudy.png",
+    "少云": "cloudy.png",
+    "晴间多云": "cloudy.png",
     "阴": "overcast.png",
     "小雨": "light_rain.png",
     "中雨": "moderate_rain.png",
@@ -37,213 +79,646 @@ WEATHER_ICONS = {
     "大雪": "heavy_snow.png",
     "暴雪": "snowstorm.png",
     "雾": "fog.png",
-    "霾": "haze.png"
+    "霾": "haze.png",
+    "沙": "haze.png",
+    "尘": "haze.png",
+    "云": "cloudy.png",
+    "雪": "light_snow.png",
+    "雨": "light_rain.png"
 }
 
-# 生活指数类型
-LIFE_INDICES = {
-    "1": "运动指数",
-    "2": "洗车指数",
-    "3": "穿衣指数",
-    "5": "紫外线指数",
-    "9": "感冒指数",
-    "13": "舒适度指数"
+# 和风天气的图标代码 -> 天气描述（夜间代码与白天共用图标），启动时预先解析为图标文件
+WEATHER_ICON_TEXTS = {
+    "100": "晴", "101": "多云", "102": "少云", "103": "晴间多云", "104": "阴",
+    "150": "晴", "151": "多云", "152": "少云", "153": "晴间多云",
+    "300": "阵雨", "301": "强阵雨", "302": "雷阵雨", "303": "强雷阵雨", "304": "雷阵雨伴有冰雹",
+    "305": "小雨", "306": "中雨", "307": "大雨", "308": "极端降雨", "309": "毛毛雨", "310": "暴雨",
+    "311": "大暴雨", "312": "特大暴雨", "313": "冻雨", "314": "小到中雨", "315": "中到大雨",
+    "316": "大到暴雨", "317": "暴雨到大暴雨", "318": "大暴雨到特大暴雨", "350": "阵雨", "351": "强阵雨",
+    "399": "雨",
+    "400": "小雪", "401": "中雪", "402": "大雪", "403": "暴雪", "404": "雨夹雪", "405": "雨雪天气",
+    "406": "阵雨夹雪", "407": "阵雪", "408": "小到中雪", "409": "中到大雪", "410": "大到暴雪",
+    "456": "阵雨夹雪", "457": "阵雪", "499": "雪",
+    "500": "薄雾", "501": "雾", "502": "霾", "503": "扬沙", "504": "浮尘", "507": "沙尘暴",
+    "508": "强沙尘暴", "509": "浓雾", "510": "强浓雾", "511": "中度霾", "512": "重度霾",
+    "513": "严重霾", "514": "大雾", "515": "特强浓雾"
 }
 
-# 确保缓存目录存在
-def ensure_cache_dir():
-    if not os.path.exists(CACHE_DIR):
-        os.makedirs(CACHE_DIR)
+# 图标目录；存在图标集（atlas.png + atlas.json）时启动只读取一张图片
+ICON_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "icons")
+ICON_ATLAS_IMAGE = "atlas.png"
+ICON_ATLAS_INDEX = "atlas.json"
+ICON_SIZE = 64  # 实时天气标签页的图标尺寸
+DASHBOARD_ICON_SIZE = 20  # 看板天气列的图标尺寸
+
+# 逐小时预报表格每次加载的行数，滚动到末尾时再加载下一批
+HOURLY_FETCH_BATCH = 48
+HOURLY_ROW_HEIGHT = 26
+
+# 关闭窗口时等待后台请求结束的最长时间（毫秒）；重试中的请求会被取消，只需等进行中的那一次
+SHUTDOWN_WAIT_MS = 2000
+
+# 各部分数据 -> (缓存类型, 刷新计划使用的数据类型)
+PART_CACHE_TYPES = {"current": "weather", "forecast": "forecast", "indices": "index", "hourly": "hourly"}
+
+# 诊断面板的刷新间隔（毫秒），只在面板可见时刷新
+DIAGNOSTICS_REFRESH_MS = 2000
+
+# 熔断状态在诊断面板中的名称
+BREAKER_STATE_NAMES = {"closed": "正常", "open": "熔断", "half_open": "探测中"}
+
+# 记录界面更新方法的耗时，在诊断面板中按方法名汇总
+def timed_ui(method):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        with metrics.timer("weather_ui_update_seconds", method=method.__name__):
+            return method(*args, **kwargs)
+    return wrapper
+
+# 天气图标缓存：天气描述和图标代码预先解析为图标文件，解码并缩放后的图片按图标和尺寸存入QPixmapCache
+# 同一个图标在任意多个城市、任意多次刷新中只解码和缩放一次
+class IconCache:
+    def __init__(self, icon_dir=ICON_DIR):
+        self.icon_dir = icon_dir
+        # 天气描述 -> 图标文件（包括模糊匹配的结果），未见过的描述在首次查询时加入
+        self.text_icons = {text: self.match_text(text) for text in WEATHER_ICONS}
+        self.text_icons.update((text, self.match_text(text)) for text in WEATHER_ICON_TEXTS.values())
+        self.code_icons = {code: self.text_icons[text] for code, text in WEATHER_ICON_TEXTS.items()}
+        self.atlas = None
+        self.atlas_rects = {}  # 图标文件 -> 在图标集中的 (x, y, 宽, 高)
+        self.atlas_loaded = False
+        self.missing = set()  # 不存在的图标文件，不再重复读取磁盘
 
-# 缓存管理
-class CacheManager:
-    @staticmethod
-    def get_cache_path(key, cache_type):
-        return os.path.join(CACHE_DIR, f"{cache_type}_{key}.json")
-    
-    @staticmethod
-    def save_to_cache(key, data, cache_type):
-        ensure_cache_dir()
-        cache_path = CacheManager.get_cache_path(key, cache_type)
-        cache_data = {
-            "timestamp": time.time(),
-            "data": data
-        }
-        with open(cache_path, "w", encoding="utf-8") as f:
-            json.dump(cache_data, f, ensure_ascii=False)
-    
     @staticmethod
-    def get_from_cache(key, cache_type):
-        cache_path = CacheManager.get_cache_path(key, cache_type)
-        if not os.path.exists(cache_path):
-            return None
+    def match_text(weather_text):
+        # 尝试精确匹配
+        if weather_text in WEATHER_ICONS:
+            return WEATHER_ICONS[weather_text]
+        
+        # 尝试模糊匹配
+        for key in WEATHER_ICONS:
+            if key in weather_text:
+                return WEATHER_ICONS[key]
         
+        # 默认图标
+        return "unknown.png"
+
+    def resolve(self, weather_text=None, code=None):
+        # 优先按图标代码查找，其次按天气描述
+        if code is not None and str(code) in self.code_icons:
+            return self.code_icons[str(code)]
+        if not weather_text:
+            return "unknown.png"
+        icon_name = self.text_icons.get(weather_text)
+        if icon_name is None:
+            icon_name = self.text_icons[weather_text] = self.match_text(weather_text)
+        return icon_name
+
+    def load_atlas(self):
+        self.atlas_loaded = True
         try:
-            with open(cache_path, "r", encoding="utf-8") as f:
-                cache_data = json.load(f)
-            
-            # 检查缓存是否过期
-            if time.time() - cache_data["timestamp"] > CACHE_EXPIRY:
-                return None
-            
-            return cache_data["data"]
+            index = load_json_file(os.path.join(self.icon_dir, ICON_ATLAS_INDEX))
         except Exception:
+            index = None
+        if not index:
+            return
+        atlas = QImage(os.path.join(self.icon_dir, ICON_ATLAS_IMAGE))
+        if not atlas.isNull():
+            self.atlas = atlas
+            self.atlas_rects = {name: tuple(rect) for name, rect in index.get("icons", {}).items()}
+
+    def load_image(self, icon_name):
+        # 优先从图标集中截取，其次读取单独的图标文件；都没有时返回None
+        if not self.atlas_loaded:
+            self.load_atlas()
+        rect = self.atlas_rects.get(icon_name)
+        if rect is not None:
+            return self.atlas.copy(*rect)
+        if icon_name in self.missing:
             return None
+        image = QImage(os.path.join(self.icon_dir, icon_name))
+        if image.isNull():
+            self.missing.add(icon_name)
+            return None
+        return image
+
+    def get_pixmap(self, weather_text=None, code=None, size=ICON_SIZE):
+        # 返回缩放到 size 的图标，图标文件不存在时返回None
+        icon_name = self.resolve(weather_text, code)
+        key = f"weather-icon:{icon_name}:{size}"
+        pixmap = QPixmapCache.find(key)
+        if pixmap is not None:
+            return pixmap
+        image = self.load_image(icon_name)
+        if image is None:
+            return None
+        pixmap = QPixmap.fromImage(image.scaled(size, size, Qt.KeepAspectRatio, Qt.SmoothTransformation))
+        QPixmapCache.insert(key, pixmap)
+        return pixmap
+
+    @staticmethod
+    def build_atlas(icon_dir=ICON_DIR, cell_size=128):
+        # 把目录中的图标缩放到不超过 cell_size 后按网格拼成一张图，并写出各图标的位置
+        names = sorted(name for name in os.listdir(icon_dir)
+                       if name.endswith(".png") and name != ICON_ATLAS_IMAGE)
+        images = [(name, QImage(os.path.join(icon_dir, name))) for name in names]
+        images = [(name, image.scaled(cell_size, cell_size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+                   if image.width() > cell_size or image.height() > cell_size else image)
+                  for name, image in images if not image.isNull()]
+        if not images:
+            return 0
+        columns = max(1, math.ceil(math.sqrt(len(images))))
+        rows = math.ceil(len(images) / columns)
+        atlas = QImage(columns * cell_size, rows * cell_size, QImage.Format_ARGB32)
+        atlas.fill(Qt.transparent)
+        rects = {}
+        painter = QPainter(atlas)
+        for position, (name, image) in enumerate(images):
+            x = position % columns * cell_size
+            y = position // columns * cell_size
+            painter.drawImage(x, y, image)
+            rects[name] = [x, y, image.width(), image.height()]
+        painter.end()
+        atlas.save(os.path.join(icon_dir, ICON_ATLAS_IMAGE))
+        dump_json_file(os.path.join(icon_dir, ICON_ATLAS_INDEX), {"cell_size": cell_size, "icons": rects})
+        return len(rects)
 
-# API请求函数
-def get_city_id(city_name, timeout=5, max_retries=3):
-    # 检查缓存
-    cache_key = city_name
-    cached_data = CacheManager.get_from_cache(cache_key, "city")
-    if cached_data:
-        return cached_data["id"], cached_data["name"]
-    
-    # 发起API请求
-    params = {"location": city_name, "key": API_KEY}
-    for retry in range(max_retries):
-        try:
-            response = requests.get(CITY_SEARCH_URL, params=params, timeout=timeout)
-            if response.status_code == 200:
-                data = response.json()
-                if data["code"] == "200" and data["location"]:
-                    result = {"id": data["location"][0]["id"], "name": data["location"][0]["name"]}
-                    # 保存到缓存
-                    CacheManager.save_to_cache(cache_key, result, "city")
-                    return result["id"], result["name"]
-                else:
-                    return None, f"城市搜索失败: {data.get('message', '未知错误')}"
-        except requests.Timeout:
-            if retry == max_retries - 1:
-                return None, "请求超时，请检查网络连接"
-        except requests.RequestException as e:
-            if retry == max_retries - 1:
-                return None, f"网络请求异常: {str(e)}"
-        if retry < max_retries - 1:
-            time.sleep(1)  # 重试前等待1秒
-    return None, "请求失败，请稍后重试"
-
-def get_life_index(city_id, index_type="5", timeout=5, max_retries=3):
-    # 检查缓存
-    cache_key = f"{city_id}_{index_type}"
-    cached_data = CacheManager.get_from_cache(cache_key, "index")
-    if cached_data:
-        return cached_data["level"], cached_data["category"]
-    
-    # 发起API请求
-    params = {
-        "location": city_id,
-        "key": API_KEY,
-        "type": index_type,
-        "lang": "zh"
-    }
-    for retry in range(max_retries):
-        try:
-            response = requests.get(INDEX_URL, params=params, timeout=timeout)
-            if response.status_code == 200:
-                data = response.json()
-                if data["code"] == "200":
-                    result = {"level": data["daily"][0]["level"], "category": data["daily"][0]["category"]}
-                    # 保存到缓存
-                    CacheManager.save_to_cache(cache_key, result, "index")
-                    return result["level"], result["category"]
-        except requests.Timeout:
-            if retry == max_retries - 1:
-                return "未知", "请求超时"
-        except requests.RequestException:
-            if retry == max_retries - 1:
-                return "未知", "网络异常"
-        if retry < max_retries - 1:
-            time.sleep(1)  # 重试前等待1秒
-    return "未知", "未知"
-
-def get_all_life_indices(city_id):
-    indices = {}
-    for index_id, index_name in LIFE_INDICES.items():
-        level, category = get_life_index(city_id, index_type=index_id)
-        indices[index_name] = {"level": level, "category": category}
-    return indices
-
-def get_weather(city_id, timeout=5, max_retries=3):
-    # 检查缓存
-    cache_key = city_id
-    cached_data = CacheManager.get_from_cache(cache_key, "weather")
-    if cached_data:
-        return cached_data, None
-    
-    # 发起API请求
-    params = {"location": city_id, "key": API_KEY, "lang": "zh", "unit": "m"}
-    for retry in range(max_retries):
-        try:
-            response = requests.get(WEATHER_URL, params=params, timeout=timeout)
-            if response.status_code == 200:
-                data = response.json()
-                if data["code"] == "200":
-                    # 保存到缓存
-                    CacheManager.save_to_cache(cache_key, data["now"], "weather")
-                    return data["now"], None
-                else:
-                    return None, f"错误: {data['code']} - {data['message']}"
-        except requests.Timeout:
-            if retry == max_retries - 1:
-                return None, "请求超时，请检查网络连接"
-        except requests.RequestException as e:
-            if retry == max_retries - 1:
-                return None, f"网络请求异常: {str(e)}"
-        if retry < max_retries - 1:
-            time.sleep(1)  # 重试前等待1秒
-    return None, "请求失败，请稍后重试"
-
-def get_3day_forecast(city_id, timeout=5, max_retries=3):
-    # 检查缓存
-    cache_key = city_id
-    cached_data = CacheManager.get_from_cache(cache_key, "forecast")
-    if cached_data:
-        return cached_data, None
-    
-    # 发起API请求
-    params = {"location": city_id, "key": API_KEY, "lang": "zh", "unit": "m"}
-    for retry in range(max_retries):
-        try:
-            response = requests.get(FORECAST_URL, params=params, timeout=timeout)
-            if response.status_code == 200:
-                data = response.json()
-                if data["code"] == "200":
-                    # 保存到缓存
-                    CacheManager.save_to_cache(cache_key, data["daily"], "forecast")
-                    return data["daily"], None
-                else:
-                    return None, f"错误: {data['code']} - {data['message']}"
-        except requests.Timeout:
-            if retry == max_retries - 1:
-                return None, "请求超时，请检查网络连接"
-        except requests.RequestException as e:
-            if retry == max_retries - 1:
-                return None, f"网络请求异常: {str(e)}"
-        if retry < max_retries - 1:
-            time.sleep(1)  # 重试前等待1秒
-    return None, "请求失败，请稍后重试"
+
+icon_cache = IconCache()
 
 # 获取天气图标
-def get_weather_icon(weather_text):
-    # 尝试精确匹配
-    if weather_text in WEATHER_ICONS:
-        return WEATHER_ICONS[weather_text]
-    
-    # 尝试模糊匹配
-    for key in WEATHER_ICONS:
-        if key in weather_text:
-            return WEATHER_ICONS[key]
-    
-    # 默认图标
-    return "unknown.png"
+def get_weather_icon(weather_text, code=None):
+    return icon_cache.resolve(weather_text, code)
+
+# 启动耗时统计：按阶段记录相对于上一阶段的耗时
+class StartupProfile:
+    def __init__(self, started):
+        self.started = started
+        self.last = started
+        self.stages = []  # [(阶段, 耗时秒)]
+        self.printed = 0
+
+    def mark(self, stage):
+        # 每个阶段只记录第一次（刷新会重复经过同一位置）
+        if any(name == stage for name, _ in self.stages):
+            return False
+        now = time.perf_counter()
+        self.stages.append((stage, now - self.last))
+        self.last = now
+        return True
+
+    def report(self):
+        # 只输出上次输出之后新增的阶段
+        if not PROFILE_STARTUP or self.printed == len(self.stages):
+            return
+        for stage, elapsed in self.stages[self.printed:]:
+            print(f"[启动] {stage}: {elapsed * 1000:.1f} ms", file=sys.stderr)
+        print(f"[启动] 累计: {(self.last - self.started) * 1000:.1f} ms", file=sys.stderr)
+        self.printed = len(self.stages)
+
+startup_profile = StartupProfile(STARTUP_STARTED)
+
+
+# 后台请求任务的信号载体（QRunnable本身不是QObject，不能直接发信号）
+class FetchSignals(QObject):
+    finished = pyqtSignal(object, str, object)  # 任务, 任务名, 结果
+
+
+class FetchTask(QRunnable):
+    def __init__(self, name, generation, cancel_event, func, *args):
+        super().__init__()
+        self.name = name
+        self.generation = generation
+        self.cancel_event = cancel_event  # 所属请求轮次被淘汰时设置，重试中的请求随之结束
+        self.func = func
+        self.args = args
+        self.signals = FetchSignals()
+
+    def run(self):
+        try:
+            with cancel_scope(self.cancel_event):
+                result = self.func(*self.args)
+        except RequestCancelled as e:
+            result = e
+        except Exception as e:
+            metrics.inc("weather_errors_total", source="fetch_task")
+            result = e
+        self.signals.finished.emit(self, self.name, result)
+
+
+# 后台请求引擎：在线程池中并发执行API请求，结果通过信号回到GUI线程
+class FetchEngine(QObject):
+    result_ready = pyqtSignal(str, object)  # 任务名, 结果
+
+    def __init__(self, max_threads=4, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(max_threads)
+        self.generation = 0
+        self.cancel_event = threading.Event()
+        self.pending = set()
+        # 预取线程通过 is_busy 读取 pending 和 generation，修改和读取都持有该锁
+        self.lock = threading.Lock()
+
+    def new_generation(self):
+        # 开始新一轮请求：取消尚未开始的旧任务；已在执行的旧任务不再重试，结果将被丢弃
+        with self.lock:
+            self.generation += 1
+            self.cancel_event.set()
+            self.cancel_event = threading.Event()
+            for task in list(self.pending):
+                if self.pool.tryTake(task):
+                    self.pending.discard(task)
+            return self.generation
+
+    def submit(self, name, func, *args):
+        with self.lock:
+            task = FetchTask(name, self.generation, self.cancel_event, func, *args)
+            task.setAutoDelete(False)
+            task.signals.finished.connect(self._on_task_finished)
+            self.pending.add(task)
+        self.pool.start(task)
+        return task
+
+    def is_busy(self):
+        with self.lock:
+            return any(task.generation == self.generation for task in self.pending)
+
+    def _on_task_finished(self, task, name, result):
+        with self.lock:
+            self.pending.discard(task)
+            current = task.generation == self.generation
+        # 被新查询淘汰的结果直接丢弃
+        if current:
+            self.result_ready.emit(name, result)
+
+    def shutdown(self, timeout_ms=SHUTDOWN_WAIT_MS):
+        # 作废所有任务并等待进行中的请求结束，最多等待 timeout_ms，不让关闭窗口卡住界面
+        self.new_generation()
+        return self.pool.waitForDone(timeout_ms)
+
+
+# 自动刷新调度：按刷新计划只在最早的到期时间触发一次，到期的项目合并为一批发出
+class RefreshScheduler(QObject):
+    refresh_due = pyqtSignal(list)  # [(数据类型, 城市ID)]
+
+    def __init__(self, is_busy, parent=None):
+        super().__init__(parent)
+        self.planner = RefreshPlanner()
+        self.is_busy = is_busy
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.on_timeout)
+
+    def schedule(self, cache_type, city_id, obs_time=None, cache_key=None):
+        self.planner.plan(cache_type, city_id, obs_time, cache_key=cache_key)
+        self.rearm()
+
+    def forget(self, city_id, cache_types=None):
+        self.planner.forget(city_id, cache_types)
+        self.rearm()
+
+    def set_background(self, background):
+        # 窗口隐藏或最小化时放慢刷新
+        self.planner.set_backoff(config.REFRESH_HIDDEN_BACKOFF if background else 1)
+        self.rearm()
+
+    def rearm(self):
+        next_due = self.planner.next_due()
+        if next_due is None:
+            self.timer.stop()
+            return
+        delay = max(0.0, next_due - time.time())
+        self.timer.start(int(min(delay, 24 * 60 * 60) * 1000))
+
+    def on_timeout(self):
+        # 上一轮刷新仍在进行时推迟，不叠加请求
+        if self.is_busy():
+            self.timer.start(config.REFRESH_BUSY_RETRY * 1000)
+            return
+        items = self.planner.pop_due()
+        if items:
+            self.refresh_due.emit(items)
+        self.rearm()
+
+
+# 通用表格模型：整表替换数据时与当前内容比较，只通知有变化的单元格
+class DataTableModel(QAbstractTableModel):
+    def __init__(self, headers, parent=None):
+        super().__init__(parent)
+        self.headers = headers
+        self.rows = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if index.isValid() and role == Qt.DisplayRole:
+            return self.rows[index.row()][index.column()]
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.headers[section]
+        return super().headerData(section, orientation, role)
+
+    def set_rows(self, rows):
+        # 返回是否有变化；内容完全相同时不发出任何信号
+        rows = [list(row) for row in rows]
+        if rows == self.rows:
+            return False
+        
+        # 行数变化时只在末尾插入或删除行
+        common = min(len(rows), len(self.rows))
+        if len(rows) < len(self.rows):
+            self.beginRemoveRows(QModelIndex(), common, len(self.rows) - 1)
+            del self.rows[common:]
+            self.endRemoveRows()
+        elif len(rows) > len(self.rows):
+            self.beginInsertRows(QModelIndex(), common, len(rows) - 1)
+            self.rows.extend(rows[common:])
+            self.endInsertRows()
+        
+        # 已有的行逐个单元格比较
+        for row in range(common):
+            self.set_row(row, rows[row])
+        return True
+
+    def set_row(self, row, values):
+        changed = [column for column, value in enumerate(values) if value != self.rows[row][column]]
+        if not changed:
+            return False
+        self.rows[row] = list(values)
+        self.dataChanged.emit(self.index(row, min(changed)), self.index(row, max(changed)), [Qt.DisplayRole])
+        return True
+
+    def set_cell(self, row, column, value):
+        values = list(self.rows[row])
+        values[column] = value
+        return self.set_row(row, values)
+
+    def find_row(self, column, value):
+        for row, values in enumerate(self.rows):
+            if values[column] == value:
+                return row
+        return -1
+
+
+# 多城市看板数据模型：每行一个城市，刷新时只通知内容有变化的单元格
+class DashboardModel(QAbstractTableModel):
+    HEADERS = ["城市", "天气", "温度", "湿度", "风向风力", "观测时间", "状态"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = []  # [{"id", "name", "values"}]
+        self.row_index = {}  # 城市ID -> 行号
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            return self.rows[index.row()]["values"][index.column()]
+        if role == Qt.DecorationRole and index.column() == 1:
+            icon = self.rows[index.row()]["icon"]
+            return icon_cache.get_pixmap(*icon, size=DASHBOARD_ICON_SIZE) if icon else None
+        if role == Qt.TextAlignmentRole:
+            return Qt.AlignCenter
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def city_ids(self):
+        return [row["id"] for row in self.rows]
+
+    def cities(self):
+        return [{"id": row["id"], "name": row["name"]} for row in self.rows]
+
+    def add_city(self, city_id, city_name):
+        if city_id in self.row_index:
+            return False
+        row = len(self.rows)
+        self.beginInsertRows(QModelIndex(), row, row)
+        values = [city_name] + [""] * (len(self.HEADERS) - 2) + ["等待刷新"]
+        self.rows.append({"id": city_id, "name": city_name, "values": values, "icon": None})
+        self.row_index[city_id] = row
+        self.endInsertRows()
+        return True
+
+    def remove_city(self, city_id):
+        row = self.row_index.get(city_id)
+        if row is None:
+            return False
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.rows[row]
+        self.row_index = {item["id"]: i for i, item in enumerate(self.rows)}
+        self.endRemoveRows()
+        return True
+
+    @timed_ui
+    def update_city(self, city_id, weather_data, error, status="正常"):
+        # 只对内容有变化的单元格发出dataChanged，完全没变化时不触发重绘
+        row = self.row_index.get(city_id)
+        if row is None:
+            return False
+        old_values = self.rows[row]["values"]
+        icon = self.rows[row]["icon"]
+        if error:
+            new_values = old_values[:-1] + [error]
+        else:
+            icon = (weather_data["text"], weather_data.get("icon"))
+            new_values = [
+                self.rows[row]["name"],
+                weather_data["text"],
+                f"{weather_data['temp']}°C",
+                f"{weather_data['humidity']}%",
+                f"{weather_data['windDir']} {weather_data['windScale']}级",
+                weather_data["obsTime"],
+                status
+            ]
+        changed = [column for column, value in enumerate(new_values) if value != old_values[column]]
+        roles = [Qt.DisplayRole]
+        if icon != self.rows[row]["icon"]:
+            changed.append(1)
+            roles.append(Qt.DecorationRole)
+        if not changed:
+            return False
+        self.rows[row]["values"] = new_values
+        self.rows[row]["icon"] = icon
+        self.dataChanged.emit(self.index(row, min(changed)), self.index(row, max(changed)), roles)
+        return True
+
+
+# 逐小时预报模型：保存解析好的 HourlyForecast 记录，单元格文字在视图请求时才生成
+# 行通过 fetchMore 分批加入，视图只为滚动到的行创建内容，168小时的表格也能流畅滚动
+class HourlyForecastModel(QAbstractTableModel):
+    HEADERS = ["时间", "天气", "温度", "降水概率", "降水量", "湿度", "风向风力", "气压"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.records = []
+        self.loaded = 0  # 已交给视图的行数
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.loaded
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.loaded < len(self.records)
+
+    def fetchMore(self, parent=QModelIndex()):
+        count = min(HOURLY_FETCH_BATCH, len(self.records) - self.loaded)
+        if parent.isValid() or count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self.loaded, self.loaded + count - 1)
+        self.loaded += count
+        self.endInsertRows()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        record = self.records[index.row()]
+        if role == Qt.DisplayRole:
+            return self.format_cell(record, index.column())
+        if role == Qt.DecorationRole and index.column() == 1:
+            return icon_cache.get_pixmap(record.text, record.icon, size=DASHBOARD_ICON_SIZE)
+        if role == Qt.TextAlignmentRole:
+            return Qt.AlignCenter
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    @staticmethod
+    def format_cell(record, column):
+        if column == 0:
+            # "2026-10-16T09:00+08:00" -> "10-16 09:00"
+            return (record.fx_time or "")[5:16].replace("T", " ")
+        if column == 1:
+            return record.text or ""
+        if column == 2:
+            return f"{format_number(record.temp)}°C"
+        if column == 3:
+            return "-" if record.pop is None else f"{format_number(record.pop)}%"
+        if column == 4:
+            return f"{format_number(record.precip)} 毫米"
+        if column == 5:
+            return f"{format_number(record.humidity)}%"
+        if column == 6:
+            return f"{record.wind_dir or ''} {record.wind_scale or ''}级"
+        return f"{format_number(record.pressure)} 百帕"
+
+    def set_records(self, records):
+        # 条数相同时只通知有变化的行，否则重置模型并只交出第一批行
+        if records and len(records) == len(self.records):
+            changed = [row for row in range(len(records)) if records[row] != self.records[row]]
+            self.records = records
+            changed = [row for row in changed if row < self.loaded]
+            if changed:
+                self.dataChanged.emit(self.index(min(changed), 0),
+                                      self.index(max(changed), len(self.HEADERS) - 1))
+            return bool(changed)
+        self.beginResetModel()
+        self.records = records
+        self.loaded = min(HOURLY_FETCH_BATCH, len(records))
+        self.endResetModel()
+        return True
+
+
+# 历史趋势图：绘制降采样后的均值折线，以及每个时间段内的最小/最大值范围
+class TrendChart(QWidget):
+    MARGIN_LEFT = 72
+    MARGIN_RIGHT = 20
+    MARGIN_TOP = 20
+    MARGIN_BOTTOM = 40
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.series = None  # history_store.aggregate 的结果
+        self.unit = ""
+        self.setMinimumHeight(240)
+
+    def set_series(self, series, unit):
+        self.series = series
+        self.unit = unit
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.fillRect(self.rect(), Qt.white)
+        series = self.series
+        if not series or not series["ts"]:
+            painter.setPen(Qt.gray)
+            painter.drawText(self.rect(), Qt.AlignCenter, "暂无历史数据")
+            return
+        
+        plot = QRectF(self.MARGIN_LEFT, self.MARGIN_TOP,
+                      max(1, self.width() - self.MARGIN_LEFT - self.MARGIN_RIGHT),
+                      max(1, self.height() - self.MARGIN_TOP - self.MARGIN_BOTTOM))
+        low = min(series["min"])
+        high = max(series["max"])
+        if high - low < 1e-6:
+            low, high = low - 1, high + 1
+        span = series["end"] - series["start"]
+        
+        def point(ts, value):
+            x = plot.left() + (ts + series["bucket"] / 2 - series["start"]) / span * plot.width()
+            y = plot.bottom() - (value - low) / (high - low) * plot.height()
+            return QPointF(x, y)
+        
+        # 坐标轴和刻度文字
+        painter.setPen(QPen(QColor("#cccccc")))
+        painter.drawRect(plot)
+        painter.setPen(Qt.darkGray)
+        painter.drawText(QRectF(0, plot.top() - 8, self.MARGIN_LEFT - 6, 16), Qt.AlignRight | Qt.AlignVCenter,
+                         f"{high:.1f}{self.unit}")
+        painter.drawText(QRectF(0, plot.bottom() - 8, self.MARGIN_LEFT - 6, 16), Qt.AlignRight | Qt.AlignVCenter,
+                         f"{low:.1f}{self.unit}")
+        time_format = "%m-%d %H:%M"
+        painter.drawText(QRectF(plot.left(), plot.bottom() + 6, plot.width(), 20), Qt.AlignLeft,
+                         datetime.fromtimestamp(series["start"]).strftime(time_format))
+        painter.drawText(QRectF(plot.left(), plot.bottom() + 6, plot.width(), 20), Qt.AlignRight,
+                         datetime.fromtimestamp(series["end"]).strftime(time_format))
+        
+        # 最小/最大值范围
+        band = QPolygonF([point(ts, value) for ts, value in zip(series["ts"], series["max"])] +
+                         [point(ts, value) for ts, value in reversed(list(zip(series["ts"], series["min"])))])
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(QColor(52, 152, 219, 60))
+        painter.drawPolygon(band)
+        
+        # 均值折线
+        painter.setPen(QPen(QColor("#2980b9"), 2))
+        painter.setBrush(Qt.NoBrush)
+        painter.drawPolyline(QPolygonF([point(ts, value) for ts, value in zip(series["ts"], series["mean"])]))
+
 
 # 主应用类
 class WeatherApp(QMainWindow):
-    def __init__(self):
+    def __init__(self, async_client=None):
         super().__init__()
         self.setWindowTitle("天气查询应用")
         self.setMinimumSize(900, 700)
         
+        # 先设置样式表再创建子部件，避免创建后整棵部件树重新应用样式
+        self.apply_styles()
+        
         # 历史记录列表
         self.history = []
         self.max_history = 10
@@ -252,9 +727,35 @@ class WeatherApp(QMainWindow):
         self.current_city_id = None
         self.current_city_name = None
         
-        # 自动刷新定时器
-        self.refresh_timer = QTimer()
-        self.refresh_timer.timeout.connect(self.refresh_weather)
+        # 后台请求引擎
+        self.fetch_engine = FetchEngine(parent=self)
+        self.fetch_engine.result_ready.connect(self.on_fetch_result)
+        self.pending_updates = set()
+        
+        # 紫外线指数随生活指数批量获取
+        self.current_uv_index = None
+        
+        # 各标签页的数据在该标签页首次可见时才请求；loaded_parts 记录当前城市已请求过的部分
+        self.loaded_parts = set()
+        self.forecast_days = config.FORECAST_DAY_OPTIONS[0]
+        self.hourly_hours = config.HOURLY_OPTIONS[0]
+        
+        # 多城市看板的批量刷新使用有界线程池
+        self.dashboard_engine = FetchEngine(max_threads=DASHBOARD_WORKERS, parent=self)
+        self.dashboard_engine.result_ready.connect(self.on_dashboard_result)
+        
+        # 由qasync驱动事件循环时，看板批量刷新改用asyncio客户端
+        self.async_client = async_client
+        self.dashboard_task = None
+        
+        # 自动刷新调度：按各类数据的观测时间和TTL安排下一次刷新
+        self.scheduler = RefreshScheduler(self.is_refreshing, parent=self)
+        self.scheduler.refresh_due.connect(self.on_refresh_due)
+        
+        # 预取历史记录中靠前的城市，前台有请求时暂停
+        self.prefetcher = Prefetcher(is_paused=self.is_refreshing)
+        self.prefetch_timer = QTimer(self)
+        self.prefetch_timer.timeout.connect(self.prefetch_likely_cities)
         
         # 主窗口部件
         self.central_widget = QWidget()
@@ -282,17 +783,52 @@ class WeatherApp(QMainWindow):
         # 生活指数标签页
         self.setup_life_index_tab()
         
+        # 逐小时预报标签页
+        self.setup_hourly_tab()
+        
+        # 多城市看板标签页
+        self.setup_dashboard_tab()
+        
+        # 历史趋势标签页
+        self.setup_history_tab()
+        
+        # 诊断标签页
+        self.setup_diagnostics_tab()
+        
         # 状态栏
         self.statusBar().showMessage("准备就绪")
         
-        # 应用样式
-        self.apply_styles()
+        # 状态栏右侧显示API剩余配额
+        self.quota_label = QLabel()
+        self.statusBar().addPermanentWidget(self.quota_label)
+        self.quota_timer = QTimer(self)
+        self.quota_timer.timeout.connect(self.update_quota_label)
+        self.quota_timer.start(2000)
+        self.update_quota_label()
+        
+        # 网络不可用（主机熔断）时在状态栏提示，并定时用实时天气请求探测是否恢复
+        self.network_label = QLabel()
+        self.statusBar().addPermanentWidget(self.network_label)
+        self.quota_timer.timeout.connect(self.update_network_status)
+        startup_profile.mark("创建界面")
         
         # 创建缓存目录
         ensure_cache_dir()
         
-        # 尝试加载上次查询的城市
+        # 状态文件写入防抖
+        self.dirty_state = set()
+        self.state_save_timer = QTimer(self)
+        self.state_save_timer.setSingleShot(True)
+        self.state_save_timer.setInterval(STATE_SAVE_DELAY_MS)
+        self.state_save_timer.timeout.connect(self.flush_state)
+        
+        # 加载上次查询的城市，先直接显示缓存中的数据（包括已过期的）
+        self.first_painted = False
         self.load_last_city()
+        startup_profile.mark("读取缓存")
+        
+        # 网络请求推迟到事件循环启动之后，不阻塞窗口显示
+        QTimer.singleShot(0, self.revalidate_cached_data)
 
     def setup_search_area(self):
         search_layout = QHBoxLayout()
@@ -328,19 +864,55 @@ class WeatherApp(QMainWindow):
         self.main_layout.addWidget(line)
     
     def setup_autocomplete(self):
-        # 创建自动补全器
+        # 创建自动补全器，候选项已按城市索引过滤（含拼音匹配），补全器本身不再过滤
         self.completer = QCompleter()
         self.completer.setCaseSensitivity(Qt.CaseInsensitive)
+        self.completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
         self.city_input.setCompleter(self.completer)
         
         # 设置自动补全数据模型
         self.completer_model = QStringListModel()
         self.completer.setModel(self.completer_model)
         self.update_completer_model()
+        
+        # 输入防抖：停止输入一段时间后才更新候选
+        self.suggest_timer = QTimer(self)
+        self.suggest_timer.setSingleShot(True)
+        self.suggest_timer.setInterval(SUGGEST_DEBOUNCE_MS)
+        self.suggest_timer.timeout.connect(self.update_suggestions)
+        self.city_input.textEdited.connect(self.suggest_timer.start)
+        
+        # 远程联想请求使用单独的引擎，新的输入会丢弃旧的结果
+        self.suggest_engine = FetchEngine(max_threads=1, parent=self)
+        self.suggest_engine.result_ready.connect(self.on_remote_suggestions)
     
     def update_completer_model(self):
         # 更新自动补全数据
-        self.completer_model.setStringList(self.history)
+        self.completer_model.setStringList(suggest_cities(self.city_input.text(), self.history))
+    
+    def update_suggestions(self):
+        text = self.city_input.text().strip()
+        self.suggest_engine.new_generation()
+        suggestions = suggest_cities(text, self.history)
+        self.show_suggestions(suggestions)
+        
+        # 本地候选太少时，异步请求城市搜索API补充
+        if len(suggestions) < SUGGEST_REMOTE_MIN and len(normalize_city_name(text)) >= 2:
+            self.suggest_engine.submit("suggest", search_cities, text)
+    
+    def on_remote_suggestions(self, name, result):
+        if isinstance(result, Exception):
+            return
+        suggestions = self.completer_model.stringList()
+        for city in result:
+            if city["name"] not in suggestions:
+                suggestions.append(city["name"])
+        self.show_suggestions(suggestions[:config.SUGGEST_LIMIT])
+    
+    def show_suggestions(self, suggestions):
+        self.completer_model.setStringList(suggestions)
+        if suggestions and self.city_input.hasFocus():
+            self.completer.complete()
     
     def setup_current_weather_tab(self):
         self.current_weather_tab = QWidget()
@@ -348,9 +920,9 @@ class WeatherApp(QMainWindow):
         self.current_weather_layout = QVBoxLayout(self.current_weather_tab)
         
         # 天气信息表格
-        self.weather_table = QTableWidget()
-        self.weather_table.setColumnCount(2)
-        self.weather_table.setHorizontalHeaderLabels(["项目", "值"])
+        self.weather_model = DataTableModel(["项目", "值"], self)
+        self.weather_table = QTableView()
+        self.weather_table.setModel(self.weather_model)
         self.weather_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         self.current_weather_layout.addWidget(self.weather_table)
         
@@ -363,13 +935,24 @@ class WeatherApp(QMainWindow):
     
     def setup_forecast_tab(self):
         self.forecast_tab = QWidget()
-        self.tabs.addTab(self.forecast_tab, "未来3天预报")
+        self.tabs.addTab(self.forecast_tab, "天气预报")
         self.forecast_layout = QVBoxLayout(self.forecast_tab)
         
+        # 预报天数
+        option_layout = QHBoxLayout()
+        self.forecast_days_combo = QComboBox()
+        for days in config.FORECAST_DAY_OPTIONS:
+            self.forecast_days_combo.addItem(f"未来{days}天", days)
+        self.forecast_days_combo.currentIndexChanged.connect(self.on_forecast_days_changed)
+        option_layout.addWidget(QLabel("预报天数:"))
+        option_layout.addWidget(self.forecast_days_combo)
+        option_layout.addStretch(1)
+        self.forecast_layout.addLayout(option_layout)
+        
         # 预报表格
-        self.forecast_table = QTableWidget()
-        self.forecast_table.setColumnCount(5)
-        self.forecast_table.setHorizontalHeaderLabels(["日期", "白天天气", "夜间天气", "温度范围", "风速"])
+        self.forecast_model = DataTableModel(["日期", "白天天气", "夜间天气", "温度范围", "风速"], self)
+        self.forecast_table = QTableView()
+        self.forecast_table.setModel(self.forecast_model)
         self.forecast_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         self.forecast_layout.addWidget(self.forecast_table)
     
@@ -379,22 +962,350 @@ class WeatherApp(QMainWindow):
         self.life_index_layout = QVBoxLayout(self.life_index_tab)
         
         # 生活指数表格
-        self.life_index_table = QTableWidget()
-        self.life_index_table.setColumnCount(3)
-        self.life_index_table.setHorizontalHeaderLabels(["指数类型", "等级", "建议"])
+        self.life_index_model = DataTableModel(["指数类型", "等级", "建议"], self)
+        self.life_index_table = QTableView()
+        self.life_index_table.setModel(self.life_index_model)
         self.life_index_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         self.life_index_layout.addWidget(self.life_index_table)
     
+    def setup_hourly_tab(self):
+        self.hourly_tab = QWidget()
+        self.tabs.addTab(self.hourly_tab, "逐小时预报")
+        self.hourly_layout = QVBoxLayout(self.hourly_tab)
+        
+        # 预报小时数
+        option_layout = QHBoxLayout()
+        self.hourly_combo = QComboBox()
+        for hours in config.HOURLY_OPTIONS:
+            self.hourly_combo.addItem(f"未来{hours}小时", hours)
+        self.hourly_combo.currentIndexChanged.connect(self.on_hourly_hours_changed)
+        option_layout.addWidget(QLabel("预报时长:"))
+        option_layout.addWidget(self.hourly_combo)
+        option_layout.addStretch(1)
+        self.hourly_layout.addLayout(option_layout)
+        
+        # 固定行高，视图不需要逐行计算高度
+        self.hourly_model = HourlyForecastModel(self)
+        self.hourly_table = QTableView()
+        self.hourly_table.setModel(self.hourly_model)
+        self.hourly_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.hourly_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.hourly_table.verticalHeader().setDefaultSectionSize(HOURLY_ROW_HEIGHT)
+        self.hourly_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.hourly_layout.addWidget(self.hourly_table)
+    
+    def get_tab_parts(self, widget):
+        # 标签页 -> 需要的数据；实时天气标签页的紫外线指数取自全部生活指数（同一个indices/1d请求）
+        return {self.current_weather_tab: ("current", "indices"),
+                self.forecast_tab: ("forecast",),
+                self.life_index_tab: ("indices",),
+                self.hourly_tab: ("hourly",)}.get(widget, ())
+    
+    def get_part_task(self, name, force=False):
+        # 返回 (任务名, 请求函数, 参数)；force为True时跳过缓存（定时刷新使用）
+        # 预报的任务名带上天数/小时数，切换选项后旧请求的结果会被丢弃
+        city_id = self.current_city_id
+        if name == "current":
+            return name, fetch_weather if force else get_weather, (city_id,)
+        if name == "forecast":
+            return f"forecast:{self.forecast_days}", fetch_daily_forecast if force else get_daily_forecast, \
+                (city_id, self.forecast_days)
+        if name == "hourly":
+            return f"hourly:{self.hourly_hours}", fetch_hourly_forecast if force else get_hourly_forecast, \
+                (city_id, self.hourly_hours)
+        return name, fetch_all_life_indices if force else get_all_life_indices, (city_id,)
+    
+    def request_parts(self, parts, force=False):
+        for name in parts:
+            task_name, func, args = self.get_part_task(name, force)
+            self.loaded_parts.add(name)
+            self.pending_updates.add(name)
+            self.fetch_engine.submit(task_name, func, *args)
+    
+    def load_visible_tab(self):
+        # 当前标签页需要、且当前城市还没有请求过的数据
+        if not self.current_city_id:
+            return
+        parts = [name for name in self.get_tab_parts(self.tabs.currentWidget()) if name not in self.loaded_parts]
+        if parts:
+            self.request_parts(parts)
+    
+    def on_forecast_days_changed(self):
+        self.forecast_days = self.forecast_days_combo.currentData()
+        self.reload_part("forecast")
+    
+    def on_hourly_hours_changed(self):
+        self.hourly_hours = self.hourly_combo.currentData()
+        self.reload_part("hourly")
+    
+    def reload_part(self, name):
+        # 切换天数/小时数后，旧选项的刷新计划作废，可见时立即按新选项请求
+        self.loaded_parts.discard(name)
+        if self.current_city_id:
+            self.scheduler.forget(self.current_city_id, (PART_CACHE_TYPES[name],))
+        self.load_visible_tab()
+    
+    def setup_dashboard_tab(self):
+        self.dashboard_tab = QWidget()
+        self.tabs.addTab(self.dashboard_tab, "多城市看板")
+        self.dashboard_layout = QVBoxLayout(self.dashboard_tab)
+        
+        # 操作按钮
+        button_layout = QHBoxLayout()
+        self.pin_button = QPushButton("固定当前城市")
+        self.pin_button.clicked.connect(self.pin_current_city)
+        self.unpin_button = QPushButton("移除选中城市")
+        self.unpin_button.clicked.connect(self.unpin_selected_cities)
+        self.dashboard_refresh_button = QPushButton("刷新全部")
+        self.dashboard_refresh_button.clicked.connect(lambda: self.refresh_dashboard())
+        button_layout.addWidget(self.pin_button)
+        button_layout.addWidget(self.unpin_button)
+        button_layout.addStretch(1)
+        button_layout.addWidget(self.dashboard_refresh_button)
+        self.dashboard_layout.addLayout(button_layout)
+        
+        # 看板表格（模型/视图，城市数量较多时也只重绘有变化的单元格）
+        self.dashboard_model = DashboardModel(self)
+        self.dashboard_view = QTableView()
+        self.dashboard_view.setModel(self.dashboard_model)
+        self.dashboard_view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.dashboard_view.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.dashboard_view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.dashboard_layout.addWidget(self.dashboard_view)
+    
+    def setup_history_tab(self):
+        self.history_tab = QWidget()
+        self.tabs.addTab(self.history_tab, "历史趋势")
+        self.history_layout = QVBoxLayout(self.history_tab)
+        
+        # 数据项和时间范围
+        option_layout = QHBoxLayout()
+        self.history_series_combo = QComboBox()
+        for label, field, unit in HISTORY_SERIES:
+            self.history_series_combo.addItem(label, (field, unit))
+        self.history_range_combo = QComboBox()
+        for label, seconds in HISTORY_RANGES:
+            self.history_range_combo.addItem(label, seconds)
+        self.history_range_combo.setCurrentIndex(1)
+        self.history_series_combo.currentIndexChanged.connect(self.load_history_chart)
+        self.history_range_combo.currentIndexChanged.connect(self.load_history_chart)
+        self.history_summary_label = QLabel()
+        option_layout.addWidget(QLabel("数据项:"))
+        option_layout.addWidget(self.history_series_combo)
+        option_layout.addWidget(QLabel("时间范围:"))
+        option_layout.addWidget(self.history_range_combo)
+        option_layout.addStretch(1)
+        option_layout.addWidget(self.history_summary_label)
+        self.history_layout.addLayout(option_layout)
+        
+        self.history_chart = TrendChart()
+        self.history_layout.addWidget(self.history_chart, 1)
+        
+        # 历史数据在后台读取和降采样，切换到该标签页时才加载
+        self.history_engine = FetchEngine(max_threads=1, parent=self)
+        self.history_engine.result_ready.connect(self.on_history_loaded)
+        self.tabs.currentChanged.connect(self.on_tab_changed)
+    
+    def on_tab_changed(self, index):
+        # 各标签页的数据在首次可见时才请求
+        self.load_visible_tab()
+        if self.tabs.widget(index) is self.history_tab:
+            self.load_history_chart()
+        # 诊断面板只在可见时定时刷新
+        if self.tabs.widget(index) is self.diagnostics_tab:
+            self.update_diagnostics()
+            self.diagnostics_timer.start()
+        else:
+            self.diagnostics_timer.stop()
+    
+    def load_history_chart(self):
+        if not self.current_city_id or self.tabs.currentWidget() is not self.history_tab:
+            return
+        field, unit = self.history_series_combo.currentData()
+        seconds = self.history_range_combo.currentData()
+        end = time.time()
+        bucket = max(HISTORY_MIN_BUCKET, seconds / HISTORY_CHART_POINTS)
+        self.history_engine.new_generation()
+        self.history_engine.submit("history", history_store.aggregate, self.current_city_id, field, end - seconds, end, bucket)
+    
+    def on_history_loaded(self, name, result):
+        field, unit = self.history_series_combo.currentData()
+        if isinstance(result, Exception):
+            self.history_chart.set_series(None, unit)
+            self.history_summary_label.setText(f"读取历史数据失败: {result}")
+            return
+        self.history_chart.set_series(result, unit)
+        self.history_summary_label.setText(f"共 {sum(result['count'])} 条观测记录")
+    
+    def setup_diagnostics_tab(self):
+        self.diagnostics_tab = QWidget()
+        self.tabs.addTab(self.diagnostics_tab, "诊断")
+        self.diagnostics_layout = QVBoxLayout(self.diagnostics_tab)
+        
+        button_layout = QHBoxLayout()
+        self.metrics_export_button = QPushButton("导出指标")
+        self.metrics_export_button.clicked.connect(self.export_metrics)
+        self.metrics_reset_button = QPushButton("清零")
+        self.metrics_reset_button.clicked.connect(self.reset_metrics)
+        button_layout.addStretch(1)
+        button_layout.addWidget(self.metrics_export_button)
+        button_layout.addWidget(self.metrics_reset_button)
+        self.diagnostics_layout.addLayout(button_layout)
+        
+        # 按接口、缓存类型和界面方法分别汇总
+        self.endpoint_metrics_model = DataTableModel(
+            ["接口", "请求数", "失败数", "超时", "重试", "配额拒绝", "响应大小", "平均耗时", "P95耗时"], self)
+        self.cache_metrics_model = DataTableModel(
+            ["缓存类型", "命中率", "内存命中", "磁盘命中", "过期命中", "未命中"], self)
+        self.ui_metrics_model = DataTableModel(["界面方法", "次数", "平均耗时", "P95耗时", "最长耗时"], self)
+        self.breaker_metrics_model = DataTableModel(["主机", "状态", "连续失败", "拒绝请求", "下次探测", "最近错误"], self)
+        for title, model in (("API请求", self.endpoint_metrics_model),
+                             ("缓存", self.cache_metrics_model),
+                             ("界面更新", self.ui_metrics_model),
+                             ("熔断", self.breaker_metrics_model)):
+            view = QTableView()
+            view.setModel(model)
+            view.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+            view.verticalHeader().setVisible(False)
+            self.diagnostics_layout.addWidget(QLabel(title))
+            self.diagnostics_layout.addWidget(view)
+        self.errors_label = QLabel()
+        self.diagnostics_layout.addWidget(self.errors_label)
+        
+        self.diagnostics_timer = QTimer(self)
+        self.diagnostics_timer.setInterval(DIAGNOSTICS_REFRESH_MS)
+        self.diagnostics_timer.timeout.connect(self.update_diagnostics)
+    
+    @staticmethod
+    def format_seconds(seconds):
+        return f"{seconds * 1000:.1f} ms"
+    
+    @staticmethod
+    def format_bytes(size):
+        if size >= 1024 * 1024:
+            return f"{size / 1024 / 1024:.1f} MB"
+        if size >= 1024:
+            return f"{size / 1024:.1f} KB"
+        return f"{int(size)} B"
+    
+    def update_diagnostics(self):
+        # 接口：请求数按状态汇总，耗时来自直方图
+        endpoints = {}
+        def endpoint_row(endpoint):
+            return endpoints.setdefault(endpoint, {"requests": 0, "failed": 0, "timeout": 0, "retries": 0,
+                                                   "rejected": 0, "bytes": 0, "latency": None})
+        for labels, value in metrics.collect("weather_http_requests_total"):
+            row = endpoint_row(labels["endpoint"])
+            row["requests"] += value
+            if labels["status"] != "200":
+                row["failed"] += value
+            if labels["status"] == "timeout":
+                row["timeout"] += value
+        for name, field in (("weather_http_retries_total", "retries"),
+                            ("weather_quota_rejected_total", "rejected"),
+                            ("weather_http_response_decoded_bytes_total", "bytes")):
+            for labels, value in metrics.collect(name):
+                endpoint_row(labels["endpoint"])[field] += value
+        for labels, histogram in metrics.collect("weather_http_request_seconds"):
+            endpoint_row(labels["endpoint"])["latency"] = histogram
+        endpoint_rows = []
+        for endpoint, row in sorted(endpoints.items()):
+            latency = row["latency"]
+            endpoint_rows.append([
+                endpoint, str(row["requests"]), str(row["failed"]), str(row["timeout"]), str(row["retries"]),
+                str(row["rejected"]), self.format_bytes(row["bytes"]),
+                self.format_seconds(latency.sum / latency.count) if latency and latency.count else "-",
+                self.format_seconds(latency.quantile(0.95)) if latency and latency.count else "-"
+            ])
+        self.endpoint_metrics_model.set_rows(endpoint_rows)
+        
+        # 缓存：按类型汇总各结果的次数
+        caches = {}
+        for labels, value in metrics.collect("weather_cache_lookups_total"):
+            counts = caches.setdefault(labels["cache_type"], {})
+            counts[labels["result"]] = counts.get(labels["result"], 0) + value
+        cache_rows = []
+        for cache_type, counts in sorted(caches.items()):
+            hits = counts.get("memory_hits", 0) + counts.get("disk_hits", 0) + counts.get("stale_hits", 0)
+            lookups = hits + counts.get("misses", 0)
+            cache_rows.append([
+                cache_type, f"{hits / lookups:.0%}" if lookups else "-",
+                str(counts.get("memory_hits", 0)), str(counts.get("disk_hits", 0)),
+                str(counts.get("stale_hits", 0)), str(counts.get("misses", 0))
+            ])
+        self.cache_metrics_model.set_rows(cache_rows)
+        
+        # 界面更新方法的耗时
+        ui_rows = []
+        for labels, histogram in sorted(metrics.collect("weather_ui_update_seconds"), key=lambda item: item[0]["method"]):
+            ui_rows.append([
+                labels["method"], str(histogram.count), self.format_seconds(histogram.sum / histogram.count),
+                self.format_seconds(histogram.quantile(0.95)), self.format_seconds(histogram.max)
+            ])
+        self.ui_metrics_model.set_rows(ui_rows)
+        
+        # 各主机的熔断状态
+        breaker_rows = []
+        for host, status in sorted(circuit_breaker.get_status().items()):
+            breaker_rows.append([
+                host, BREAKER_STATE_NAMES.get(status["state"], status["state"]), str(status["failures"]),
+                str(status["rejected"]), f"{status['retry_in']:.0f} 秒后" if status["state"] == "open" else "-",
+                status["last_error"] or "-"
+            ])
+        self.breaker_metrics_model.set_rows(breaker_rows)
+        
+        errors = metrics.collect("weather_errors_total")
+        self.errors_label.setText("内部错误: " + ("，".join(f"{labels['source']} {value} 次" for labels, value in errors)
+                                                  if errors else "无"))
+    
+    def export_metrics(self):
+        path, _ = QFileDialog.getSaveFileName(self, "导出指标", "metrics.prom",
+                                              "Prometheus 文本 (*.prom *.txt);;JSON (*.json)")
+        if not path:
+            return
+        try:
+            metrics.export(path)
+            self.statusBar().showMessage(f"指标已导出到 {path}")
+        except OSError as e:
+            self.statusBar().showMessage(f"导出指标失败: {e}")
+    
+    def reset_metrics(self):
+        metrics.reset()
+        self.update_diagnostics()
+    
+    def update_quota_label(self):
+        status = quota_manager.get_status()
+        self.quota_label.setText(
+            f"今日剩余配额: {status['remaining_today']}/{quota_manager.per_day}  "
+            f"本分钟可用: {status['remaining_minute']}"
+        )
+    
+    def update_network_status(self):
+        open_hosts = circuit_breaker.open_hosts()
+        if not open_hosts:
+            self.network_label.setText("")
+            return
+        status = circuit_breaker.get_status()
+        retry_in = min(status[host]["retry_in"] for host in open_hosts)
+        self.network_label.setText(f"网络不可用，显示缓存数据（{retry_in:.0f} 秒后重试）" if retry_in
+                                   else "网络不可用，正在重试...")
+        
+        # 冷却时间到后用当前城市的实时天气作为探测请求，恢复后直接显示新数据
+        weather_host = urlsplit(config.WEATHER_URL).netloc
+        if (self.current_city_id and circuit_breaker.probe_due(weather_host)
+                and not self.fetch_engine.is_busy()):
+            self.request_parts(["current"], force=True)
+    
     def apply_styles(self):
         self.setStyleSheet("""
             QMainWindow {
                 background-color: #f0f0f0;
             }
-            QTableWidget {
+            QTableView {
                 background-color: white;
                 border-radius: 5px;
             }
-            QTableWidget::item {
+            QTableView::item {
                 padding: 5px;
             }
             QLineEdit {
@@ -443,62 +1354,237 @@ class WeatherApp(QMainWindow):
         # 更新自动补全
         self.update_completer_model()
         
-        # 保存历史记录到文件
-        self.save_history()
+        # 延迟保存历史记录到文件
+        self.schedule_state_save("history")
+    
+    def schedule_state_save(self, name):
+        # 历史记录、最后查询的城市等状态文件延迟合并写入，连续查询多个城市只写一次磁盘
+        self.dirty_state.add(name)
+        self.state_save_timer.start()
+    
+    def flush_state(self):
+        writers = {"history": self.save_history,
+                   "last_city": self.save_last_city,
+                   "pinned": self.save_pinned_cities}
+        dirty, self.dirty_state = self.dirty_state, set()
+        self.state_save_timer.stop()
+        for name in dirty:
+            writers[name]()
     
     def save_history(self):
         # 保存历史记录到文件
-        history_path = os.path.join(CACHE_DIR, "history.json")
+        history_path = os.path.join(config.CACHE_DIR, "history.json")
         try:
-            with open(history_path, "w", encoding="utf-8") as f:
-                json.dump({"history": self.history}, f, ensure_ascii=False)
+            dump_json_file(history_path, {"history": self.history})
         except Exception:
-            pass
+            metrics.inc("weather_errors_total", source="state_file")
     
     def load_history(self):
         # 从文件加载历史记录
-        history_path = os.path.join(CACHE_DIR, "history.json")
-        if os.path.exists(history_path):
-            try:
-                with open(history_path, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    self.history = data.get("history", [])
-                    self.update_completer_model()
-            except Exception:
-                pass
+        history_path = os.path.join(config.CACHE_DIR, "history.json")
+        try:
+            data = load_json_file(history_path)
+        except Exception:
+            metrics.inc("weather_errors_total", source="state_file")
+            data = None
+        if data:
+            self.history = data.get("history", [])
+            self.update_completer_model()
     
     def save_last_city(self):
         # 保存最后查询的城市
         if self.current_city_id and self.current_city_name:
-            last_city_path = os.path.join(CACHE_DIR, "last_city.json")
+            last_city_path = os.path.join(config.CACHE_DIR, "last_city.json")
             try:
-                with open(last_city_path, "w", encoding="utf-8") as f:
-                    json.dump({
-                        "id": self.current_city_id,
-                        "name": self.current_city_name
-                    }, f, ensure_ascii=False)
+                dump_json_file(last_city_path, {
+                    "id": self.current_city_id,
+                    "name": self.current_city_name
+                })
             except Exception:
-                pass
+                metrics.inc("weather_errors_total", source="state_file")
+    
+    def save_pinned_cities(self):
+        # 保存看板中固定的城市
+        pinned_path = os.path.join(config.CACHE_DIR, "pinned_cities.json")
+        try:
+            dump_json_file(pinned_path, {"cities": self.dashboard_model.cities()})
+        except Exception:
+            metrics.inc("weather_errors_total", source="state_file")
+    
+    def load_pinned_cities(self):
+        # 从文件加载看板中固定的城市
+        pinned_path = os.path.join(config.CACHE_DIR, "pinned_cities.json")
+        try:
+            data = load_json_file(pinned_path)
+            for city in (data or {}).get("cities", []):
+                self.dashboard_model.add_city(city["id"], city["name"])
+        except Exception:
+            metrics.inc("weather_errors_total", source="state_file")
+        
+        # 先显示缓存中的天气，已过期的标记为缓存数据
+        for city_id in self.dashboard_model.city_ids():
+            weather_data, stale = CacheManager.peek(city_id, "weather")
+            if weather_data:
+                self.dashboard_model.update_city(city_id, weather_data, None, "缓存数据" if stale else "正常")
+    
+    def pin_current_city(self):
+        if not self.current_city_id:
+            self.statusBar().showMessage("请先查询一个城市")
+            return
+        if self.dashboard_model.add_city(self.current_city_id, self.current_city_name):
+            self.schedule_state_save("pinned")
+            self.dashboard_engine.submit(self.current_city_id, get_weather, self.current_city_id)
+    
+    def unpin_selected_cities(self):
+        rows = sorted({index.row() for index in self.dashboard_view.selectionModel().selectedRows()}, reverse=True)
+        city_ids = self.dashboard_model.city_ids()
+        for row in rows:
+            self.dashboard_model.remove_city(city_ids[row])
+            if city_ids[row] != self.current_city_id:
+                self.scheduler.forget(city_ids[row])
+        if rows:
+            self.schedule_state_save("pinned")
+    
+    def refresh_dashboard(self, city_ids=None, force=False):
+        # 上一轮批量刷新仍在进行时不重复发起；force为True时跳过缓存（定时刷新使用）
+        if city_ids is None:
+            city_ids = self.dashboard_model.city_ids()
+        if not city_ids or self.dashboard_busy():
+            return
+        if self.async_client is not None:
+            self.dashboard_task = asyncio.ensure_future(self.refresh_dashboard_async(city_ids, force))
+            return
+        self.dashboard_engine.new_generation()
+        fetch = fetch_weather if force else get_weather
+        for city_id in city_ids:
+            self.dashboard_engine.submit(city_id, fetch, city_id)
+    
+    def dashboard_busy(self):
+        if self.async_client is not None:
+            # 预取线程也会调用：先取出任务对象，避免判断过程中被替换
+            task = self.dashboard_task
+            return task is not None and not task.done()
+        return self.dashboard_engine.is_busy()
+    
+    async def refresh_dashboard_async(self, city_ids, force=False):
+        # 所有城市在同一个事件循环中并发请求，按完成顺序更新看板
+        get = self.async_client.fetch_weather if force else self.async_client.get_weather
+        
+        async def fetch(city_id):
+            try:
+                return city_id, await get(city_id)
+            except Exception as e:
+                return city_id, e
+        for next_result in asyncio.as_completed([fetch(city_id) for city_id in city_ids]):
+            city_id, result = await next_result
+            self.on_dashboard_result(city_id, result)
+    
+    def on_dashboard_result(self, city_id, result):
+        if isinstance(result, Exception):
+            self.dashboard_model.update_city(city_id, None, f"请求异常: {result}")
+            return
+        weather_data, error = result
+        self.dashboard_model.update_city(city_id, weather_data, error)
+        self.scheduler.schedule("weather", city_id, weather_data["obsTime"] if weather_data else None)
     
     def load_last_city(self):
         # 加载历史记录
         self.load_history()
         
+        # 加载看板中固定的城市
+        self.load_pinned_cities()
+        
         # 加载最后查询的城市
-        last_city_path = os.path.join(CACHE_DIR, "last_city.json")
-        if os.path.exists(last_city_path):
-            try:
-                with open(last_city_path, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    city_id = data.get("id")
-                    city_name = data.get("name")
-                    if city_id and city_name:
-                        self.current_city_id = city_id
-                        self.current_city_name = city_name
-                        self.city_input.setText(city_name)
-                        self.refresh_weather()
-            except Exception:
-                pass
+        last_city_path = os.path.join(config.CACHE_DIR, "last_city.json")
+        try:
+            data = load_json_file(last_city_path) or {}
+        except Exception:
+            metrics.inc("weather_errors_total", source="state_file")
+            data = {}
+        city_id = data.get("id")
+        city_name = data.get("name")
+        if city_id and city_name:
+            self.current_city_id = city_id
+            self.current_city_name = city_name
+            self.city_input.setText(city_name)
+            self.setWindowTitle(f"天气查询应用 - {city_name}")
+            self.show_cached_weather()
+    
+    def show_cached_weather(self):
+        # 启动时不等网络，直接用缓存填充表格；已过期的数据在状态栏标明
+        # 缓存中的数据不需要请求，各标签页都先填充
+        self.cached_snapshot = get_cached_snapshot(self.current_city_id, self.forecast_days, self.hourly_hours)
+        weather_data, weather_stale = self.cached_snapshot["current"]
+        forecast_data, forecast_stale = self.cached_snapshot["forecast"]
+        indices, indices_stale = self.cached_snapshot["indices"]
+        hourly_data, hourly_stale = self.cached_snapshot["hourly"]
+        if indices:
+            self.current_uv_index = indices.get(config.LIFE_INDICES["5"])
+        if weather_data:
+            self.update_current_weather(weather_data, None)
+        if forecast_data:
+            self.update_forecast(forecast_data, None)
+        if indices:
+            self.update_life_indices(indices)
+        if hourly_data:
+            self.update_hourly_forecast(hourly_data, None)
+        
+        if weather_data:
+            # 启动时显示的是实时天气标签页，只有它的数据会立即更新
+            if weather_stale or indices_stale:
+                self.statusBar().showMessage(
+                    f"{self.current_city_name} 显示的是缓存数据（观测时间 {weather_data['obsTime']}），正在更新..."
+                )
+            else:
+                self.statusBar().showMessage(f"{self.current_city_name} 显示的是缓存数据")
+    
+    def revalidate_cached_data(self):
+        # 未过期的部分直接交给刷新调度；缺失或已过期的部分只请求当前可见的，其他的在切换到对应标签页时请求
+        snapshot = getattr(self, "cached_snapshot", None)
+        if self.current_city_id and snapshot is not None:
+            self.fetch_engine.new_generation()
+            self.pending_updates = set()
+            self.loaded_parts = set()
+            for name in ("current", "forecast", "indices", "hourly"):
+                data, stale = snapshot[name]
+                if data and not stale:
+                    self.loaded_parts.add(name)
+                    self.schedule_part(name, data)
+            visible = ("current",) + self.get_tab_parts(self.tabs.currentWidget())
+            self.request_parts([name for name in dict.fromkeys(visible) if name not in self.loaded_parts],
+                               force=True)
+            self.cached_snapshot = None
+        if not self.pending_updates:
+            startup_profile.mark("后台更新")
+            startup_profile.report()
+        
+        outdated = []
+        for city_id in self.dashboard_model.city_ids():
+            if city_id == self.current_city_id:
+                continue
+            weather_data, stale = CacheManager.peek(city_id, "weather")
+            if weather_data and not stale:
+                self.scheduler.schedule("weather", city_id, weather_data["obsTime"])
+            else:
+                outdated.append(city_id)
+        if outdated:
+            self.refresh_dashboard(outdated, force=True)
+        
+        # 城市索引在后台加载，首次输入联想时不再卡顿
+        background_refresher.submit(("city_index",), city_index.ensure_loaded)
+        
+        # 启动后先预取一轮，之后定时预取
+        self.prefetch_likely_cities()
+        self.prefetch_timer.start(config.PREFETCH_INTERVAL * 1000)
+    
+    def prefetch_likely_cities(self):
+        # 窗口隐藏或最小化时不预取；当前城市由自动刷新负责
+        if not config.PREFETCH_ENABLED or not self.isVisible() or self.isMinimized():
+            return
+        names = [name for name in self.history if name != self.current_city_name][:config.PREFETCH_TOP_N]
+        if names:
+            exclude = (self.current_city_id,) if self.current_city_id else ()
+            self.prefetcher.submit(names, exclude)
     
     def search_weather(self):
         city_name = self.city_input.text().strip()
@@ -508,13 +1594,26 @@ class WeatherApp(QMainWindow):
         
         self.statusBar().showMessage(f"正在查询 {city_name} 的天气...")
         
-        # 获取城市ID
-        city_id, city_name = get_city_id(city_name)
+        # 在后台获取城市ID，新的查询会使旧的请求失效
+        self.fetch_engine.new_generation()
+        self.pending_updates.clear()
+        self.fetch_engine.submit("city", get_city_id, city_name)
+    
+    def on_city_found(self, city_id, city_name):
         if not city_id:
             self.statusBar().showMessage(city_name)  # 错误信息
             return
         
-        # 保存当前城市信息
+        # 保存当前城市信息，切换城市时清除上一个城市的数据和刷新计划
+        # 其他标签页在切换过去时才会请求新城市的数据，先清空，避免显示上一个城市的内容
+        if city_id != self.current_city_id:
+            self.current_uv_index = None
+            self.forecast_model.set_rows([])
+            self.life_index_model.set_rows([])
+            self.hourly_model.set_records([])
+            if self.current_city_id:
+                pinned = self.current_city_id in self.dashboard_model.row_index
+                self.scheduler.forget(self.current_city_id, ("forecast", "index", "hourly") if pinned else None)
         self.current_city_id = city_id
         self.current_city_name = city_name
         
@@ -522,7 +1621,7 @@ class WeatherApp(QMainWindow):
         self.add_to_history(city_name)
         
         # 保存最后查询的城市
-        self.save_last_city()
+        self.schedule_state_save("last_city")
         
         # 更新窗口标题
         self.setWindowTitle(f"天气查询应用 - {city_name}")
@@ -534,115 +1633,217 @@ class WeatherApp(QMainWindow):
         if not self.current_city_id:
             return
         
+        # 上一轮刷新仍在进行时不重复发起
+        if self.fetch_engine.is_busy():
+            return
+        
         self.statusBar().showMessage(f"正在刷新 {self.current_city_name} 的天气数据...")
         self.update_all_weather_data()
     
     def update_all_weather_data(self):
-        # 获取并显示当前天气
-        self.update_current_weather()
+        self.fetch_engine.new_generation()
         
-        # 获取并显示天气预报
-        self.update_forecast()
+        # 实时天气总是获取（看板和历史趋势也使用），其他数据只获取当前标签页需要的
+        self.pending_updates = set()
+        self.loaded_parts = set()
+        self.request_parts(["current"])
+        self.load_visible_tab()
+    
+    def is_refreshing(self):
+        return self.fetch_engine.is_busy() or self.dashboard_busy()
+    
+    def on_refresh_due(self, items):
+        # 定时刷新：只请求已到期的数据，且跳过缓存直接向API取新数据
+        # 调度器只在没有进行中的请求时触发，不需要作废旧请求
+        parts = {"weather": "current", "forecast": "forecast", "hourly": "hourly", "index": "indices"}
+        current = [parts[cache_type] for cache_type, city_id in items if city_id == self.current_city_id]
+        if current:
+            self.request_parts(current, force=True)
         
-        # 获取并显示生活指数
-        self.update_life_indices()
+        # 当前城市如果也在看板中，由上面的请求结果一并更新看板
+        pinned = [city_id for cache_type, city_id in items
+                  if cache_type == "weather" and city_id != self.current_city_id
+                  and city_id in self.dashboard_model.row_index]
+        if pinned:
+            self.refresh_dashboard(pinned, force=True)
+    
+    def schedule_part(self, name, data=None):
+        # 按缓存写入时间（实时天气还参考观测时间）安排下一次自动刷新
+        city_id = self.current_city_id
+        if name == "current":
+            self.scheduler.schedule("weather", city_id, data["obsTime"] if data else None)
+        elif name == "forecast":
+            self.scheduler.schedule("forecast", city_id, cache_key=get_forecast_cache_key(city_id, self.forecast_days))
+        elif name == "hourly":
+            self.scheduler.schedule("hourly", city_id, cache_key=get_hourly_cache_key(city_id, self.hourly_hours))
+        else:
+            self.scheduler.schedule("index", city_id)
+    
+    def on_fetch_result(self, name, result):
+        # 切换预报天数/小时数之前发出的请求，结果直接丢弃
+        name, _, option = name.partition(":")
+        if option and int(option) != (self.forecast_days if name == "forecast" else self.hourly_hours):
+            return
         
-        # 更新状态栏
-        self.statusBar().showMessage(
-            f"{self.current_city_name} 天气数据已更新 - {QDateTime.currentDateTime().toString('yyyy-MM-dd hh:mm:ss')}"
-        )
+        if isinstance(result, Exception):
+            self.statusBar().showMessage(f"请求异常: {result}")
+            self.pending_updates.discard(name)
+            return
+        
+        if name == "city":
+            self.on_city_found(*result)
+            return
+        
+        if name == "current":
+            self.update_current_weather(*result)
+            weather_data, error = result
+            self.dashboard_model.update_city(self.current_city_id, weather_data, error)
+            self.schedule_part("current", weather_data)
+            self.load_history_chart()
+        elif name == "forecast":
+            self.update_forecast(*result)
+            self.schedule_part("forecast")
+        elif name == "hourly":
+            self.update_hourly_forecast(*result)
+            self.schedule_part("hourly")
+        elif name == "indices":
+            self.update_life_indices(result)
+            self.schedule_part("indices")
+        
+        self.pending_updates.discard(name)
+        if not self.pending_updates:
+            if startup_profile.mark("后台更新"):
+                startup_profile.report()
+            
+            # 更新状态栏
+            self.statusBar().showMessage(
+                f"{self.current_city_name} 天气数据已更新 - {QDateTime.currentDateTime().toString('yyyy-MM-dd hh:mm:ss')}"
+            )
     
-    def update_current_weather(self):
-        weather_data, error = get_weather(self.current_city_id)
+    @timed_ui
+    def update_current_weather(self, weather_data, error):
         if error:
             self.statusBar().showMessage(error)
             return
         
-        # 获取紫外线指数
-        uv_level, uv_category = get_life_index(self.current_city_id, index_type="5")
-        
-        # 清空表格
-        self.weather_table.setRowCount(0)
-        
-        # 添加天气数据
+        # 添加天气数据（数值字段在构造记录时解析一次）
+        now = NowWeather.from_api(weather_data)
         weather_items = [
-            ["天气状况", weather_data["text"]],
-            ["温度", f"{weather_data['temp']}°C（体感 {weather_data['feelsLike']}°C）"],
-            ["湿度", f"{weather_data['humidity']}%"],
-            ["风向风力", f"{weather_data['windDir']} {weather_data['windScale']}级"],
-            ["风速", f"{weather_data['windSpeed']} 米/秒"],
-            ["气压", f"{weather_data['pressure']} 百帕"],
-            ["降水量", f"{weather_data['precip']} 毫米"],
-            ["能见度", f"{weather_data['vis']} 公里"],
-            ["云量", f"{weather_data.get('cloud', '未知')}%"],
-            ["紫外线指数", f"{uv_level} ({uv_category})"],
-            ["观测时间", weather_data["obsTime"]]
+            ["天气状况", now.text],
+            ["温度", f"{format_number(now.temp)}°C（体感 {format_number(now.feels_like)}°C）"],
+            ["湿度", f"{format_number(now.humidity)}%"],
+            ["风向风力", f"{now.wind_dir} {now.wind_scale}级"],
+            ["风速", f"{format_number(now.wind_speed)} 米/秒"],
+            ["气压", f"{format_number(now.pressure)} 百帕"],
+            ["降水量", f"{format_number(now.precip)} 毫米"],
+            ["能见度", f"{format_number(now.vis)} 公里"],
+            ["云量", "未知" if now.cloud is None else f"{format_number(now.cloud)}%"],
+            ["紫外线指数", self.format_uv_index()],
+            ["观测时间", now.obs_time]
         ]
         
-        self.weather_table.setRowCount(len(weather_items))
-        
-        for row, (item, value) in enumerate(weather_items):
-            self.weather_table.setItem(row, 0, QTableWidgetItem(item))
-            self.weather_table.setItem(row, 1, QTableWidgetItem(value))
+        # 数据没有变化时跳过表格和图标的更新
+        if not self.weather_model.set_rows(weather_items):
+            return
         
-        # 尝试显示天气图标
-        try:
-            icon_name = get_weather_icon(weather_data["text"])
-            icon_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "icons", icon_name)
-            if os.path.exists(icon_path):
-                pixmap = QPixmap(icon_path)
-                self.weather_icon_label.setPixmap(pixmap.scaled(QSize(64, 64), Qt.KeepAspectRatio))
-            else:
-                self.weather_icon_label.setText(f"天气: {weather_data['text']}")
-        except Exception:
-            self.weather_icon_label.setText(f"天气: {weather_data['text']}")
+        # 显示天气图标（从图标缓存取已缩放好的图片）
+        pixmap = icon_cache.get_pixmap(now.text, now.icon)
+        if pixmap is not None:
+            self.weather_icon_label.setPixmap(pixmap)
+        else:
+            self.weather_icon_label.setText(f"天气: {now.text}")
+    
+    def format_uv_index(self):
+        if not self.current_uv_index:
+            return "加载中..."
+        return f"{self.current_uv_index['level']} ({self.current_uv_index['category']})"
     
-    def update_forecast(self):
-        forecast_data, error = get_3day_forecast(self.current_city_id)
+    @timed_ui
+    def update_forecast(self, forecast_data, error):
         if error:
             self.statusBar().showMessage(error)
             return
         
-        # 清空表格
-        self.forecast_table.setRowCount(0)
-        
         # 添加预报数据
-        self.forecast_table.setRowCount(len(forecast_data))
-        
-        for row, day in enumerate(forecast_data):
-            date_item = QTableWidgetItem(day["fxDate"])
-            day_weather = QTableWidgetItem(day["textDay"])
-            night_weather = QTableWidgetItem(day["textNight"])
-            temp_range = QTableWidgetItem(f"{day['tempMin']}°C ~ {day['tempMax']}°C")
-            wind_speed = QTableWidgetItem(f"{day['windDirDay']} {day['windScaleDay']}级 ({day['windSpeedDay']}米/秒)")
-            
-            self.forecast_table.setItem(row, 0, date_item)
-            self.forecast_table.setItem(row, 1, day_weather)
-            self.forecast_table.setItem(row, 2, night_weather)
-            self.forecast_table.setItem(row, 3, temp_range)
-            self.forecast_table.setItem(row, 4, wind_speed)
+        days = [DailyForecast.from_api(item) for item in forecast_data]
+        self.forecast_model.set_rows([
+            [
+                day.fx_date,
+                day.text_day,
+                day.text_night,
+                f"{format_number(day.temp_min)}°C ~ {format_number(day.temp_max)}°C",
+                f"{day.wind_dir_day} {day.wind_scale_day}级 ({format_number(day.wind_speed_day)}米/秒)"
+            ]
+            for day in days
+        ])
     
-    def update_life_indices(self):
-        # 获取所有生活指数
-        indices = get_all_life_indices(self.current_city_id)
-        
-        # 清空表格
-        self.life_index_table.setRowCount(0)
+    def set_uv_index(self, uv_index):
+        # 同步更新实时天气表中的紫外线指数
+        self.current_uv_index = uv_index
+        uv_row = self.weather_model.find_row(0, "紫外线指数")
+        if uv_row >= 0:
+            self.weather_model.set_cell(uv_row, 1, self.format_uv_index())
+    
+    @timed_ui
+    def update_hourly_forecast(self, hourly_data, error):
+        if error:
+            self.statusBar().showMessage(error)
+            return
+        self.hourly_model.set_records([HourlyForecast.from_api(item) for item in hourly_data])
+    
+    @timed_ui
+    def update_life_indices(self, indices):
+        self.set_uv_index(indices.get(config.LIFE_INDICES["5"]))
         
         # 添加生活指数数据
-        self.life_index_table.setRowCount(len(indices))
-        
-        for row, (index_name, data) in enumerate(indices.items()):
-            index_item = QTableWidgetItem(index_name)
-            level_item = QTableWidgetItem(data["level"])
-            category_item = QTableWidgetItem(data["category"])
-            
-            self.life_index_table.setItem(row, 0, index_item)
-            self.life_index_table.setItem(row, 1, level_item)
-            self.life_index_table.setItem(row, 2, category_item)
+        self.life_index_model.set_rows([
+            [index_name, data["level"], data["category"]]
+            for index_name, data in indices.items()
+        ])
+    
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self.first_painted:
+            self.first_painted = True
+            startup_profile.mark("首次绘制")
+            startup_profile.report()
+    
+    def changeEvent(self, event):
+        # 最小化时放慢自动刷新
+        if event.type() == QEvent.WindowStateChange:
+            self.scheduler.set_background(self.isMinimized())
+        super().changeEvent(event)
+    
+    def hideEvent(self, event):
+        self.scheduler.set_background(True)
+        super().hideEvent(event)
+    
+    def showEvent(self, event):
+        self.scheduler.set_background(self.isMinimized())
+        super().showEvent(event)
+    
+    def closeEvent(self, event):
+        # 写入尚未保存的状态，等待后台请求结束后再退出
+        self.flush_state()
+        self.scheduler.timer.stop()
+        self.prefetch_timer.stop()
+        self.prefetcher.stop()
+        self.quota_timer.stop()
+        self.diagnostics_timer.stop()
+        self.suggest_timer.stop()
+        self.suggest_engine.shutdown()
+        self.dashboard_engine.shutdown()
+        self.fetch_engine.shutdown()
+        self.history_engine.shutdown()
+        background_refresher.shutdown()
+        api_client.close()
+        CacheManager.close()
+        super().closeEvent(event)
 
 
 if __name__ == "__main__":
+    startup_profile.mark("导入模块")
+    
     # 创建应用
     app = QApplication(sys.argv)
     
@@ -656,12 +1857,29 @@ if __name__ == "__main__":
     # 显示启动信息
     splash.showMessage("正在加载天气查询应用...", Qt.AlignCenter | Qt.AlignBottom, Qt.black)
     
+    # 安装了qasync和aiohttp时，用asyncio事件循环驱动Qt，看板批量刷新走异步客户端
+    try:
+        import qasync
+        from weather_core.aio import AsyncWeatherClient
+        loop = qasync.QEventLoop(app)
+        asyncio.set_event_loop(loop)
+        async_client = AsyncWeatherClient()
+    except ImportError:
+        loop = None
+        async_client = None
+    startup_profile.mark("启动画面")
+    
     # 创建主窗口
-    window = WeatherApp()
+    window = WeatherApp(async_client=async_client)
     
     # 关闭启动画面，显示主窗口
     splash.finish(window)
     window.show()
     
     # 运行应用
-    sys.exit(app.exec_())
+    if loop is None:
+        sys.exit(app.exec_())
+    with loop:
+        app.lastWindowClosed.connect(loop.stop)
+        loop.run_forever()
+        loop.run_until_complete(async_client.close())
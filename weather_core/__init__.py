@@ -0,0 +1,46 @@
+# 天气查询核心：API请求、缓存和城市索引，不依赖PyQt5
+# 子模块按需加载，只导入包本身不会加载requests等较重的依赖
+import importlib
+
+_EXPORTS = {
+    "config": None,
+    "CacheManager": "cache",
+    "ApiClient": "http",
+    "api_client": "http",
+    "CircuitBreaker": "breaker",
+    "circuit_breaker": "breaker",
+    "CityIndex": "cities",
+    "city_index": "cities",
+    "normalize_city_name": "cities",
+    "get_city_id": "api",
+    "search_cities": "api",
+    "suggest_cities": "api",
+    "get_weather": "api",
+    "get_3day_forecast": "api",
+    "get_daily_forecast": "api",
+    "get_hourly_forecast": "api",
+    "get_life_index": "api",
+    "get_all_life_indices": "api",
+    "get_city_report": "api",
+    "get_weather_batch": "api",
+    "NowWeather": "models",
+    "DailyForecast": "models",
+    "HourlyForecast": "models",
+    "LifeIndex": "models",
+    "WeatherBatch": "models",
+    "HistoryStore": "history",
+    "history_store": "history",
+    "Prefetcher": "prefetch",
+    "warm_cache": "prefetch",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module_name = _EXPORTS[name]
+    if module_name is None:
+        return importlib.import_module(f"{__name__}.{name}")
+    return getattr(importlib.import_module(f"{__name__}.{module_name}"), name)
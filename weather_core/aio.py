@@ -0,0 +1,389 @@
+# 基于asyncio的和风天气客户端，与同步API共用缓存（CacheManager）和配置
+# 需要安装aiohttp；在Qt界面中使用时可配合qasync把asyncio事件循环接入Qt
+# 缓存（SQLite）、观测历史和配额文件的读写放到默认线程池中执行，事件循环只做内存缓存查找和网络请求
+import json
+import asyncio
+from urllib.parse import urlsplit
+
+from . import config
+from .breaker import circuit_breaker
+from .cache import CacheManager, get_city_cache_key, get_forecast_cache_key, get_hourly_cache_key
+from .cities import city_index
+from .history import history_store
+from .metrics import metrics
+from .models import WeatherBatch
+from .http import ApiClient, RetryPolicy
+from .quota import QuotaManager, quota_manager
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover - 可选依赖
+    aiohttp = None
+
+
+class AsyncWeatherClient:
+    def __init__(self, max_concurrency=config.ASYNC_MAX_CONCURRENCY, retry_policy=None):
+        if aiohttp is None:
+            raise ImportError("AsyncWeatherClient 需要安装 aiohttp: pip install aiohttp")
+        self.max_concurrency = max_concurrency
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.session = None
+        self.semaphore = None
+        self.in_flight = {}  # 合并键 -> 进行中的Future
+        self.refresh_tasks = set()
+        self.stats = {"requests": 0, "deduplicated": 0}
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def open(self):
+        # 会话和信号量必须在事件循环中创建
+        if self.session is None:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_concurrency,
+                limit_per_host=config.ASYNC_LIMIT_PER_HOST,
+                keepalive_timeout=config.ASYNC_KEEPALIVE_TIMEOUT
+            )
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                headers={"Accept-Encoding": "gzip, deflate"}
+            )
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+            # 城市列表CSV和配额文件在首次使用时读取，提前在线程池中完成
+            await self.run_blocking(city_index.ensure_loaded)
+            await self.run_blocking(quota_manager.get_status)
+
+    async def close(self):
+        await self.run_blocking(quota_manager.save)
+        for task in list(self.refresh_tasks):
+            task.cancel()
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def get_json(self, url, params, timeout=5, max_retries=None):
+        # 返回 (数据, 错误信息)，重试策略与同步客户端相同
+        await self.open()
+        if max_retries is None:
+            max_retries = self.retry_policy.max_retries
+        error = ApiClient.FAILED_ERROR
+        host = urlsplit(url).netloc
+        endpoint = QuotaManager.get_endpoint(url)
+        for retry in range(max_retries):
+            if retry:
+                metrics.inc("weather_http_retries_total", endpoint=endpoint)
+            # 与同步客户端共用熔断状态
+            if not circuit_breaker.allow(host):
+                return None, ApiClient.CIRCUIT_OPEN_ERROR
+            if not await self.acquire_quota(endpoint):
+                metrics.inc("weather_quota_rejected_total", endpoint=endpoint)
+                return None, ApiClient.QUOTA_ERROR
+            status = "error"
+            try:
+                async with self.semaphore:
+                    self.stats["requests"] += 1
+                    with metrics.timer("weather_http_request_seconds", endpoint=endpoint):
+                        async with self.session.get(url, params=params,
+                                                    timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                            body = await response.read()
+                    status = str(response.status)
+                    if response.status >= 500:
+                        circuit_breaker.record_failure(host, f"HTTP {response.status}")
+                    else:
+                        circuit_breaker.record_success(host)
+                    metrics.inc("weather_http_response_decoded_bytes_total", len(body), endpoint=endpoint)
+                    if response.status == 200:
+                        return json.loads(body), None
+                    error = f"请求失败，状态码: {response.status}"
+                    if not self.retry_policy.should_retry(response.status):
+                        return None, error
+            except asyncio.TimeoutError:
+                status = "timeout"
+                error = ApiClient.TIMEOUT_ERROR
+                circuit_breaker.record_failure(host, error)
+            except (aiohttp.ClientError, ValueError) as e:
+                error = f"网络请求异常: {str(e)}"
+                if status == "error":
+                    circuit_breaker.record_failure(host, error)
+            finally:
+                metrics.inc("weather_http_requests_total", endpoint=endpoint, status=status)
+            if circuit_breaker.is_open(host):
+                return None, ApiClient.CIRCUIT_OPEN_ERROR
+            if retry < max_retries - 1:
+                await asyncio.sleep(self.retry_policy.get_delay(retry))
+        return None, error
+
+    async def acquire_quota(self, endpoint):
+        # 与同步客户端共用配额：分钟配额不足时在事件循环中等待，当日配额用完直接放弃
+        deadline = asyncio.get_event_loop().time() + config.QUOTA_MAX_WAIT
+        while True:
+            wait = quota_manager.reserve(endpoint, autosave=False)
+            if wait == 0:
+                if quota_manager.claim_save():
+                    asyncio.get_event_loop().run_in_executor(None, quota_manager.save)
+                return True
+            if wait is None or asyncio.get_event_loop().time() + wait > deadline:
+                return False
+            await asyncio.sleep(wait)
+
+    async def run_blocking(self, func, *args):
+        return await asyncio.get_event_loop().run_in_executor(None, func, *args)
+
+    async def read_cache(self, key, cache_type):
+        # 返回 (数据, 是否已过期)；内存缓存中有该条目时直接读取，需要读磁盘时放到线程池
+        if CacheManager.memory.get(key, cache_type) is not None:
+            return CacheManager.get_cache_entry(key, cache_type)
+        return await self.run_blocking(CacheManager.get_cache_entry, key, cache_type)
+
+    async def save_to_cache(self, key, data, cache_type):
+        await self.run_blocking(CacheManager.save_to_cache, key, data, cache_type)
+
+    async def serve_last_known(self, key, cache_type, error):
+        # 与 api.serve_last_known 相同：配额不足或主机熔断时用缓存中的旧数据兜底
+        if error not in (ApiClient.QUOTA_ERROR, ApiClient.CIRCUIT_OPEN_ERROR):
+            return None
+        return await self.run_blocking(CacheManager.get_last_known, key, cache_type)
+
+    async def coalesce(self, key, coro_func, *args):
+        # 同一个键的并发请求只发起一次，其余调用方等待同一个Future
+        future = self.in_flight.get(key)
+        if future is not None:
+            self.stats["deduplicated"] += 1
+            return await asyncio.shield(future)
+        future = asyncio.ensure_future(coro_func(*args))
+        self.in_flight[key] = future
+        try:
+            return await asyncio.shield(future)
+        finally:
+            if future.done():
+                self.in_flight.pop(key, None)
+            else:
+                future.add_done_callback(lambda _: self.in_flight.pop(key, None))
+
+    def refresh_in_background(self, key, coro_func, *args):
+        # 宽限期内的过期缓存先返回，再在后台刷新
+        if key in self.in_flight:
+            return
+        task = asyncio.ensure_future(self.coalesce(key, coro_func, *args))
+        self.refresh_tasks.add(task)
+        task.add_done_callback(self.refresh_tasks.discard)
+
+    async def get_city_id(self, city_name, timeout=5, max_retries=3):
+        # 先查本地城市索引，其次缓存，最后请求API
+        city = city_index.lookup(city_name)
+        metrics.inc("weather_cache_lookups_total", cache_type="city_index",
+                    result="memory_hits" if city else "misses")
+        if city:
+            return city["id"], city["name"]
+        cache_key = get_city_cache_key(city_name)
+        cached_data, stale = await self.read_cache(cache_key, "city")
+        if cached_data and not stale:
+            return cached_data["id"], cached_data["name"]
+        city_id, city_name_or_error = await self.coalesce(("city", city_name), self.fetch_city_id,
+                                                          city_name, timeout, max_retries)
+        if not city_id:
+            last_known = await self.serve_last_known(cache_key, "city", city_name_or_error)
+            if last_known:
+                return last_known["id"], last_known["name"]
+        return city_id, city_name_or_error
+
+    async def fetch_city_id(self, city_name, timeout=5, max_retries=3):
+        params = {"location": city_name, "key": config.API_KEY}
+        data, error = await self.get_json(config.CITY_SEARCH_URL, params, timeout, max_retries)
+        if error:
+            return None, error
+        if data["code"] == "200" and data["location"]:
+            result = {"id": data["location"][0]["id"], "name": data["location"][0]["name"]}
+            await self.save_to_cache(get_city_cache_key(city_name), result, "city")
+            city_index.add_city(city_name, result["id"], result["name"])
+            return result["id"], result["name"]
+        return None, f"城市搜索失败: {data.get('message', '未知错误')}"
+
+    async def get_cached(self, key, cache_type, coro_func, *args):
+        # 通用的缓存读取流程：新鲜数据直接返回，宽限期内的旧数据返回并后台刷新
+        cached_data, stale = await self.read_cache(key, cache_type)
+        if cached_data:
+            if stale:
+                self.refresh_in_background((cache_type, key), coro_func, *args)
+            return cached_data, None
+        data, error = await self.coalesce((cache_type, key), coro_func, *args)
+        last_known = await self.serve_last_known(key, cache_type, error)
+        if last_known:
+            return last_known, None
+        return data, error
+
+    async def get_weather(self, city_id, timeout=5, max_retries=3):
+        return await self.get_cached(city_id, "weather", self.fetch_weather, city_id, timeout, max_retries)
+
+    async def fetch_weather(self, city_id, timeout=5, max_retries=3):
+        params = {"location": city_id, "key": config.API_KEY, "lang": "zh", "unit": "m"}
+        data, error = await self.get_json(config.WEATHER_URL, params, timeout, max_retries)
+        if error:
+            return None, error
+        if data["code"] == "200":
+            await self.save_to_cache(city_id, data["now"], "weather")
+            if config.HISTORY_ENABLED:
+                await self.run_blocking(history_store.append, city_id, data["now"])
+            return data["now"], None
+        return None, f"错误: {data['code']} - {data.get('message', '未知错误')}"
+
+    async def get_3day_forecast(self, city_id, timeout=5, max_retries=3):
+        return await self.get_daily_forecast(city_id, 3, timeout, max_retries)
+
+    async def fetch_3day_forecast(self, city_id, timeout=5, max_retries=3):
+        return await self.fetch_daily_forecast(city_id, 3, timeout, max_retries)
+
+    async def get_daily_forecast(self, city_id, days=3, timeout=5, max_retries=3):
+        return await self.get_cached(get_forecast_cache_key(city_id, days), "forecast",
+                                     self.fetch_daily_forecast, city_id, days, timeout, max_retries)
+
+    async def fetch_daily_forecast(self, city_id, days=3, timeout=5, max_retries=3):
+        url = config.FORECAST_URL if days == 3 else config.FORECAST_DAYS_URL.format(days)
+        params = {"location": city_id, "key": config.API_KEY, "lang": "zh", "unit": "m"}
+        data, error = await self.get_json(url, params, timeout, max_retries)
+        if error:
+            return None, error
+        if data["code"] == "200":
+            await self.save_to_cache(get_forecast_cache_key(city_id, days), data["daily"], "forecast")
+            return data["daily"], None
+        return None, f"错误: {data['code']} - {data.get('message', '未知错误')}"
+
+    async def get_hourly_forecast(self, city_id, hours=24, timeout=5, max_retries=3):
+        return await self.get_cached(get_hourly_cache_key(city_id, hours), "hourly",
+                                     self.fetch_hourly_forecast, city_id, hours, timeout, max_retries)
+
+    async def fetch_hourly_forecast(self, city_id, hours=24, timeout=5, max_retries=3):
+        params = {"location": city_id, "key": config.API_KEY, "lang": "zh", "unit": "m"}
+        data, error = await self.get_json(config.HOURLY_URL.format(hours), params, timeout, max_retries)
+        if error:
+            return None, error
+        if data["code"] == "200":
+            await self.save_to_cache(get_hourly_cache_key(city_id, hours), data["hourly"], "hourly")
+            return data["hourly"], None
+        return None, f"错误: {data['code']} - {data.get('message', '未知错误')}"
+
+    async def get_life_index(self, city_id, index_type="5", timeout=5, max_retries=3):
+        cache_key = f"{city_id}_{index_type}"
+        cached_data, stale = await self.read_cache(cache_key, "index")
+        if cached_data:
+            if stale:
+                self.refresh_in_background(("index", cache_key), self.fetch_life_indices,
+                                           city_id, (index_type,), timeout, max_retries)
+            return cached_data["level"], cached_data["category"]
+        
+        results, error = await self.coalesce(("index", cache_key), self.fetch_life_indices,
+                                             city_id, (index_type,), timeout, max_retries)
+        last_known = await self.serve_last_known(cache_key, "index", error)
+        if last_known:
+            return last_known["level"], last_known["category"]
+        if error == ApiClient.CIRCUIT_OPEN_ERROR:
+            return "未知", "网络不可用"
+        if error:
+            return "未知", "请求超时" if error == ApiClient.TIMEOUT_ERROR else "网络异常"
+        if index_type not in results:
+            return "未知", "未知"
+        return results[index_type]["level"], results[index_type]["category"]
+
+    async def fetch_life_indices(self, city_id, index_types, timeout=5, max_retries=3):
+        # 一次请求获取多个生活指数，返回 ({指数类型: {"level", "category"}}, 错误信息)
+        params = {"location": city_id, "key": config.API_KEY, "type": ",".join(index_types), "lang": "zh"}
+        data, error = await self.get_json(config.INDEX_URL, params, timeout, max_retries)
+        if error:
+            return None, error
+        if data["code"] != "200":
+            return None, f"错误: {data['code']} - {data.get('message', '未知错误')}"
+        results = {}
+        for item in data.get("daily", []):
+            index_type = item.get("type")
+            if index_type in index_types and index_type not in results:
+                results[index_type] = {"level": item["level"], "category": item["category"]}
+                await self.save_to_cache(f"{city_id}_{index_type}", results[index_type], "index")
+        return results, None
+
+    async def get_all_life_indices(self, city_id):
+        # 与 api.get_all_life_indices 相同：只请求缺失的指数，过期的指数在后台批量刷新，请求失败时用旧数据兜底
+        results = {}
+        missing = []
+        stale_types = []
+        for index_id in config.LIFE_INDICES:
+            cached_data, stale = await self.read_cache(f"{city_id}_{index_id}", "index")
+            if cached_data:
+                results[index_id] = cached_data
+                if stale:
+                    stale_types.append(index_id)
+            else:
+                missing.append(index_id)
+        
+        if stale_types:
+            self.refresh_in_background(("index_batch", city_id, tuple(stale_types)),
+                                       self.fetch_life_indices, city_id, tuple(stale_types))
+        
+        if missing:
+            batch, error = await self.coalesce(("index_batch", city_id, tuple(missing)),
+                                               self.fetch_life_indices, city_id, tuple(missing))
+            if batch is None:
+                for index_id in missing:
+                    last_known = await self.run_blocking(CacheManager.get_last_known,
+                                                         f"{city_id}_{index_id}", "index")
+                    results[index_id] = last_known or {"level": "未知", "category": "网络异常"}
+            else:
+                results.update(batch)
+        
+        # 批量响应中缺失的指数单独请求
+        absent = [index_id for index_id in config.LIFE_INDICES if index_id not in results]
+        if absent:
+            singles = await asyncio.gather(*(self.get_life_index(city_id, index_id) for index_id in absent))
+            for index_id, (level, category) in zip(absent, singles):
+                results[index_id] = {"level": level, "category": category}
+        return {index_name: results[index_id] for index_id, index_name in config.LIFE_INDICES.items()}
+
+    async def get_weather_many(self, city_ids):
+        # 并发获取多个城市的实时天气，返回 {城市ID: (数据, 错误信息)}
+        results = await asyncio.gather(*(self.get_weather(city_id) for city_id in city_ids))
+        return dict(zip(city_ids, results))
+
+    async def get_weather_batch(self, city_ids):
+        # 与 get_weather_many 相同，但结果按列存入 WeatherBatch
+        return WeatherBatch.from_results(await self.get_weather_many(city_ids))
+
+    async def get_city_report(self, city_name, parts=("now", "forecast", "indices")):
+        # 与 api.get_city_report 返回相同格式的结果
+        report = {"query": city_name, "id": None, "name": None, "error": None}
+        city_id, city_name_or_error = await self.get_city_id(city_name)
+        if not city_id:
+            report["error"] = city_name_or_error
+            return report
+        report["id"] = city_id
+        report["name"] = city_name_or_error
+        
+        # 同一城市的各类数据也并发获取
+        jobs = {}
+        if "now" in parts:
+            jobs["now"] = self.get_weather(city_id)
+        if "forecast" in parts:
+            jobs["forecast"] = self.get_3day_forecast(city_id)
+        if "indices" in parts:
+            jobs["indices"] = self.get_all_life_indices(city_id)
+        results = dict(zip(jobs, await asyncio.gather(*jobs.values())))
+        
+        errors = []
+        for part in ("now", "forecast"):
+            if part in results:
+                report[part], error = results[part]
+                if error:
+                    errors.append(error)
+        if "indices" in results:
+            report["indices"] = results["indices"]
+        if errors:
+            report["error"] = "; ".join(errors)
+        return report
+
+
+async def fetch_many(city_names, parts=("now", "forecast", "indices")):
+    # 在一个事件循环里并发查询大量城市，结果顺序与输入一致
+    async with AsyncWeatherClient() as client:
+        return await asyncio.gather(*(client.get_city_report(city_name, parts) for city_name in city_names))
@@ -0,0 +1,350 @@
+from . import config
+from .cache import CacheManager, get_city_cache_key, get_forecast_cache_key, get_hourly_cache_key
+from .cities import city_index, normalize_city_name
+from .concurrency import background_refresher, single_flight
+from .history import history_store
+from .metrics import metrics
+from .models import WeatherBatch
+from .http import ApiClient, api_client
+
+
+# 配额不足、主机熔断时生活指数的类别文字
+QUOTA_CATEGORY = "配额不足"
+OFFLINE_CATEGORY = "网络不可用"
+
+def serve_last_known(key, cache_type, error):
+    # 配额不足或主机熔断时优先返回已过期的缓存数据，而不是直接报错
+    if error not in (ApiClient.QUOTA_ERROR, QUOTA_CATEGORY, ApiClient.CIRCUIT_OPEN_ERROR, OFFLINE_CATEGORY):
+        return None
+    return CacheManager.get_last_known(key, cache_type)
+
+# API请求函数
+def get_city_id(city_name, timeout=5, max_retries=3):
+    # 先查本地城市索引，命中时不需要网络请求
+    city = city_index.lookup(city_name)
+    metrics.inc("weather_cache_lookups_total", cache_type="city_index",
+                result="memory_hits" if city else "misses")
+    if city:
+        return city["id"], city["name"]
+    
+    # 检查缓存
+    cache_key = get_city_cache_key(city_name)
+    cached_data = CacheManager.get_from_cache(cache_key, "city")
+    if cached_data:
+        return cached_data["id"], cached_data["name"]
+    
+    city_id, city_name_or_error = fetch_city_id(city_name, timeout, max_retries)
+    if not city_id:
+        last_known = serve_last_known(cache_key, "city", city_name_or_error)
+        if last_known:
+            return last_known["id"], last_known["name"]
+    return city_id, city_name_or_error
+
+@single_flight.coalesce("city")
+def fetch_city_id(city_name, timeout=5, max_retries=3):
+    # 发起API请求
+    cache_key = get_city_cache_key(city_name)
+    params = {"location": city_name, "key": config.API_KEY}
+    data, error = api_client.get_json(config.CITY_SEARCH_URL, params, timeout, max_retries)
+    if error:
+        return None, error
+    if data["code"] == "200" and data["location"]:
+        result = {"id": data["location"][0]["id"], "name": data["location"][0]["name"]}
+        # 保存到缓存
+        CacheManager.save_to_cache(cache_key, result, "city")
+        city_index.add_city(city_name, result["id"], result["name"])
+        return result["id"], result["name"]
+    return None, f"城市搜索失败: {data.get('message', '未知错误')}"
+
+def search_cities(keyword, limit=config.SUGGEST_LIMIT, timeout=5, max_retries=1):
+    # 城市模糊搜索（用于输入联想），返回 [{"id", "name", "adm1", "adm2"}]
+    cached_data = CacheManager.get_from_cache(normalize_city_name(keyword), "city_search")
+    if cached_data is not None:
+        return cached_data
+    
+    return fetch_city_search(keyword, limit, timeout, max_retries)
+
+@single_flight.coalesce("city_search")
+def fetch_city_search(keyword, limit=config.SUGGEST_LIMIT, timeout=5, max_retries=1):
+    # 发起API请求
+    params = {"location": keyword, "key": config.API_KEY, "number": limit}
+    data, error = api_client.get_json(config.CITY_SEARCH_URL, params, timeout, max_retries)
+    if error or data["code"] not in ("200", "404"):
+        return []
+    results = [
+        {"id": loc["id"], "name": loc["name"], "adm1": loc.get("adm1", ""), "adm2": loc.get("adm2", "")}
+        for loc in data.get("location") or []
+    ]
+    # 保存到缓存，并把结果加入本地城市索引
+    CacheManager.save_to_cache(normalize_city_name(keyword), results, "city_search")
+    for city in results:
+        city_index.add_city(city["name"], city["id"], city["name"], city["adm1"], city["adm2"])
+    return results
+
+def suggest_cities(prefix, history=(), limit=config.SUGGEST_LIMIT):
+    # 输入联想：历史记录中的匹配项排在前面，其次是城市索引的前缀匹配
+    key = normalize_city_name(prefix)
+    if not key:
+        return list(history)[:limit]
+    index_names = [city["name"] for city in city_index.search_prefix(prefix, limit, distinct_names=True)]
+    suggestions = [name for name in history
+                   if name in index_names or normalize_city_name(name).startswith(key)]
+    for name in index_names:
+        if name not in suggestions:
+            suggestions.append(name)
+    return suggestions[:limit]
+
+def get_life_index(city_id, index_type="5", timeout=5, max_retries=3):
+    # 检查缓存，宽限期内的过期数据直接返回并在后台刷新
+    cache_key = f"{city_id}_{index_type}"
+    cached_data, stale = CacheManager.get_cache_entry(cache_key, "index")
+    if cached_data:
+        if stale:
+            background_refresher.submit(("index", cache_key), fetch_life_index, city_id, index_type, timeout, max_retries)
+        return cached_data["level"], cached_data["category"]
+    
+    level, category = fetch_life_index(city_id, index_type, timeout, max_retries)
+    last_known = serve_last_known(cache_key, "index", category)
+    if last_known:
+        return last_known["level"], last_known["category"]
+    return level, category
+
+@single_flight.coalesce("index")
+def fetch_life_index(city_id, index_type="5", timeout=5, max_retries=3):
+    # 发起API请求
+    params = {
+        "location": city_id,
+        "key": config.API_KEY,
+        "type": index_type,
+        "lang": "zh"
+    }
+    data, error = api_client.get_json(config.INDEX_URL, params, timeout, max_retries)
+    if error == ApiClient.QUOTA_ERROR:
+        return "未知", QUOTA_CATEGORY
+    if error == ApiClient.CIRCUIT_OPEN_ERROR:
+        return "未知", OFFLINE_CATEGORY
+    if error:
+        return "未知", "请求超时" if error == ApiClient.TIMEOUT_ERROR else "网络异常"
+    if data["code"] == "200" and data.get("daily"):
+        result = {"level": data["daily"][0]["level"], "category": data["daily"][0]["category"]}
+        # 保存到缓存
+        CacheManager.save_to_cache(f"{city_id}_{index_type}", result, "index")
+        return result["level"], result["category"]
+    return "未知", "未知"
+
+@single_flight.coalesce("index_batch")
+def get_life_indices_batch(city_id, index_types, timeout=5, max_retries=3):
+    # 一次请求获取多个生活指数，返回 {指数类型: {"level", "category"}}；请求失败返回None
+    params = {
+        "location": city_id,
+        "key": config.API_KEY,
+        "type": ",".join(index_types),
+        "lang": "zh"
+    }
+    data, error = api_client.get_json(config.INDEX_URL, params, timeout, max_retries)
+    if error or data["code"] != "200":
+        return None
+    results = {}
+    for item in data.get("daily", []):
+        index_type = item.get("type")
+        if index_type in index_types and index_type not in results:
+            result = {"level": item["level"], "category": item["category"]}
+            # 按指数类型分别写入缓存，与单个请求共用缓存条目
+            CacheManager.save_to_cache(f"{city_id}_{index_type}", result, "index")
+            results[index_type] = result
+    return results
+
+def get_all_life_indices(city_id):
+    results = {}
+    
+    # 先从缓存读取，只请求缺失的指数；过期的指数在后台批量刷新
+    missing = []
+    stale_types = []
+    for index_id in config.LIFE_INDICES:
+        cached_data, stale = CacheManager.get_cache_entry(f"{city_id}_{index_id}", "index")
+        if cached_data:
+            results[index_id] = cached_data
+            if stale:
+                stale_types.append(index_id)
+        else:
+            missing.append(index_id)
+    
+    if stale_types:
+        background_refresher.submit(("index_batch", city_id), get_life_indices_batch, city_id, stale_types)
+    
+    if missing:
+        batch = get_life_indices_batch(city_id, missing)
+        if batch is None:
+            # 批量请求失败（网络异常或配额不足）时不再逐个重试，有旧数据时用旧数据兜底
+            for index_id in missing:
+                last_known = CacheManager.get_last_known(f"{city_id}_{index_id}", "index")
+                results[index_id] = last_known or {"level": "未知", "category": "网络异常"}
+        else:
+            results.update(batch)
+    
+    indices = {}
+    for index_id, index_name in config.LIFE_INDICES.items():
+        if index_id in results:
+            indices[index_name] = results[index_id]
+        else:
+            # 批量响应中缺失的指数单独请求
+            level, category = fetch_life_index(city_id, index_id)
+            indices[index_name] = {"level": level, "category": category}
+    return indices
+
+def fetch_all_life_indices(city_id):
+    # 跳过缓存直接批量请求全部生活指数（定时刷新使用），请求失败时用缓存中的旧数据
+    batch = get_life_indices_batch(city_id, list(config.LIFE_INDICES)) or {}
+    indices = {}
+    for index_id, index_name in config.LIFE_INDICES.items():
+        data = batch.get(index_id) or CacheManager.get_last_known(f"{city_id}_{index_id}", "index")
+        indices[index_name] = data or {"level": "未知", "category": "网络异常"}
+    return indices
+
+def get_weather(city_id, timeout=5, max_retries=3):
+    # 检查缓存，宽限期内的过期数据直接返回并在后台刷新
+    cached_data, stale = CacheManager.get_cache_entry(city_id, "weather")
+    if cached_data:
+        if stale:
+            background_refresher.submit(("weather", city_id), fetch_weather, city_id, timeout, max_retries)
+        return cached_data, None
+    
+    data, error = fetch_weather(city_id, timeout, max_retries)
+    if error:
+        last_known = serve_last_known(city_id, "weather", error)
+        if last_known:
+            return last_known, None
+    return data, error
+
+@single_flight.coalesce("weather")
+def fetch_weather(city_id, timeout=5, max_retries=3):
+    # 发起API请求
+    params = {"location": city_id, "key": config.API_KEY, "lang": "zh", "unit": "m"}
+    data, error = api_client.get_json(config.WEATHER_URL, params, timeout, max_retries)
+    if error:
+        return None, error
+    if data["code"] == "200":
+        # 保存到缓存，并追加到观测历史
+        CacheManager.save_to_cache(city_id, data["now"], "weather")
+        if config.HISTORY_ENABLED:
+            history_store.append(city_id, data["now"])
+        return data["now"], None
+    return None, f"错误: {data['code']} - {data.get('message', '未知错误')}"
+
+def get_3day_forecast(city_id, timeout=5, max_retries=3):
+    return get_daily_forecast(city_id, 3, timeout, max_retries)
+
+def fetch_3day_forecast(city_id, timeout=5, max_retries=3):
+    return fetch_daily_forecast(city_id, 3, timeout, max_retries)
+
+def get_daily_forecast(city_id, days=3, timeout=5, max_retries=3):
+    # 检查缓存，宽限期内的过期数据直接返回并在后台刷新
+    cache_key = get_forecast_cache_key(city_id, days)
+    cached_data, stale = CacheManager.get_cache_entry(cache_key, "forecast")
+    if cached_data:
+        if stale:
+            background_refresher.submit(("forecast", cache_key), fetch_daily_forecast, city_id, days, timeout, max_retries)
+        return cached_data, None
+    
+    data, error = fetch_daily_forecast(city_id, days, timeout, max_retries)
+    if error:
+        last_known = serve_last_known(cache_key, "forecast", error)
+        if last_known:
+            return last_known, None
+    return data, error
+
+@single_flight.coalesce("forecast")
+def fetch_daily_forecast(city_id, days=3, timeout=5, max_retries=3):
+    # 发起API请求
+    url = config.FORECAST_URL if days == 3 else config.FORECAST_DAYS_URL.format(days)
+    params = {"location": city_id, "key": config.API_KEY, "lang": "zh", "unit": "m"}
+    data, error = api_client.get_json(url, params, timeout, max_retries)
+    if error:
+        return None, error
+    if data["code"] == "200":
+        # 保存到缓存
+        CacheManager.save_to_cache(get_forecast_cache_key(city_id, days), data["daily"], "forecast")
+        return data["daily"], None
+    return None, f"错误: {data['code']} - {data.get('message', '未知错误')}"
+
+def get_hourly_forecast(city_id, hours=24, timeout=5, max_retries=3):
+    # 逐小时预报，缓存和后台刷新的处理与逐日预报相同
+    cache_key = get_hourly_cache_key(city_id, hours)
+    cached_data, stale = CacheManager.get_cache_entry(cache_key, "hourly")
+    if cached_data:
+        if stale:
+            background_refresher.submit(("hourly", cache_key), fetch_hourly_forecast, city_id, hours, timeout, max_retries)
+        return cached_data, None
+    
+    data, error = fetch_hourly_forecast(city_id, hours, timeout, max_retries)
+    if error:
+        last_known = serve_last_known(cache_key, "hourly", error)
+        if last_known:
+            return last_known, None
+    return data, error
+
+@single_flight.coalesce("hourly")
+def fetch_hourly_forecast(city_id, hours=24, timeout=5, max_retries=3):
+    # 发起API请求
+    params = {"location": city_id, "key": config.API_KEY, "lang": "zh", "unit": "m"}
+    data, error = api_client.get_json(config.HOURLY_URL.format(hours), params, timeout, max_retries)
+    if error:
+        return None, error
+    if data["code"] == "200":
+        # 保存到缓存
+        CacheManager.save_to_cache(get_hourly_cache_key(city_id, hours), data["hourly"], "hourly")
+        return data["hourly"], None
+    return None, f"错误: {data['code']} - {data.get('message', '未知错误')}"
+
+# 一个城市的完整数据（命令行批量查询使用）
+def get_cached_snapshot(city_id, days=3, hours=24):
+    # 只读缓存、不发起请求：返回 {部分: (数据, 是否已过期)}，没有缓存的部分数据为None
+    # 已过期的数据同样返回，由调用方标记为旧数据后再在后台更新
+    snapshot = {
+        "current": CacheManager.peek(city_id, "weather"),
+        "forecast": CacheManager.peek(get_forecast_cache_key(city_id, days), "forecast"),
+        "hourly": CacheManager.peek(get_hourly_cache_key(city_id, hours), "hourly"),
+    }
+    indices = {}
+    indices_stale = False
+    for index_id, index_name in config.LIFE_INDICES.items():
+        data, stale = CacheManager.peek(f"{city_id}_{index_id}", "index")
+        if data:
+            indices[index_name] = data
+            indices_stale = indices_stale or stale
+    snapshot["indices"] = (indices or None, indices_stale or len(indices) < len(config.LIFE_INDICES))
+    return snapshot
+
+def get_weather_batch(city_ids, max_workers=8):
+    # 多线程获取多个城市的实时天气，结果按列存入 WeatherBatch（数值字段只解析一次）
+    from concurrent.futures import ThreadPoolExecutor
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = dict(zip(city_ids, executor.map(get_weather, city_ids)))
+    return WeatherBatch.from_results(results)
+
+REPORT_PARTS = ("now", "forecast", "indices")
+
+def get_city_report(city_name, parts=REPORT_PARTS):
+    report = {"query": city_name, "id": None, "name": None, "error": None}
+    city_id, city_name_or_error = get_city_id(city_name)
+    if not city_id:
+        report["error"] = city_name_or_error
+        return report
+    report["id"] = city_id
+    report["name"] = city_name_or_error
+    
+    errors = []
+    if "now" in parts:
+        report["now"], error = get_weather(city_id)
+        if error:
+            errors.append(error)
+    if "forecast" in parts:
+        report["forecast"], error = get_3day_forecast(city_id)
+        if error:
+            errors.append(error)
+    if "indices" in parts:
+        report["indices"] = get_all_life_indices(city_id)
+    if errors:
+        report["error"] = "; ".join(errors)
+    return report
@@ -0,0 +1,134 @@
+# 熔断器：按主机统计连续失败次数，网络不通时快速失败，不再让每个请求都等待超时和重试
+# closed（正常）-> 连续失败达到阈值 -> open（直接拒绝请求，调用方改用缓存数据）
+# open -> 冷却时间到 -> half_open（只放行一个探测请求）-> 成功则恢复closed，失败则重新open且冷却时间加倍
+import time
+import threading
+
+from . import config
+from .metrics import metrics
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class HostCircuit:
+    def __init__(self, reset_timeout):
+        self.state = CLOSED
+        self.failures = 0  # 连续失败次数
+        self.opened_at = 0
+        self.reset_timeout = reset_timeout  # 当前的冷却时间（秒）
+        self.probe_started = None  # 进行中的探测请求的开始时间
+        self.rejected = 0
+        self.last_error = None
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=None, reset_timeout=None, max_reset_timeout=None):
+        self.failure_threshold = failure_threshold or config.BREAKER_FAILURE_THRESHOLD
+        self.reset_timeout = reset_timeout or config.BREAKER_RESET_TIMEOUT
+        self.max_reset_timeout = max_reset_timeout or config.BREAKER_MAX_RESET_TIMEOUT
+        self.circuits = {}
+        self.lock = threading.Lock()
+
+    def get_circuit(self, host):
+        # 调用方需持有锁
+        circuit = self.circuits.get(host)
+        if circuit is None:
+            circuit = self.circuits[host] = HostCircuit(self.reset_timeout)
+        return circuit
+
+    def set_state(self, host, circuit, state):
+        if circuit.state != state:
+            circuit.state = state
+            metrics.inc("weather_breaker_transitions_total", host=host, state=state)
+
+    def allow(self, host):
+        # 返回是否可以发起请求；冷却时间到后只放行一个探测请求，其余请求继续快速失败
+        if not config.BREAKER_ENABLED:
+            return True
+        with self.lock:
+            circuit = self.circuits.get(host)
+            if circuit is None or circuit.state == CLOSED:
+                return True
+            now = time.monotonic()
+            if circuit.state == OPEN and now - circuit.opened_at >= circuit.reset_timeout:
+                self.set_state(host, circuit, HALF_OPEN)
+                circuit.probe_started = None
+            # 探测请求长时间没有结果（如被配额拒绝）时允许重新探测
+            if circuit.state == HALF_OPEN and (circuit.probe_started is None
+                                               or now - circuit.probe_started > circuit.reset_timeout):
+                circuit.probe_started = now
+                metrics.inc("weather_breaker_probes_total", host=host)
+                return True
+            circuit.rejected += 1
+            metrics.inc("weather_breaker_rejected_total", host=host)
+            return False
+
+    def record_success(self, host):
+        # 收到了HTTP响应（5xx除外），说明主机可达
+        with self.lock:
+            circuit = self.circuits.get(host)
+            if circuit is None:
+                return
+            circuit.failures = 0
+            circuit.reset_timeout = self.reset_timeout
+            circuit.probe_started = None
+            self.set_state(host, circuit, CLOSED)
+
+    def record_failure(self, host, error=None):
+        # 超时、连接错误或5xx：连续失败达到阈值或探测失败时打开熔断
+        if not config.BREAKER_ENABLED:
+            return
+        with self.lock:
+            circuit = self.get_circuit(host)
+            circuit.failures += 1
+            circuit.last_error = error
+            if circuit.state == HALF_OPEN:
+                circuit.reset_timeout = min(self.max_reset_timeout, circuit.reset_timeout * 2)
+            elif circuit.state == OPEN or circuit.failures < self.failure_threshold:
+                return
+            circuit.opened_at = time.monotonic()
+            circuit.probe_started = None
+            self.set_state(host, circuit, OPEN)
+
+    def is_open(self, host):
+        with self.lock:
+            circuit = self.circuits.get(host)
+            return circuit is not None and circuit.state == OPEN
+
+    def probe_due(self, host):
+        # 熔断中且冷却时间已到，下一个请求会作为探测请求放行
+        with self.lock:
+            circuit = self.circuits.get(host)
+            if circuit is None or circuit.state == CLOSED:
+                return False
+            if circuit.state == HALF_OPEN:
+                return circuit.probe_started is None
+            return time.monotonic() - circuit.opened_at >= circuit.reset_timeout
+
+    def get_status(self):
+        # 返回 {主机: {"state", "failures", "rejected", "retry_in", "last_error"}}，retry_in为距下次探测的秒数
+        now = time.monotonic()
+        with self.lock:
+            return {
+                host: {
+                    "state": circuit.state,
+                    "failures": circuit.failures,
+                    "rejected": circuit.rejected,
+                    "retry_in": max(0.0, circuit.opened_at + circuit.reset_timeout - now)
+                    if circuit.state == OPEN else 0.0,
+                    "last_error": circuit.last_error
+                }
+                for host, circuit in self.circuits.items()
+            }
+
+    def open_hosts(self):
+        return [host for host, status in self.get_status().items() if status["state"] != CLOSED]
+
+    def reset(self):
+        with self.lock:
+            self.circuits.clear()
+
+
+circuit_breaker = CircuitBreaker()
@@ -0,0 +1,339 @@
+import os
+import time
+import json
+import glob
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from . import config
+from .metrics import metrics
+from .serialize import dump_json_file, get_serializer, load_json_file, loads_any
+
+
+# 确保缓存目录存在
+def ensure_cache_dir():
+    if not os.path.exists(config.CACHE_DIR):
+        os.makedirs(config.CACHE_DIR)
+
+def get_cache_ttl(cache_type):
+    return config.CACHE_TTL.get(cache_type, config.CACHE_EXPIRY)
+
+def get_cache_grace(cache_type):
+    return config.CACHE_STALE_GRACE.get(cache_type, 0)
+
+def get_cache_retention(cache_type):
+    # 条目在过期（含宽限期）后再保留 CACHE_RETENTION，离线时仍可作为旧数据兜底
+    return get_cache_ttl(cache_type) + get_cache_grace(cache_type) + config.CACHE_RETENTION
+
+def get_city_cache_key(city_name):
+    # 城市ID按查询时的名称缓存，不做规范化，避免"朝阳区"和"朝阳市"共用一个条目
+    return city_name.strip()
+
+def get_forecast_cache_key(city_id, days):
+    # 3天预报沿用城市ID作为缓存键，其他天数加上后缀
+    return city_id if days == 3 else f"{city_id}_{days}d"
+
+def get_hourly_cache_key(city_id, hours):
+    return f"{city_id}_{hours}h"
+
+# 内存LRU缓存：位于磁盘缓存之前，按条目数和过期时间淘汰
+class MemoryCache:
+    def __init__(self, max_size=config.MEMORY_CACHE_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()  # (cache_type, key) -> (timestamp, data)
+        self.lock = threading.Lock()
+
+    def get(self, key, cache_type):
+        # 返回 (写入时间, 数据)；超过过期时间和宽限期的条目直接淘汰
+        with self.lock:
+            entry = self.entries.get((cache_type, key))
+            if entry is None:
+                return None
+            if time.time() - entry[0] > get_cache_ttl(cache_type) + get_cache_grace(cache_type):
+                del self.entries[(cache_type, key)]
+                return None
+            self.entries.move_to_end((cache_type, key))
+            return entry
+
+    def put(self, key, data, cache_type, timestamp=None):
+        with self.lock:
+            self.entries[(cache_type, key)] = (timestamp or time.time(), data)
+            self.entries.move_to_end((cache_type, key))
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+# 磁盘缓存后端：每个键一个JSON文件
+class JsonCacheBackend:
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    def get_cache_path(self, key, cache_type):
+        return os.path.join(self.cache_dir, f"{cache_type}_{key}.json")
+
+    def load(self, key, cache_type):
+        # 返回 (写入时间, 数据)，不存在或损坏时返回None
+        try:
+            cache_data = load_json_file(self.get_cache_path(key, cache_type))
+            if cache_data is None:
+                return None
+            return cache_data["timestamp"], cache_data["data"]
+        except Exception:
+            # 缓存文件损坏时当作未命中，只计入错误统计
+            metrics.inc("weather_errors_total", source="cache_file")
+            return None
+
+    def save(self, key, data, cache_type, timestamp):
+        ensure_cache_dir()
+        cache_data = {
+            "timestamp": timestamp,
+            "data": data
+        }
+        dump_json_file(self.get_cache_path(key, cache_type), cache_data)
+
+    def purge_expired(self, max_age=None):
+        return 0
+
+    def close(self):
+        pass
+
+
+# 磁盘缓存后端：单个SQLite数据库文件（WAL模式），带过期清理和容量上限
+class SqliteCacheBackend:
+    # 这些文件不是缓存条目，迁移时跳过
+    NON_CACHE_FILES = ("history.json", "last_city.json", "pinned_cities.json")
+
+    def __init__(self, cache_dir, max_rows=config.CACHE_MAX_ROWS, retention=None):
+        ensure_cache_dir()
+        self.cache_dir = cache_dir
+        self.serializer = get_serializer()
+        self.max_rows = max_rows
+        self.lock = threading.Lock()
+        self.writes_since_trim = 0
+        self.conn = sqlite3.connect(os.path.join(cache_dir, config.CACHE_DB_NAME), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "cache_type TEXT NOT NULL, key TEXT NOT NULL, timestamp REAL NOT NULL, data TEXT NOT NULL, "
+                "PRIMARY KEY (cache_type, key))"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_lookup ON cache (cache_type, key, timestamp)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_timestamp ON cache (timestamp)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        self.migrate_json_files()
+        self.purge_expired(retention)
+        self.trim()
+
+    def load(self, key, cache_type):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT timestamp, data FROM cache WHERE cache_type = ? AND key = ?", (cache_type, key)
+            ).fetchone()
+        if row is None:
+            return None
+        try:
+            return row[0], loads_any(row[1])
+        except ValueError:
+            return None
+
+    def dumps(self, data):
+        # JSON存为文本，msgpack存为BLOB，读取时按类型区分
+        payload = self.serializer.dumps(data)
+        return payload if self.serializer.binary else payload.decode("utf-8")
+
+    def save(self, key, data, cache_type, timestamp):
+        payload = self.dumps(data)
+        with self.lock:
+            # 单条语句在事务中执行，写入是原子的
+            with self.conn:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO cache (cache_type, key, timestamp, data) VALUES (?, ?, ?, ?)",
+                    (cache_type, key, timestamp, payload)
+                )
+            self.writes_since_trim += 1
+            need_trim = self.writes_since_trim >= 100
+        if need_trim:
+            self.trim()
+
+    def purge_expired(self, max_age=None):
+        # 批量删除过旧的条目，返回删除的条数；max_age为None时按各缓存类型的保留时间清理
+        now = time.time()
+        with self.lock:
+            with self.conn:
+                if max_age is not None:
+                    return self.conn.execute("DELETE FROM cache WHERE timestamp < ?", (now - max_age,)).rowcount
+                cache_types = [row[0] for row in self.conn.execute("SELECT DISTINCT cache_type FROM cache")]
+                return sum(
+                    self.conn.execute("DELETE FROM cache WHERE cache_type = ? AND timestamp < ?",
+                                      (cache_type, now - get_cache_retention(cache_type))).rowcount
+                    for cache_type in cache_types
+                )
+
+    def trim(self):
+        # 超出容量上限时删除最旧的条目
+        with self.lock:
+            self.writes_since_trim = 0
+            count = self.conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+            if count <= self.max_rows:
+                return
+            with self.conn:
+                self.conn.execute(
+                    "DELETE FROM cache WHERE rowid IN (SELECT rowid FROM cache ORDER BY timestamp LIMIT ?)",
+                    (count - self.max_rows,)
+                )
+
+    def migrate_json_files(self):
+        # 一次性导入旧版的 {cache_type}_{key}.json 缓存文件，导入后删除
+        with self.lock:
+            if self.conn.execute("SELECT value FROM meta WHERE name = 'json_migrated'").fetchone():
+                return
+            rows = []
+            migrated_paths = []
+            for path in glob.glob(os.path.join(self.cache_dir, "*_*.json")):
+                filename = os.path.basename(path)
+                if filename in self.NON_CACHE_FILES:
+                    continue
+                cache_type, key = filename[:-len(".json")].split("_", 1)
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        cache_data = json.load(f)
+                    rows.append((cache_type, key, cache_data["timestamp"], self.dumps(cache_data["data"])))
+                except Exception:
+                    # 损坏的旧缓存文件不导入（同样会被删除），只计入错误统计
+                    metrics.inc("weather_errors_total", source="cache_migration")
+                migrated_paths.append(path)
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO cache (cache_type, key, timestamp, data) VALUES (?, ?, ?, ?)", rows
+                )
+                self.conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('json_migrated', ?)",
+                                  (str(len(rows)),))
+        for path in migrated_paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+# 缓存管理：内存LRU + 磁盘两级缓存
+class CacheManager:
+    memory = MemoryCache()
+    backend = None
+    backend_lock = threading.Lock()
+    stats = {"memory_hits": 0, "disk_hits": 0, "stale_hits": 0, "misses": 0}
+    stats_lock = threading.Lock()
+
+    @staticmethod
+    def get_backend():
+        # 首次使用时按配置创建磁盘后端
+        with CacheManager.backend_lock:
+            if CacheManager.backend is None:
+                if config.CACHE_BACKEND == "sqlite":
+                    CacheManager.backend = SqliteCacheBackend(config.CACHE_DIR)
+                else:
+                    CacheManager.backend = JsonCacheBackend(config.CACHE_DIR)
+            return CacheManager.backend
+    
+    @staticmethod
+    def save_to_cache(key, data, cache_type):
+        timestamp = time.time()
+        CacheManager.memory.put(key, data, cache_type, timestamp)
+        CacheManager.get_backend().save(key, data, cache_type, timestamp)
+    
+    @staticmethod
+    def get_from_cache(key, cache_type):
+        # 只返回未过期的数据
+        data, stale = CacheManager.get_cache_entry(key, cache_type, allow_stale=False)
+        return data
+    
+    @staticmethod
+    def get_cache_entry(key, cache_type, allow_stale=True):
+        # 返回 (数据, 是否已过期)；已过期的数据只在宽限期内返回
+        # 先查内存缓存，未命中时才读取磁盘
+        entry = CacheManager.memory.get(key, cache_type)
+        tier = "memory_hits"
+        if entry is None:
+            entry = CacheManager.get_backend().load(key, cache_type)
+            tier = "disk_hits"
+            if entry is not None:
+                # 回填内存缓存，保留原始写入时间
+                CacheManager.memory.put(key, entry[1], cache_type, entry[0])
+        if entry is None:
+            CacheManager.record("misses", cache_type)
+            return None, False
+        
+        # 检查缓存是否过期
+        timestamp, data = entry
+        age = time.time() - timestamp
+        ttl = get_cache_ttl(cache_type)
+        if age <= ttl:
+            CacheManager.record(tier, cache_type)
+            return data, False
+        if allow_stale and age <= ttl + get_cache_grace(cache_type):
+            CacheManager.record("stale_hits", cache_type)
+            return data, True
+        CacheManager.record("misses", cache_type)
+        return None, False
+    
+    @staticmethod
+    def get_last_known(key, cache_type):
+        # 忽略过期时间，返回最后一次保存的数据（配额用尽等无法请求时兜底）
+        entry = CacheManager.memory.get(key, cache_type) or CacheManager.get_backend().load(key, cache_type)
+        return entry[1] if entry else None
+    
+    @staticmethod
+    def peek(key, cache_type):
+        # 返回 (数据, 是否已过期)，不受宽限期限制，也不计入命中统计（启动时先显示旧数据）
+        entry = CacheManager.memory.get(key, cache_type) or CacheManager.get_backend().load(key, cache_type)
+        if entry is None:
+            return None, False
+        timestamp, data = entry
+        return data, time.time() - timestamp > get_cache_ttl(cache_type)
+    
+    @staticmethod
+    def get_entry_time(key, cache_type):
+        # 返回条目的写入时间，不存在时返回None
+        entry = CacheManager.memory.get(key, cache_type) or CacheManager.get_backend().load(key, cache_type)
+        return entry[0] if entry else None
+    
+    @staticmethod
+    def purge_expired(max_age=None):
+        return CacheManager.get_backend().purge_expired(max_age)
+    
+    @staticmethod
+    def close():
+        with CacheManager.backend_lock:
+            if CacheManager.backend is not None:
+                CacheManager.backend.close()
+                CacheManager.backend = None
+    
+    @staticmethod
+    def record(counter, cache_type):
+        with CacheManager.stats_lock:
+            CacheManager.stats[counter] += 1
+        metrics.inc("weather_cache_lookups_total", cache_type=cache_type, result=counter)
+    
+    @staticmethod
+    def get_stats():
+        # 返回缓存命中统计
+        with CacheManager.stats_lock:
+            stats = dict(CacheManager.stats)
+        stats["hits"] = stats["memory_hits"] + stats["disk_hits"] + stats["stale_hits"]
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        stats["memory_entries"] = len(CacheManager.memory)
+        return stats
@@ -0,0 +1,134 @@
+import os
+import csv
+import bisect
+import threading
+
+from . import config
+
+
+def normalize_city_name(name):
+    # 统一大小写，去掉空格和标点，并去掉"市"等后缀："北京市"、"北京"、"Bei Jing" 得到相同的键
+    name = name.strip().lower()
+    for char in " '-_.,·":
+        name = name.replace(char, "")
+    for suffix in config.CITY_NAME_SUFFIXES:
+        if name.endswith(suffix) and len(name) - len(suffix) >= 2:
+            return name[:-len(suffix)]
+    return name
+
+
+# 本地城市索引：按规范化名称（中文、拼音、别名）查找城市ID，支持前缀搜索
+class CityIndex:
+    def __init__(self, path=None):
+        self.path = path
+        self.cities = {}  # Location ID -> 城市信息
+        self.names = {}  # 规范化名称 -> [Location ID]，按优先级排序
+        self.sorted_names = []  # 有序名称列表，用于前缀搜索
+        self.loaded = False
+        self.lock = threading.Lock()
+
+    def ensure_loaded(self):
+        # 首次查询时才加载CSV，避免拖慢启动
+        if self.loaded:
+            return
+        with self.lock:
+            if self.loaded:
+                return
+            path = self.path or config.CITY_LIST_PATH
+            if path and os.path.exists(path):
+                try:
+                    self.load_csv(path)
+                except (OSError, csv.Error, ValueError):
+                    pass
+            for alias, location_id in config.CITY_ALIASES.items():
+                self.add_name(alias, location_id)
+            self.sorted_names = sorted(self.names)
+            self.loaded = True
+
+    def load_csv(self, path):
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            # 官方文件第一行是版本信息，跳到表头所在行
+            lines = iter(f)
+            for line in lines:
+                if line.startswith("Location_ID"):
+                    break
+            else:
+                return
+            fieldnames = next(csv.reader([line]))
+            for row in csv.DictReader(lines, fieldnames=fieldnames):
+                location_id = row.get("Location_ID")
+                name = row.get("Location_Name_ZH")
+                if not location_id or not name:
+                    continue
+                city = {
+                    "id": location_id,
+                    "name": name,
+                    "name_en": row.get("Location_Name_EN", ""),
+                    "adm1": row.get("Adm1_Name_ZH", ""),
+                    "adm2": row.get("Adm2_Name_ZH", ""),
+                    "country": row.get("Country_Region_ZH", "")
+                }
+                self.cities[location_id] = city
+                self.add_name(name, location_id)
+                if city["name_en"]:
+                    self.add_name(city["name_en"], location_id)
+
+    def add_name(self, name, location_id):
+        key = normalize_city_name(name)
+        if not key or location_id not in self.cities:
+            return
+        ids = self.names.setdefault(key, [])
+        if location_id not in ids:
+            ids.append(location_id)
+            # 同名时地级市优先（名称与所属地级市相同），其次按ID排序
+            ids.sort(key=lambda i: (self.cities[i]["name"] != self.cities[i]["adm2"], i))
+
+    def add_city(self, city_name, location_id, name, adm1="", adm2=""):
+        # 把API查询结果加入索引，下次同样的查询不再走网络
+        # 只以查询时的名称作为别名：API返回的名称不带"区""县"（朝阳区返回"朝阳"），加入后会与同名的地级市混淆
+        self.ensure_loaded()
+        with self.lock:
+            self.cities.setdefault(location_id, {"id": location_id, "name": name, "name_en": "",
+                                                 "adm1": adm1, "adm2": adm2, "country": ""})
+            key = normalize_city_name(city_name)
+            is_new = key not in self.names
+            self.add_name(city_name, location_id)
+            if is_new and key in self.names:
+                bisect.insort(self.sorted_names, key)
+
+    def lookup(self, city_name):
+        # 精确查找，返回城市信息或None
+        self.ensure_loaded()
+        ids = self.names.get(normalize_city_name(city_name))
+        if not ids:
+            return None
+        return self.cities[ids[0]]
+
+    def search_prefix(self, prefix, limit=10, distinct_names=False):
+        # 前缀搜索，返回匹配的城市信息列表；distinct_names为True时同名城市只保留优先级最高的一个
+        self.ensure_loaded()
+        key = normalize_city_name(prefix)
+        if not key:
+            return []
+        results = []
+        seen = set()
+        start = bisect.bisect_left(self.sorted_names, key)
+        for index in range(start, len(self.sorted_names)):
+            name = self.sorted_names[index]
+            if not name.startswith(key) or len(results) >= limit:
+                break
+            ids = self.names[name][:1] if distinct_names else self.names[name]
+            for location_id in ids:
+                city = self.cities[location_id]
+                seen_key = city["name"] if distinct_names else location_id
+                if seen_key not in seen:
+                    seen.add(seen_key)
+                    results.append(city)
+        return results[:limit]
+
+    def __len__(self):
+        self.ensure_loaded()
+        return len(self.cities)
+
+
+city_index = CityIndex()
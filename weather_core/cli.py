@@ -0,0 +1,151 @@
+# 命令行批量查询：python -m weather_core -i cities.txt -f jsonl
+# 只在解析完参数后才导入请求和缓存模块，--help 等操作不需要加载它们
+import sys
+import csv
+import argparse
+
+from . import config
+from .serialize import get_json_serializer
+
+# CSV输出的列（实时天气字段）
+CSV_FIELDS = ["query", "id", "name", "text", "temp", "feelsLike", "humidity", "windDir",
+              "windScale", "windSpeed", "pressure", "precip", "vis", "obsTime", "error"]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m weather_core",
+        description="批量查询多个城市的天气，结果以JSON Lines或CSV格式逐行输出"
+    )
+    parser.add_argument("-i", "--input", default="-",
+                        help="城市名称文件，每行一个城市，# 开头的行会被忽略（默认从标准输入读取）")
+    parser.add_argument("-o", "--output", default="-", help="输出文件（默认标准输出）")
+    parser.add_argument("-f", "--format", choices=("jsonl", "csv"), default="jsonl", help="输出格式")
+    parser.add_argument("-w", "--workers", type=int, default=8, help="并发查询的线程数")
+    parser.add_argument("--parts", default="now,forecast,indices",
+                        help="需要获取的数据，逗号分隔：now、forecast、indices（CSV只输出now）")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="使用asyncio客户端在单个事件循环中并发查询（需要aiohttp），--workers 为并发请求上限")
+    parser.add_argument("--api-key", help="和风天气API Key（默认读取环境变量 QWEATHER_API_KEY）")
+    parser.add_argument("--cache-dir", help="缓存目录")
+    parser.add_argument("--warm-cache", action="store_true",
+                        help="只预热缓存：获取 --parts 指定的数据并写入缓存，不输出天气数据（适合在启动前或定时任务中运行）")
+    parser.add_argument("--budget", type=int, default=0,
+                        help="--warm-cache 最多发起的请求数（0为不限制，当日剩余配额不足时同样会停止）")
+    parser.add_argument("--metrics-out",
+                        help="结束后把运行指标（请求耗时、重试、响应大小、缓存命中）写入该文件，.json 为JSON，其他为Prometheus文本格式")
+    return parser.parse_args(argv)
+
+
+def read_cities(path):
+    stream = sys.stdin if path == "-" else open(path, "r", encoding="utf-8-sig")
+    try:
+        cities = []
+        for line in stream:
+            line = line.strip()
+            if line and not line.startswith("#") and line not in cities:
+                cities.append(line)
+        return cities
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+class RecordWriter:
+    def __init__(self, stream, output_format):
+        self.stream = stream
+        self.output_format = output_format
+        self.serializer = get_json_serializer()
+        if output_format == "csv":
+            self.csv_writer = csv.DictWriter(stream, fieldnames=CSV_FIELDS, extrasaction="ignore")
+            self.csv_writer.writeheader()
+
+    def write(self, report):
+        if self.output_format == "csv":
+            row = dict(report.get("now") or {})
+            row.update({key: report.get(key) for key in ("query", "id", "name", "error")})
+            self.csv_writer.writerow(row)
+        else:
+            self.stream.write(self.serializer.dumps(report).decode("utf-8") + "\n")
+        # 逐条输出，方便管道下游实时处理
+        self.stream.flush()
+
+
+def run_threaded(cities, parts, workers, writer):
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    from .api import get_city_report
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(get_city_report, city, parts) for city in cities]
+        for future in as_completed(futures):
+            report = future.result()
+            if report["error"]:
+                failed += 1
+            writer.write(report)
+    return failed
+
+
+def run_async(cities, parts, max_concurrency, writer):
+    import asyncio
+    from .aio import AsyncWeatherClient
+
+    async def run():
+        failed = 0
+        async with AsyncWeatherClient(max_concurrency=max_concurrency) as client:
+            for coro in asyncio.as_completed([client.get_city_report(city, parts) for city in cities]):
+                report = await coro
+                if report["error"]:
+                    failed += 1
+                writer.write(report)
+        return failed
+
+    return asyncio.run(run())
+
+
+def run_warm_cache(cities, parts, budget, stream):
+    from .prefetch import warm_cache
+
+    # 命令行的数据名称 -> 缓存类型
+    cache_types = {"now": "weather", "forecast": "forecast", "indices": "index"}
+    stats = warm_cache(cities, tuple(cache_types[part] for part in parts if part in cache_types), budget)
+    stream.write(get_json_serializer().dumps(stats).decode("utf-8") + "\n")
+    stream.flush()
+    return stats["failed"] + len(stats["unresolved"])
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.api_key:
+        config.API_KEY = args.api_key
+    if args.cache_dir:
+        config.CACHE_DIR = args.cache_dir
+    parts = tuple(part.strip() for part in args.parts.split(",") if part.strip())
+
+    cities = read_cities(args.input)
+    if not cities:
+        return 0
+
+    from .cache import CacheManager
+    from .http import api_client
+
+    output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8", newline="")
+    try:
+        if args.warm_cache:
+            failed = run_warm_cache(cities, parts, max(0, args.budget), output)
+        elif args.use_async:
+            writer = RecordWriter(output, args.format)
+            failed = run_async(cities, parts, max(1, args.workers), writer)
+        else:
+            writer = RecordWriter(output, args.format)
+            failed = run_threaded(cities, parts, max(1, args.workers), writer)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        # 写入当天已用的配额次数（运行期间最多每5秒保存一次，短时间的定时任务会少记）
+        api_client.close()
+        CacheManager.close()
+        if args.metrics_out:
+            from .metrics import metrics
+            metrics.export(args.metrics_out)
+    return 1 if failed else 0
@@ -0,0 +1,136 @@
+import inspect
+import threading
+import functools
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+from . import config
+from .metrics import metrics
+
+
+# 后台刷新：过期但仍在宽限期内的缓存先返回给调用方，再在后台重新请求
+class BackgroundRefresher:
+    def __init__(self, max_workers=config.BACKGROUND_REFRESH_WORKERS):
+        self.max_workers = max_workers
+        self.executor = None
+        self.in_flight = set()
+        self.lock = threading.Lock()
+
+    def submit(self, key, func, *args):
+        # 同一个键已在刷新时不重复提交
+        with self.lock:
+            if key in self.in_flight:
+                return False
+            self.in_flight.add(key)
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        self.executor.submit(self._run, key, func, args)
+        return True
+
+    def _run(self, key, func, args):
+        try:
+            func(*args)
+        except Exception:
+            # 后台刷新失败不影响调用方（已返回旧数据），只计入错误统计
+            metrics.inc("weather_errors_total", source="background_refresh")
+        finally:
+            with self.lock:
+                self.in_flight.discard(key)
+
+    def shutdown(self):
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+
+background_refresher = BackgroundRefresher()
+
+
+# 取消：界面的后台任务被新一轮请求淘汰或窗口关闭时，正在重试的请求不再继续
+# 在 cancel_scope(event) 中发起的请求，event 被设置后不再重试，重试前的等待也立即结束，并抛出 RequestCancelled
+class RequestCancelled(Exception):
+    pass
+
+
+_cancel_state = threading.local()
+
+
+@contextlib.contextmanager
+def cancel_scope(event):
+    previous = getattr(_cancel_state, "event", None)
+    _cancel_state.event = event
+    try:
+        yield
+    finally:
+        _cancel_state.event = previous
+
+
+def get_cancel_event():
+    # 当前线程所在取消范围的事件，不在取消范围中时返回None
+    return getattr(_cancel_state, "event", None)
+
+
+# 请求合并（single-flight）：同一个键的并发请求只发起一次，所有调用方共享结果
+class SingleFlight:
+    def __init__(self):
+        self.calls = {}  # 键 -> 进行中的调用
+        self.stats = {"executed": 0, "deduplicated": 0}
+        self.lock = threading.Lock()
+
+    def do(self, key, func, *args, **kwargs):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = {"event": threading.Event(), "result": None, "error": None}
+                self.calls[key] = call
+                self.stats["executed"] += 1
+            else:
+                self.stats["deduplicated"] += 1
+        
+        # 已有相同请求在进行中，等待其结果
+        if not leader:
+            call["event"].wait()
+            # 发起请求的调用方被取消了，结果不完整，由当前调用方重新执行
+            if isinstance(call["error"], RequestCancelled):
+                return self.do(key, func, *args, **kwargs)
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"]
+        
+        try:
+            call["result"] = func(*args, **kwargs)
+            return call["result"]
+        except Exception as e:
+            call["error"] = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call["event"].set()
+
+    def coalesce(self, name):
+        # 装饰器：以函数名和全部参数（按函数签名补全默认值）作为合并键，
+        # 关键字参数与位置参数等价，f(1, b=2) 和 f(1, 2) 合并为同一个请求
+        def decorator(func):
+            signature = inspect.signature(func)
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                key = (name,) + tuple(tuple(value) if isinstance(value, list) else value
+                                      for value in bound.arguments.values())
+                return self.do(key, func, *args, **kwargs)
+            return wrapper
+        return decorator
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats["in_flight"] = len(self.calls)
+        return stats
+
+
+single_flight = SingleFlight()
@@ -0,0 +1,143 @@
+# 天气查询核心配置，界面和命令行共用
+# 其他模块通过 config.XXX 读取配置，运行时修改（如命令行参数）即可生效
+import os
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# API配置
+API_KEY = os.environ.get("QWEATHER_API_KEY", "yourapikey")
+CITY_SEARCH_URL = "https://geoapi.qweather.com/v2/city/lookup"
+WEATHER_URL = "https://devapi.qweather.com/v7/weather/now"
+FORECAST_URL = "https://devapi.qweather.com/v7/weather/3d"
+INDEX_URL = "https://devapi.qweather.com/v7/indices/1d"
+# 逐日预报（{}为天数：3、7、10、15、30）和逐小时预报（{}为小时数：24、72、168）
+FORECAST_DAYS_URL = "https://devapi.qweather.com/v7/weather/{}d"
+HOURLY_URL = "https://devapi.qweather.com/v7/weather/{}h"
+FORECAST_DAY_OPTIONS = (3, 7, 15)  # 界面可选的逐日预报天数
+HOURLY_OPTIONS = (24, 72, 168)  # 界面可选的逐小时预报小时数
+
+# HTTP连接配置
+HTTP_POOL_CONNECTIONS = 4  # 保持连接的主机数（geoapi / devapi）
+HTTP_POOL_MAXSIZE = 10  # 每个主机的连接池大小，不小于后台线程数
+RETRY_BACKOFF_BASE = 0.5  # 首次重试等待时间（秒）
+RETRY_BACKOFF_MAX = 8  # 单次重试最长等待时间（秒）
+HOST_MAX_CONCURRENCY = 4  # 每个主机同时进行的请求数上限（请求速率由下面的API配额控制）
+
+# 熔断（weather_core.breaker）：同一主机连续失败后暂停请求、直接使用缓存数据，冷却后放行一个探测请求
+BREAKER_ENABLED = True
+BREAKER_FAILURE_THRESHOLD = 3  # 连续失败（超时、连接错误、5xx）多少次后熔断
+BREAKER_RESET_TIMEOUT = 15  # 熔断后多久放行探测请求（秒）
+BREAKER_MAX_RESET_TIMEOUT = 5 * 60  # 探测失败时冷却时间加倍，最长不超过该值（秒）
+
+# 自动刷新计划
+REFRESH_MIN_INTERVAL = 60  # 同一数据两次刷新之间的最短间隔（秒）
+REFRESH_ALIGN = 60  # 刷新时间对齐到该粒度（秒），让多个城市/接口的刷新合并到同一批
+REFRESH_HIDDEN_BACKOFF = 4  # 窗口隐藏或最小化时，刷新间隔放大的倍数
+REFRESH_BUSY_RETRY = 5  # 上一轮刷新仍在进行时，推迟多久再检查（秒）
+OBS_UPDATE_INTERVAL = 10 * 60  # 实时天气观测数据的更新周期（秒），按obsTime推算下一次更新
+OBS_UPDATE_LAG = 60  # 观测数据发布后多久再去取（秒）
+
+# 预取（weather_core.prefetch）：在后台让历史记录中靠前城市的缓存保持新鲜，切换城市时直接命中缓存
+PREFETCH_ENABLED = True
+PREFETCH_TOP_N = 5  # 预取历史记录中的前几个城市（不含当前城市，当前城市由自动刷新负责）
+PREFETCH_INTERVAL = 5 * 60  # 两轮预取之间的间隔（秒）
+PREFETCH_MARGIN = 5 * 60  # 缓存在该时间内即将过期时提前刷新（秒）
+PREFETCH_MAX_REQUESTS = 10  # 每轮预取最多发起的请求数（重试也计入）
+PREFETCH_QUOTA_RESERVE = 200  # 当日剩余配额低于该值时停止预取，留给前台查询
+PREFETCH_MINUTE_RESERVE = 30  # 当前分钟可用次数低于该值时结束本轮预取
+PREFETCH_REQUEST_INTERVAL = 0.2  # 相邻两个预取请求之间的间隔（秒）
+PREFETCH_PAUSE_POLL = 0.5  # 前台有请求时，每隔多久检查一次是否可以继续（秒）
+PREFETCH_MAX_PAUSE = 30  # 前台请求持续超过该时间时放弃本轮预取（秒）
+
+# API配额（按所用Key的套餐调整）
+QUOTA_PER_DAY = 1000  # 每天的请求次数上限
+QUOTA_PER_MINUTE = 300  # 每分钟的请求次数上限（令牌桶容量，按速率匀速补充）
+# 各接口每分钟的请求次数上限，键为URL路径的末尾部分
+QUOTA_ENDPOINT_PER_MINUTE = {
+    "city/lookup": 60,
+    "weather/now": 120,
+    "weather/3d": 60,
+    "weather/7d": 60,
+    "weather/15d": 60,
+    "weather/24h": 60,
+    "weather/72h": 60,
+    "weather/168h": 60,
+    "indices/1d": 60
+}
+QUOTA_MAX_WAIT = 3  # 分钟配额暂时不足时最多排队等待的时间（秒），超时则放弃请求
+QUOTA_STATE_FILE = "quota.json"  # 当天已用次数保存在缓存目录中，重启后继续累计
+
+# 异步客户端配置（weather_core.aio，需要安装aiohttp）
+ASYNC_MAX_CONCURRENCY = 100  # 同时进行的请求数上限
+ASYNC_LIMIT_PER_HOST = 20  # 每个主机保持的连接数上限
+ASYNC_KEEPALIVE_TIMEOUT = 60  # 空闲连接保持时间（秒）
+
+# 缓存配置
+CACHE_DIR = os.path.join(PROJECT_DIR, "cache")
+CACHE_EXPIRY = 30 * 60  # 默认缓存过期时间（秒）
+# 各类数据的缓存过期时间（秒）：城市ID基本不变，实时天气变化最快
+CACHE_TTL = {
+    "city": 30 * 24 * 60 * 60,
+    "weather": 10 * 60,
+    "forecast": 3 * 60 * 60,
+    "hourly": 60 * 60,
+    "index": 3 * 60 * 60,
+    "city_search": 7 * 24 * 60 * 60
+}
+# 过期后的宽限期（秒）：宽限期内先返回旧数据，同时在后台刷新
+CACHE_STALE_GRACE = {
+    "weather": 30 * 60,
+    "forecast": 6 * 60 * 60,
+    "hourly": 2 * 60 * 60,
+    "index": 6 * 60 * 60
+}
+BACKGROUND_REFRESH_WORKERS = 2  # 后台刷新过期缓存的线程数
+MEMORY_CACHE_SIZE = 256  # 内存缓存最多保留的条目数
+CACHE_BACKEND = "sqlite"  # 磁盘缓存后端: "sqlite"（单文件数据库）或 "json"（每个键一个文件）
+CACHE_DB_NAME = "cache.db"
+CACHE_SERIALIZER = "auto"  # 缓存数据的序列化方式: "auto"（优先orjson，其次msgpack）、"orjson"、"msgpack"、"json"
+CACHE_MAX_ROWS = 5000  # SQLite缓存最多保留的条目数，超出时删除最旧的条目
+CACHE_RETENTION = 7 * 24 * 60 * 60  # 条目过期（含宽限期）后再保留的时间，之后被批量清理（秒）
+
+# 观测历史：每次取到实时天气时追加到缓存目录下的时间序列存储（weather_core.history）
+HISTORY_ENABLED = True
+HISTORY_DIR_NAME = "history"  # 每个城市一个子目录，每月一个分块文件
+# 记录的数值字段，决定二进制记录的布局；修改后需要清空已有的历史目录
+HISTORY_FIELDS = ("temp", "feelsLike", "humidity", "windSpeed", "pressure", "precip", "vis", "cloud")
+HISTORY_RETENTION = 400 * 24 * 60 * 60  # 超过该时间的整月分块会被删除（秒）
+
+# 运行指标（weather_core.metrics）：请求和界面更新耗时直方图的分桶上界（秒）
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# 本地城市索引：可通过环境变量指定完整的和风天气城市列表CSV（China-City-List）
+CITY_LIST_PATH = os.environ.get(
+    "QWEATHER_CITY_LIST",
+    os.path.join(PROJECT_DIR, "data", "city_list.csv")
+)
+# 城市别名 -> 和风天气Location ID
+CITY_ALIASES = {
+    "帝都": "101010100",
+    "peking": "101010100",
+    "魔都": "101020100",
+    "羊城": "101280101",
+    "canton": "101280101",
+    "鹏城": "101280601",
+    "蓉城": "101270101",
+    "春城": "101290101",
+    "泉城": "101120101"
+}
+# 输入联想配置
+SUGGEST_LIMIT = 10  # 最多显示的候选城市数
+# 规范化城市名称时去掉的后缀（按长度优先匹配），只用于城市索引查找和输入联想
+# 不能去掉"区""县""省"等：朝阳区/朝阳市、吉林省/吉林市是不同的地点
+CITY_NAME_SUFFIXES = ("特别行政区", "市", "city")
+
+# 生活指数类型
+LIFE_INDICES = {
+    "1": "运动指数",
+    "2": "洗车指数",
+    "3": "穿衣指数",
+    "5": "紫外线指数",
+    "9": "感冒指数",
+    "13": "舒适度指数"
+}
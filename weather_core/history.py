@@ -0,0 +1,239 @@
+# 实时天气观测的本地时间序列存储：每次取到的实时天气按城市追加为定长二进制记录
+# 每个城市一个目录、每月一个分块文件，查询时只读取与时间范围重叠的分块
+# 安装了numpy时用内存映射按列读取，否则用struct逐条解析
+import math
+import os
+import struct
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+
+from . import config
+from .scheduler import parse_api_time
+
+_numpy = False  # 尚未尝试导入
+
+
+def get_numpy():
+    # 第一次读取历史数据时才导入numpy，只导入 weather_core.api（命令行、界面启动）时不需要它
+    global _numpy
+    if _numpy is False:
+        try:
+            import numpy
+        except ImportError:  # pragma: no cover - 可选依赖
+            numpy = None
+        _numpy = numpy
+    return _numpy
+
+
+def month_range(year, month):
+    # 返回该月（UTC）的起止时间戳
+    start = datetime(year, month, 1, tzinfo=timezone.utc)
+    end = datetime(year + month // 12, month % 12 + 1, 1, tzinfo=timezone.utc)
+    return start.timestamp(), end.timestamp()
+
+
+class HistoryStore:
+    def __init__(self, root=None, fields=None):
+        self.root = root
+        self.fields = tuple(fields or config.HISTORY_FIELDS)
+        # 每条记录：观测时间（int64秒）+ 各字段（float32，缺失为NaN）
+        self.record = struct.Struct("<q" + "f" * len(self.fields))
+        self.dtype = None  # numpy记录类型，第一次读取时创建
+        self.last_ts = {}  # 城市ID -> 最后一条记录的观测时间
+        self.lock = threading.Lock()
+
+    def get_root(self):
+        return self.root or os.path.join(config.CACHE_DIR, config.HISTORY_DIR_NAME)
+
+    def get_city_dir(self, city_id):
+        return os.path.join(self.get_root(), str(city_id))
+
+    def get_chunk_path(self, city_id, ts):
+        return os.path.join(self.get_city_dir(city_id), time.strftime("%Y%m", time.gmtime(ts)) + ".bin")
+
+    def append(self, city_id, now):
+        # 追加一条实时天气；观测时间不晚于上一条时（缓存命中或数据未更新）跳过
+        ts = parse_api_time(now.get("obsTime"))
+        if ts is None:
+            return False
+        ts = int(ts)
+        values = []
+        for field in self.fields:
+            try:
+                values.append(float(now[field]))
+            except (KeyError, TypeError, ValueError):
+                values.append(math.nan)
+
+        with self.lock:
+            if ts <= self.get_last_ts(city_id):
+                return False
+            path = self.get_chunk_path(city_id, ts)
+            new_chunk = not os.path.exists(path)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "ab") as f:
+                    f.write(self.record.pack(ts, *values))
+            except OSError:
+                return False
+            self.last_ts[city_id] = ts
+
+        # 进入新的月份时顺带清理该城市超出保留期的分块
+        if new_chunk:
+            self.purge(city_id)
+        return True
+
+    def get_last_ts(self, city_id):
+        # 调用方需持有锁；首次访问时从最新分块的最后一条记录读取
+        if city_id not in self.last_ts:
+            last_ts = 0
+            chunks = self.list_chunks(city_id)
+            if chunks:
+                path = chunks[-1][2]
+                size = os.path.getsize(path) // self.record.size * self.record.size
+                if size:
+                    with open(path, "rb") as f:
+                        f.seek(size - self.record.size)
+                        last_ts = self.record.unpack(f.read(self.record.size))[0]
+            self.last_ts[city_id] = last_ts
+        return self.last_ts[city_id]
+
+    def list_chunks(self, city_id, start=None, end=None):
+        # 返回与时间范围重叠的分块 [(月初, 月末, 路径)]，按时间排序
+        city_dir = self.get_city_dir(city_id)
+        try:
+            names = os.listdir(city_dir)
+        except OSError:
+            return []
+        chunks = []
+        for name in names:
+            stem, ext = os.path.splitext(name)
+            if ext != ".bin" or len(stem) != 6 or not stem.isdigit():
+                continue
+            chunk_start, chunk_end = month_range(int(stem[:4]), int(stem[4:]))
+            if (start is None or chunk_end > start) and (end is None or chunk_start <= end):
+                chunks.append((chunk_start, chunk_end, os.path.join(city_dir, name)))
+        chunks.sort()
+        return chunks
+
+    def read_chunk(self, path, start=None, end=None):
+        # 读取一个分块中落在 [start, end] 内的记录，返回 {"ts": 序列, 字段: 序列}
+        try:
+            count = os.path.getsize(path) // self.record.size
+        except OSError:
+            count = 0
+        numpy = get_numpy()
+        if numpy is not None:
+            if self.dtype is None:
+                self.dtype = numpy.dtype([("ts", "<i8")] + [(field, "<f4") for field in self.fields])
+            if not count:
+                return {name: numpy.empty(0, dtype=self.dtype[name]) for name in self.dtype.names}
+            records = numpy.memmap(path, dtype=self.dtype, mode="r", shape=(count,))
+            lo = 0 if start is None else numpy.searchsorted(records["ts"], start, "left")
+            hi = count if end is None else numpy.searchsorted(records["ts"], end, "right")
+            # 只复制范围内的列，之后即可释放内存映射
+            return {name: numpy.array(records[name][lo:hi]) for name in self.dtype.names}
+
+        with open(path, "rb") as f:
+            data = f.read(count * self.record.size)
+        columns = list(zip(*self.record.iter_unpack(data))) or [()] * (len(self.fields) + 1)
+        ts = columns[0]
+        lo = 0 if start is None else bisect_left(ts, start)
+        hi = len(ts) if end is None else bisect_right(ts, end)
+        result = {"ts": list(ts[lo:hi])}
+        for field, column in zip(self.fields, columns[1:]):
+            result[field] = list(column[lo:hi])
+        return result
+
+    def query(self, city_id, start=None, end=None, fields=None):
+        # 按时间范围查询原始记录；安装了numpy时各列为ndarray，否则为list
+        fields = list(fields or self.fields)
+        parts = [self.read_chunk(path, start, end) for _, _, path in self.list_chunks(city_id, start, end)]
+        numpy = get_numpy()
+        result = {}
+        for name in ["ts"] + fields:
+            columns = [part[name] for part in parts]
+            if numpy is not None:
+                result[name] = numpy.concatenate(columns) if columns else numpy.empty(0)
+            else:
+                result[name] = [value for column in columns for value in column]
+        return result
+
+    def aggregate(self, city_id, field, start, end, bucket):
+        # 按固定时间粒度降采样：逐个分块累加，内存占用只与桶数有关，与样本数无关
+        # 返回 {"start", "end", "bucket", "ts", "mean", "min", "max", "count"}，空桶不输出
+        buckets = max(1, int(math.ceil((end - start) / bucket)))
+        sums = [0.0] * buckets
+        counts = [0] * buckets
+        mins = [math.inf] * buckets
+        maxs = [-math.inf] * buckets
+        numpy = get_numpy()
+        for _, _, path in self.list_chunks(city_id, start, end):
+            chunk = self.read_chunk(path, start, end)
+            if numpy is not None:
+                self.accumulate_numpy(chunk["ts"], chunk[field], start, bucket, sums, counts, mins, maxs)
+                continue
+            for ts, value in zip(chunk["ts"], chunk[field]):
+                if math.isnan(value):
+                    continue
+                i = min(int((ts - start) // bucket), buckets - 1)
+                sums[i] += value
+                counts[i] += 1
+                mins[i] = min(mins[i], value)
+                maxs[i] = max(maxs[i], value)
+
+        result = {"start": start, "end": end, "bucket": bucket,
+                  "ts": [], "mean": [], "min": [], "max": [], "count": []}
+        for i in range(buckets):
+            if counts[i]:
+                result["ts"].append(start + i * bucket)
+                result["mean"].append(sums[i] / counts[i])
+                result["min"].append(mins[i])
+                result["max"].append(maxs[i])
+                result["count"].append(counts[i])
+        return result
+
+    @staticmethod
+    def accumulate_numpy(ts, values, start, bucket, sums, counts, mins, maxs):
+        numpy = get_numpy()
+        valid = ~numpy.isnan(values)
+        ts = ts[valid]
+        values = values[valid].astype(numpy.float64)
+        if not len(values):
+            return
+        buckets = len(sums)
+        index = numpy.minimum((ts - start) // bucket, buckets - 1).astype(numpy.intp)
+        chunk_sums = numpy.bincount(index, weights=values, minlength=buckets)
+        chunk_counts = numpy.bincount(index, minlength=buckets)
+        chunk_mins = numpy.full(buckets, numpy.inf)
+        chunk_maxs = numpy.full(buckets, -numpy.inf)
+        numpy.minimum.at(chunk_mins, index, values)
+        numpy.maximum.at(chunk_maxs, index, values)
+        for i in numpy.flatnonzero(chunk_counts):
+            sums[i] += float(chunk_sums[i])
+            counts[i] += int(chunk_counts[i])
+            mins[i] = min(mins[i], float(chunk_mins[i]))
+            maxs[i] = max(maxs[i], float(chunk_maxs[i]))
+
+    def cities(self):
+        try:
+            return sorted(os.listdir(self.get_root()))
+        except OSError:
+            return []
+
+    def purge(self, city_id, max_age=None):
+        # 删除整月都超出保留期的分块
+        cutoff = time.time() - (config.HISTORY_RETENTION if max_age is None else max_age)
+        removed = 0
+        for _, chunk_end, path in self.list_chunks(city_id, end=cutoff):
+            if chunk_end <= cutoff:
+                try:
+                    os.remove(path)
+                    removed += 1
+                except OSError:
+                    pass
+        return removed
+
+
+history_store = HistoryStore()
@@ -0,0 +1,137 @@
+import time
+import random
+import threading
+import contextlib
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import config
+from .breaker import circuit_breaker
+from .concurrency import RequestCancelled, get_cancel_event
+from .metrics import metrics
+from .quota import QuotaManager, quota_manager
+
+
+# 重试策略：指数退避 + 随机抖动，避免多个请求同时重试
+class RetryPolicy:
+    def __init__(self, max_retries=3, backoff_base=config.RETRY_BACKOFF_BASE, backoff_max=config.RETRY_BACKOFF_MAX):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def get_delay(self, retry):
+        delay = min(self.backoff_max, self.backoff_base * (2 ** retry))
+        return random.uniform(delay / 2, delay)
+
+    def should_retry(self, status_code):
+        # 限流和服务端错误可以重试，其他客户端错误重试也没有意义
+        return status_code == 429 or status_code >= 500
+
+
+# 按主机限流：限制同一主机的并发请求数（对应异步客户端的 ASYNC_LIMIT_PER_HOST）
+# 请求速率由 QuotaManager 的令牌桶控制，这里不再额外限制请求间隔
+class HostRateLimiter:
+    def __init__(self, max_concurrency=config.HOST_MAX_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self.semaphores = {}
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def limit(self, host):
+        with self.lock:
+            semaphore = self.semaphores.get(host)
+            if semaphore is None:
+                semaphore = self.semaphores[host] = threading.BoundedSemaphore(self.max_concurrency)
+        with semaphore:
+            yield
+
+
+# HTTP客户端：所有API请求共用一个带连接池的Session，复用TCP/TLS连接
+class ApiClient:
+    TIMEOUT_ERROR = "请求超时，请检查网络连接"
+    FAILED_ERROR = "请求失败，请稍后重试"
+    QUOTA_ERROR = "API配额不足，请稍后重试"
+    CIRCUIT_OPEN_ERROR = "网络不可用，已暂停请求，稍后自动重试"
+
+    def __init__(self, retry_policy=None, rate_limiter=None, quota=None, breaker=None):
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.rate_limiter = rate_limiter or HostRateLimiter()
+        self.quota = quota or quota_manager
+        self.breaker = breaker or circuit_breaker
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=config.HTTP_POOL_CONNECTIONS, pool_maxsize=config.HTTP_POOL_MAXSIZE)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Accept-Encoding": "gzip, deflate",
+            "Connection": "keep-alive"
+        })
+
+    def get_json(self, url, params, timeout=5, max_retries=None):
+        # 返回 (数据, 错误信息)，数据为HTTP 200响应解析后的JSON
+        if max_retries is None:
+            max_retries = self.retry_policy.max_retries
+        error = self.FAILED_ERROR
+        host = urlsplit(url).netloc
+        endpoint = QuotaManager.get_endpoint(url)
+        cancel_event = get_cancel_event()
+        for retry in range(max_retries):
+            # 调用方已被取消（如界面关闭）时不再发起请求
+            if cancel_event is not None and cancel_event.is_set():
+                raise RequestCancelled(url)
+            if retry:
+                metrics.inc("weather_http_retries_total", endpoint=endpoint)
+            # 主机熔断中时直接失败，不消耗配额，也不等待超时
+            if not self.breaker.allow(host):
+                return None, self.CIRCUIT_OPEN_ERROR
+            # 每次请求（包括重试）都消耗配额，配额不足时直接放弃
+            if not self.quota.acquire(endpoint):
+                metrics.inc("weather_quota_rejected_total", endpoint=endpoint)
+                return None, self.QUOTA_ERROR
+            status = "error"
+            try:
+                with self.rate_limiter.limit(host):
+                    # 耗时不包括限流排队的时间
+                    with metrics.timer("weather_http_request_seconds", endpoint=endpoint):
+                        response = self.session.get(url, params=params, timeout=timeout)
+                status = str(response.status_code)
+                if response.status_code >= 500:
+                    self.breaker.record_failure(host, f"HTTP {response.status_code}")
+                else:
+                    self.breaker.record_success(host)
+                # 解压后的响应大小（requests自动解压gzip，拿不到实际传输的字节数）
+                metrics.inc("weather_http_response_decoded_bytes_total", len(response.content), endpoint=endpoint)
+                if response.status_code == 200:
+                    return response.json(), None
+                error = f"请求失败，状态码: {response.status_code}"
+                if not self.retry_policy.should_retry(response.status_code):
+                    return None, error
+            except requests.Timeout:
+                status = "timeout"
+                error = self.TIMEOUT_ERROR
+                self.breaker.record_failure(host, error)
+            except (requests.RequestException, ValueError) as e:
+                error = f"网络请求异常: {str(e)}"
+                if status == "error":
+                    self.breaker.record_failure(host, error)
+            finally:
+                metrics.inc("weather_http_requests_total", endpoint=endpoint, status=status)
+            # 本次失败使主机熔断时不再重试，调用方改用缓存中的旧数据
+            if self.breaker.is_open(host):
+                return None, self.CIRCUIT_OPEN_ERROR
+            if retry < max_retries - 1:
+                delay = self.retry_policy.get_delay(retry)
+                if cancel_event is None:
+                    time.sleep(delay)
+                elif cancel_event.wait(delay):
+                    raise RequestCancelled(url)
+        return None, error
+
+    def close(self):
+        self.quota.save()
+        self.session.close()
+
+
+api_client = ApiClient()
@@ -0,0 +1,160 @@
+# 运行指标：按接口统计请求耗时分布、重试次数、响应大小（解压后），按缓存类型统计命中情况，以及界面更新耗时
+# 可导出为Prometheus文本格式或JSON，供无界面运行（命令行、定时任务）时查看
+import time
+import threading
+import contextlib
+
+from . import config
+from .serialize import atomic_write, get_json_serializer
+
+
+# 累积直方图：按上界分桶计数，另记总和、次数和最大值
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 最后一个桶为 +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        # 按桶内线性插值估算分位数，落在 +Inf 桶时返回最大值
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets, self.counts):
+            if count and seen + count >= rank:
+                return min(self.max, lower + (bound - lower) * (rank - seen) / count)
+            seen += count
+            lower = bound
+        return self.max
+
+    def to_dict(self):
+        return {"buckets": list(self.buckets), "counts": list(self.counts), "sum": self.sum,
+                "count": self.count, "max": self.max}
+
+
+class MetricsRegistry:
+    def __init__(self, latency_buckets=None):
+        self.latency_buckets = tuple(latency_buckets or config.METRICS_LATENCY_BUCKETS)
+        self.counters = {}  # (指标名, 标签) -> 数值
+        self.histograms = {}  # (指标名, 标签) -> Histogram
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def make_key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        key = self.make_key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = self.make_key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.latency_buckets)
+            histogram.observe(value)
+
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        # 记录代码块的耗时（秒），出现异常时同样记录
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def get_counter(self, name, **labels):
+        with self.lock:
+            return self.counters.get(self.make_key(name, labels), 0)
+
+    def collect(self, name):
+        # 返回某个指标所有标签组合的 [(标签字典, 数值或Histogram副本)]
+        with self.lock:
+            items = [(dict(labels), value) for (metric, labels), value in self.counters.items() if metric == name]
+            for (metric, labels), histogram in self.histograms.items():
+                if metric == name:
+                    copy = Histogram(histogram.buckets)
+                    copy.counts = list(histogram.counts)
+                    copy.sum, copy.count, copy.max = histogram.sum, histogram.count, histogram.max
+                    items.append((dict(labels), copy))
+        return items
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "timestamp": time.time(),
+                "counters": [{"name": name, "labels": dict(labels), "value": value}
+                             for (name, labels), value in sorted(self.counters.items())],
+                "histograms": [dict(histogram.to_dict(), name=name, labels=dict(labels))
+                               for (name, labels), histogram in sorted(self.histograms.items(),
+                                                                       key=lambda item: item[0])],
+            }
+
+    @staticmethod
+    def format_labels(labels, extra=None):
+        pairs = list(labels) + list(extra or [])
+        if not pairs:
+            return ""
+        escaped = [(key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+                   for key, value in pairs]
+        return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+    def to_prometheus(self):
+        # Prometheus文本格式（text/plain; version=0.0.4）
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items(), key=lambda item: item[0])
+            typed = set()
+            for (name, labels), value in counters:
+                if name not in typed:
+                    lines.append(f"# TYPE {name} counter")
+                    typed.add(name)
+                lines.append(f"{name}{self.format_labels(labels)} {value}")
+            for (name, labels), histogram in histograms:
+                if name not in typed:
+                    lines.append(f"# TYPE {name} histogram")
+                    typed.add(name)
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{self.format_labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_sum{self.format_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{self.format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def to_json(self):
+        return get_json_serializer().dumps(self.snapshot())
+
+    def export(self, path):
+        # 按扩展名选择格式：.json 为JSON，其他为Prometheus文本格式
+        if path.endswith(".json"):
+            data = self.to_json()
+        else:
+            data = self.to_prometheus().encode("utf-8")
+        atomic_write(path, data)
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,203 @@
+# 类型化的数据记录：API返回的数值字段（字符串）在构造记录时只解析一次
+# 记录使用 __slots__，不为每个实例创建 __dict__；多城市结果使用按列存储的 WeatherBatch
+import math
+from array import array
+
+
+def parse_float(value):
+    # 缺失或无法解析的数值记为None
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def parse_int(value):
+    number = parse_float(value)
+    return None if number is None else int(number)
+
+def format_number(value):
+    # 与API原始格式一致：整数不带小数点，缺失为空字符串
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+class Record:
+    # 子类定义 FIELDS: ((属性名, API字段名, 解析函数), ...)，__slots__ 与属性名一致
+    __slots__ = ()
+    FIELDS = ()
+
+    def __init__(self, **values):
+        for name, _, _ in self.FIELDS:
+            setattr(self, name, values.get(name))
+
+    @classmethod
+    def from_api(cls, payload):
+        record = cls.__new__(cls)
+        for name, key, parse in cls.FIELDS:
+            value = payload.get(key)
+            setattr(record, name, parse(value) if parse else value)
+        return record
+
+    def to_api(self):
+        # 转回API格式的字典（数值为字符串），用于缓存和JSON输出
+        result = {}
+        for name, key, parse in self.FIELDS:
+            value = getattr(self, name)
+            if value is not None:
+                result[key] = format_number(value) if parse else value
+        return result
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name, _, _ in self.FIELDS)
+
+    def __repr__(self):
+        values = ", ".join(f"{name}={getattr(self, name)!r}" for name, _, _ in self.FIELDS)
+        return f"{type(self).__name__}({values})"
+
+
+# 实时天气（/v7/weather/now 的 now 字段）
+class NowWeather(Record):
+    FIELDS = (
+        ("obs_time", "obsTime", None),
+        ("text", "text", None),
+        ("icon", "icon", None),
+        ("temp", "temp", parse_float),
+        ("feels_like", "feelsLike", parse_float),
+        ("wind360", "wind360", parse_int),
+        ("wind_dir", "windDir", None),
+        ("wind_scale", "windScale", None),  # 可能是 "1-2" 这样的范围，保留字符串
+        ("wind_speed", "windSpeed", parse_float),
+        ("humidity", "humidity", parse_float),
+        ("precip", "precip", parse_float),
+        ("pressure", "pressure", parse_float),
+        ("vis", "vis", parse_float),
+        ("cloud", "cloud", parse_float),
+        ("dew", "dew", parse_float),
+    )
+    __slots__ = tuple(name for name, _, _ in FIELDS)
+
+
+# 逐日预报（/v7/weather/3d、7d 等的 daily 列表中的一项）
+class DailyForecast(Record):
+    FIELDS = (
+        ("fx_date", "fxDate", None),
+        ("text_day", "textDay", None),
+        ("text_night", "textNight", None),
+        ("icon_day", "iconDay", None),
+        ("icon_night", "iconNight", None),
+        ("temp_max", "tempMax", parse_float),
+        ("temp_min", "tempMin", parse_float),
+        ("wind_dir_day", "windDirDay", None),
+        ("wind_scale_day", "windScaleDay", None),
+        ("wind_speed_day", "windSpeedDay", parse_float),
+        ("humidity", "humidity", parse_float),
+        ("precip", "precip", parse_float),
+        ("pressure", "pressure", parse_float),
+        ("uv_index", "uvIndex", parse_int),
+    )
+    __slots__ = tuple(name for name, _, _ in FIELDS)
+
+
+# 逐小时预报（/v7/weather/24h 等的 hourly 列表中的一项）
+class HourlyForecast(Record):
+    FIELDS = (
+        ("fx_time", "fxTime", None),
+        ("text", "text", None),
+        ("icon", "icon", None),
+        ("temp", "temp", parse_float),
+        ("wind360", "wind360", parse_int),
+        ("wind_dir", "windDir", None),
+        ("wind_scale", "windScale", None),
+        ("wind_speed", "windSpeed", parse_float),
+        ("humidity", "humidity", parse_float),
+        ("pop", "pop", parse_float),  # 降水概率（%），部分地区没有该字段
+        ("precip", "precip", parse_float),
+        ("pressure", "pressure", parse_float),
+        ("cloud", "cloud", parse_float),
+        ("dew", "dew", parse_float),
+    )
+    __slots__ = tuple(name for name, _, _ in FIELDS)
+
+
+# 生活指数（/v7/indices/1d 的 daily 列表中的一项，缓存中只保存 level 和 category）
+class LifeIndex(Record):
+    FIELDS = (
+        ("type", "type", None),
+        ("name", "name", None),
+        ("level", "level", parse_int),
+        ("category", "category", None),
+        ("text", "text", None),
+    )
+    __slots__ = tuple(name for name, _, _ in FIELDS)
+
+
+# 多城市实时天气的批量容器：数值字段按列存入 array('d')，缺失值为NaN
+# 相比每个城市一棵字典树，内存占用小，按列统计时也不需要再解析字符串
+class WeatherBatch:
+    NUMERIC_FIELDS = ("temp", "feels_like", "wind_speed", "humidity", "precip", "pressure", "vis", "cloud")
+    TEXT_FIELDS = ("obs_time", "text", "icon", "wind_dir", "wind_scale")
+    __slots__ = ("city_ids", "columns", "errors", "positions")
+
+    def __init__(self):
+        self.city_ids = []
+        self.columns = {name: array("d") for name in self.NUMERIC_FIELDS}
+        self.columns.update({name: [] for name in self.TEXT_FIELDS})
+        self.errors = {}  # 城市ID -> 错误信息
+        self.positions = {}  # 城市ID -> 行号
+
+    @classmethod
+    def from_results(cls, results):
+        # results: {城市ID: (实时天气字典, 错误信息)}，即 api.get_weather 逐个城市的返回值
+        # （同步的 api.get_weather_batch 汇总的结果，或异步的 AsyncWeatherClient.get_weather_many 的返回值）
+        batch = cls()
+        for city_id, (data, error) in results.items():
+            if data:
+                batch.append(city_id, data)
+            else:
+                batch.errors[city_id] = error
+        return batch
+
+    def append(self, city_id, now):
+        # now 可以是API字典或 NowWeather；字典直接按列解析，不创建中间记录
+        if isinstance(now, NowWeather):
+            values = {name: getattr(now, name) for name in self.NUMERIC_FIELDS + self.TEXT_FIELDS}
+        else:
+            values = {name: now.get(key) for name, key, _ in NowWeather.FIELDS}
+        for name in self.NUMERIC_FIELDS:
+            value = parse_float(values[name])
+            self.columns[name].append(math.nan if value is None else value)
+        for name in self.TEXT_FIELDS:
+            self.columns[name].append(values[name])
+        self.positions[city_id] = len(self.city_ids)
+        self.city_ids.append(city_id)
+
+    def __len__(self):
+        return len(self.city_ids)
+
+    def __contains__(self, city_id):
+        return city_id in self.positions
+
+    def column(self, name):
+        return self.columns[name]
+
+    def get(self, city_id):
+        # 按城市取出一条 NowWeather（只包含批量容器保存的字段），不存在时返回None
+        row = self.positions.get(city_id)
+        if row is None:
+            return None
+        values = {name: self.columns[name][row] for name in self.TEXT_FIELDS}
+        for name in self.NUMERIC_FIELDS:
+            value = self.columns[name][row]
+            values[name] = None if math.isnan(value) else value
+        return NowWeather(**values)
+
+    def items(self):
+        for city_id in self.city_ids:
+            yield city_id, self.get(city_id)
@@ -0,0 +1,184 @@
+# 预取：在后台让用户接下来可能查看的城市（历史记录中靠前的城市）的缓存保持新鲜，
+# 以及命令行 --warm-cache 批量预热缓存
+# 预取的优先级低于前台查询：每轮有请求数预算，前台有请求时暂停，剩余配额不足时停止
+# 预算按配额管理器记录的实际HTTP请求数（含重试）扣减，而不是按取数的次数
+import time
+import threading
+
+from . import config
+from .api import get_city_id, fetch_weather, fetch_3day_forecast, get_life_indices_batch
+from .breaker import circuit_breaker
+from .cache import CacheManager, get_cache_ttl, get_city_cache_key
+from .cities import city_index
+from .concurrency import BackgroundRefresher
+from .metrics import metrics
+from .quota import quota_manager
+
+# 预取的数据类型（缓存类型），生活指数一次请求获取全部类型
+PREFETCH_PARTS = ("weather", "forecast", "index")
+MAX_RETRIES = 3  # 与前台请求相同的重试次数，剩余预算不足时减少
+
+
+def used_requests():
+    # 当日已发起的请求数（每次重试都占用一次配额）
+    return quota_manager.get_status()["used_today"]
+
+
+class Prefetcher:
+    def __init__(self, max_requests=None, margin=None, is_paused=None):
+        # max_requests为None时使用配置的每轮预算，为0时不限制（只受配额余量限制）
+        self.max_requests = config.PREFETCH_MAX_REQUESTS if max_requests is None else max_requests
+        self.margin = config.PREFETCH_MARGIN if margin is None else margin
+        self.is_paused = is_paused  # 返回True时表示前台有请求，预取暂停
+        self.stop_event = threading.Event()
+        self.last_stats = None
+        # 预取可能因前台请求暂停较长时间，使用独立的线程，不占用过期缓存的后台刷新线程
+        self.worker = BackgroundRefresher(max_workers=1)
+
+    @staticmethod
+    def resolve_city(city_name):
+        # 只用本地城市索引和缓存解析城市ID，不发起请求；解析不到时返回None
+        city = city_index.lookup(city_name)
+        if city:
+            return city["id"]
+        cached_data = CacheManager.get_from_cache(get_city_cache_key(city_name), "city")
+        return cached_data["id"] if cached_data else None
+
+    def needs_refresh(self, city_id, cache_type, now):
+        # 缓存缺失、已过期或在 margin 秒内即将过期时需要预取
+        if cache_type == "index":
+            keys = [f"{city_id}_{index_id}" for index_id in config.LIFE_INDICES]
+        else:
+            keys = [city_id]
+        for key in keys:
+            timestamp = CacheManager.get_entry_time(key, cache_type)
+            if timestamp is None or timestamp + get_cache_ttl(cache_type) - now < self.margin:
+                return True
+        return False
+
+    def plan(self, city_ids, parts=PREFETCH_PARTS):
+        # 返回需要请求的 [(数据类型, 城市ID)]，靠前的城市优先
+        now = time.time()
+        return [(cache_type, city_id) for city_id in city_ids for cache_type in parts
+                if self.needs_refresh(city_id, cache_type, now)]
+
+    @staticmethod
+    def fetch(cache_type, city_id, max_retries=MAX_RETRIES):
+        # 跳过缓存直接请求并写入缓存，返回是否成功；与前台的相同请求合并为一次
+        if cache_type == "weather":
+            return fetch_weather(city_id, max_retries=max_retries)[1] is None
+        if cache_type == "forecast":
+            return fetch_3day_forecast(city_id, max_retries=max_retries)[1] is None
+        return get_life_indices_batch(city_id, list(config.LIFE_INDICES), max_retries=max_retries) is not None
+
+    def get_max_retries(self, spent):
+        # 有预算时重试次数不超过剩余预算，最后一次取数也不会超支
+        if not self.max_requests:
+            return MAX_RETRIES
+        return max(1, min(MAX_RETRIES, self.max_requests - spent))
+
+    @staticmethod
+    def check_quota():
+        # 给前台查询留出配额余量，余量不足时返回原因
+        status = quota_manager.get_status()
+        if status["remaining_today"] < config.PREFETCH_QUOTA_RESERVE:
+            return "当日剩余配额不足"
+        if status["remaining_minute"] < config.PREFETCH_MINUTE_RESERVE:
+            return "当前分钟配额不足"
+        return None
+
+    @staticmethod
+    def check_network():
+        # 有主机处于熔断状态时不预取，探测请求留给前台
+        return "网络不可用" if circuit_breaker.open_hosts() else None
+
+    def wait_foreground(self):
+        # 前台有请求时等待其结束；等待超过 PREFETCH_MAX_PAUSE 或被停止时返回False
+        if self.is_paused is None:
+            return not self.stop_event.is_set()
+        deadline = time.monotonic() + config.PREFETCH_MAX_PAUSE
+        while self.is_paused():
+            if time.monotonic() > deadline:
+                return False
+            if self.stop_event.wait(config.PREFETCH_PAUSE_POLL):
+                return False
+        return not self.stop_event.is_set()
+
+    def run(self, city_ids, parts=PREFETCH_PARTS):
+        # 执行一轮预取，返回统计：计划取数的次数、成功数、失败数、实际发起的请求数和提前结束的原因
+        plan = self.plan(city_ids, parts)
+        stats = {"cities": len(city_ids), "planned": len(plan), "fetched": 0, "failed": 0, "requests": 0,
+                 "stopped": None}
+        for position, (cache_type, city_id) in enumerate(plan):
+            if self.max_requests and stats["requests"] >= self.max_requests:
+                stats["stopped"] = "达到请求预算"
+                break
+            # 相邻请求之间留出间隔，不与前台请求争抢连接和配额
+            if position and self.stop_event.wait(config.PREFETCH_REQUEST_INTERVAL):
+                stats["stopped"] = "已停止"
+                break
+            if not self.wait_foreground():
+                stats["stopped"] = "已停止" if self.stop_event.is_set() else "前台请求未结束"
+                break
+            reason = self.check_network() or self.check_quota()
+            if reason:
+                stats["stopped"] = reason
+                break
+            # 按配额计数的增量扣减预算：重试都计入，与前台合并的请求不计入
+            # 取数期间其他线程发起的请求也会计入，预算只会被多扣，不会超支
+            used = used_requests()
+            ok = self.fetch(cache_type, city_id, self.get_max_retries(stats["requests"]))
+            stats["requests"] += max(0, used_requests() - used)
+            stats["fetched" if ok else "failed"] += 1
+            metrics.inc("weather_prefetch_requests_total", cache_type=cache_type, result="ok" if ok else "error")
+        self.last_stats = stats
+        return stats
+
+    def run_for_names(self, city_names, exclude=(), parts=PREFETCH_PARTS):
+        # 按城市名称预取（界面的历史记录），本地无法解析的城市跳过
+        city_ids = []
+        for city_name in city_names:
+            city_id = self.resolve_city(city_name)
+            if city_id and city_id not in exclude and city_id not in city_ids:
+                city_ids.append(city_id)
+        return self.run(city_ids, parts)
+
+    def submit(self, city_names, exclude=()):
+        # 在预取线程中执行一轮 run_for_names，上一轮未结束时不重复提交
+        return self.worker.submit(("prefetch",), self.run_for_names, city_names, exclude)
+
+    def stop(self):
+        self.stop_event.set()
+        self.worker.shutdown()
+
+
+def warm_cache(city_names, parts=PREFETCH_PARTS, max_requests=0, margin=None):
+    # 批量预热缓存（命令行 --warm-cache）：本地无法解析的城市通过城市搜索API查询，同样计入请求预算
+    prefetcher = Prefetcher(max_requests=max_requests, margin=margin)
+    city_ids = []
+    unresolved = []
+    lookups = 0
+    spent = 0
+    start = used_requests()
+    for city_name in city_names:
+        city_id = Prefetcher.resolve_city(city_name)
+        if city_id is None and not (max_requests and spent >= max_requests):
+            lookups += 1
+            city_id, _ = get_city_id(city_name, max_retries=prefetcher.get_max_retries(spent))
+            spent = max(0, used_requests() - start)
+        if city_id:
+            if city_id not in city_ids:
+                city_ids.append(city_id)
+        else:
+            unresolved.append(city_name)
+    exhausted = bool(max_requests) and spent >= max_requests
+    if max_requests and not exhausted:
+        prefetcher.max_requests = max_requests - spent
+    stats = prefetcher.run([] if exhausted else city_ids, parts)
+    if exhausted and city_ids:
+        stats["cities"] = len(city_ids)
+        stats["stopped"] = "达到请求预算"
+    stats["lookups"] = lookups
+    stats["requests"] += spent
+    stats["unresolved"] = unresolved
+    return stats
@@ -0,0 +1,154 @@
+import os
+import time
+import threading
+from datetime import date
+
+from . import config
+from .serialize import dump_json_file, load_json_file
+
+
+# 令牌桶：按固定速率补充令牌，容量决定允许的突发请求数
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate  # 每秒补充的令牌数
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self):
+        # 距离下一个令牌可用还需等待的时间（秒）
+        self.refill()
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def consume(self):
+        self.tokens -= 1
+
+
+# 配额管理：全局和各接口的每分钟令牌桶 + 每日次数统计，所有接口请求共用
+class QuotaManager:
+    def __init__(self, per_day=None, per_minute=None, endpoint_per_minute=None):
+        self.per_day = per_day if per_day is not None else config.QUOTA_PER_DAY
+        per_minute = per_minute if per_minute is not None else config.QUOTA_PER_MINUTE
+        if endpoint_per_minute is None:
+            endpoint_per_minute = config.QUOTA_ENDPOINT_PER_MINUTE
+        self.minute_bucket = TokenBucket(per_minute / 60, per_minute)
+        self.endpoint_buckets = {
+            endpoint: TokenBucket(limit / 60, limit) for endpoint, limit in endpoint_per_minute.items()
+        }
+        self.day = None
+        self.used_today = 0
+        self.endpoint_used = {}
+        self.shed_count = 0
+        self.last_saved = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def get_endpoint(url):
+        # "https://devapi.qweather.com/v7/weather/now" -> "weather/now"
+        parts = url.rstrip("/").split("/")
+        return "/".join(parts[-2:])
+
+    def reserve(self, endpoint, autosave=True):
+        # 尝试占用一次请求配额：返回0表示可以请求，正数表示需等待的秒数，None表示当天配额已用完
+        # autosave为False时不在这里写文件，由调用方通过 claim_save 决定何时保存（异步客户端放到线程池中保存）
+        with self.lock:
+            self.check_day()
+            if self.used_today >= self.per_day:
+                self.shed_count += 1
+                return None
+            buckets = [self.minute_bucket]
+            if endpoint in self.endpoint_buckets:
+                buckets.append(self.endpoint_buckets[endpoint])
+            wait = max(bucket.wait_time() for bucket in buckets)
+            if wait > 0:
+                return wait
+            for bucket in buckets:
+                bucket.consume()
+            self.used_today += 1
+            self.endpoint_used[endpoint] = self.endpoint_used.get(endpoint, 0) + 1
+        if autosave and self.claim_save():
+            self.save()
+        return 0
+
+    def claim_save(self):
+        # 距上次保存超过5秒时返回True，调用方负责随后调用save；并发调用时只有一个调用方得到True
+        with self.lock:
+            if self.day is None or time.monotonic() - self.last_saved <= 5:
+                return False
+            self.last_saved = time.monotonic()
+            return True
+
+    def acquire(self, endpoint, max_wait=None):
+        # 阻塞等待配额，最多等待max_wait秒；配额不足时返回False（请求被放弃）
+        if max_wait is None:
+            max_wait = config.QUOTA_MAX_WAIT
+        deadline = time.monotonic() + max_wait
+        while True:
+            wait = self.reserve(endpoint)
+            if wait == 0:
+                return True
+            if wait is None:
+                return False
+            if time.monotonic() + wait > deadline:
+                with self.lock:
+                    self.shed_count += 1
+                return False
+            time.sleep(wait)
+
+    def check_day(self):
+        # 跨天时重置当日计数；首次调用时从文件恢复当天已用次数
+        today = date.today().isoformat()
+        if self.day == today:
+            return
+        if self.day is None:
+            state = self.load_state()
+            if state.get("day") == today:
+                self.used_today = state.get("used", 0)
+                self.endpoint_used = state.get("endpoints", {})
+                self.day = today
+                return
+        self.day = today
+        self.used_today = 0
+        self.endpoint_used = {}
+
+    def get_state_path(self):
+        return os.path.join(config.CACHE_DIR, config.QUOTA_STATE_FILE)
+
+    def load_state(self):
+        try:
+            return load_json_file(self.get_state_path()) or {}
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        with self.lock:
+            # 本次运行还没有发起过请求时不写入，避免覆盖文件中当天已用的次数
+            if self.day is None:
+                return
+            self.last_saved = time.monotonic()
+            state = {"day": self.day, "used": self.used_today, "endpoints": dict(self.endpoint_used)}
+        try:
+            dump_json_file(self.get_state_path(), state)
+        except OSError:
+            pass
+
+    def get_status(self):
+        # 当前配额状态：当日剩余次数、当前分钟可用次数等
+        with self.lock:
+            self.check_day()
+            self.minute_bucket.refill()
+            return {
+                "used_today": self.used_today,
+                "remaining_today": max(0, self.per_day - self.used_today),
+                "remaining_minute": int(self.minute_bucket.tokens),
+                "endpoints": dict(self.endpoint_used),
+                "shed": self.shed_count
+            }
+
+
+quota_manager = QuotaManager()
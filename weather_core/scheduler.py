@@ -0,0 +1,84 @@
+import time
+import threading
+from datetime import datetime
+
+from . import config
+from .cache import CacheManager, get_cache_ttl
+
+
+def parse_api_time(value):
+    # "2026-10-16T09:50+08:00" -> 时间戳，无法解析时返回None
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+# 刷新计划：按数据的观测/写入时间和各类数据的TTL，计算每个 (数据类型, 城市) 下一次应刷新的时间
+class RefreshPlanner:
+    def __init__(self, min_interval=None, align=None):
+        self.min_interval = config.REFRESH_MIN_INTERVAL if min_interval is None else min_interval
+        self.align = config.REFRESH_ALIGN if align is None else align
+        self.plans = {}  # (数据类型, 城市ID) -> (计划时间, 到期时间)
+        self.backoff = 1
+        self.lock = threading.Lock()
+
+    def plan(self, cache_type, city_id, obs_time=None, now=None, cache_key=None):
+        # 数据在缓存中写入后经过TTL到期；实时天气如果能从obsTime推算出下一次观测，则在其发布后刷新
+        # cache_key 默认按数据类型推算，缓存键带有天数、小时数等选项时由调用方传入
+        now = time.time() if now is None else now
+        cache_key = cache_key or self.get_cache_key(cache_type, city_id)
+        fetched_at = CacheManager.get_entry_time(cache_key, cache_type) or now
+        due = fetched_at + get_cache_ttl(cache_type)
+        observed_at = parse_api_time(obs_time)
+        if observed_at is not None:
+            next_observation = observed_at + config.OBS_UPDATE_INTERVAL + config.OBS_UPDATE_LAG
+            if next_observation > fetched_at:
+                due = min(due, next_observation)
+        due = max(due, now + self.min_interval)
+        
+        # 向上对齐，让相近时间到期的刷新合并为一批
+        if self.align > 0:
+            due = (int(due) // self.align + 1) * self.align
+        with self.lock:
+            self.plans[(cache_type, city_id)] = (now, due)
+        return due
+
+    @staticmethod
+    def get_cache_key(cache_type, city_id):
+        # 生活指数按类型分别缓存，以第一个指数的写入时间为准
+        if cache_type == "index":
+            return f"{city_id}_{next(iter(config.LIFE_INDICES))}"
+        return city_id
+
+    def effective_due(self, planned_at, due):
+        # 窗口隐藏时按倍数放大刷新间隔
+        return planned_at + (due - planned_at) * self.backoff
+
+    def next_due(self):
+        with self.lock:
+            if not self.plans:
+                return None
+            return min(self.effective_due(*plan) for plan in self.plans.values())
+
+    def pop_due(self, now=None):
+        # 取出所有已到期的刷新项；对齐窗口内即将到期的也一并取出，合并为一批
+        now = time.time() if now is None else now
+        with self.lock:
+            items = [key for key, plan in self.plans.items()
+                     if self.effective_due(*plan) <= now + self.align / 2]
+            for key in items:
+                del self.plans[key]
+        return items
+
+    def forget(self, city_id, cache_types=None):
+        with self.lock:
+            for key in list(self.plans):
+                if key[1] == city_id and (cache_types is None or key[0] in cache_types):
+                    del self.plans[key]
+
+    def set_backoff(self, backoff):
+        with self.lock:
+            self.backoff = max(1, backoff)
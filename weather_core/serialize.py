@@ -0,0 +1,117 @@
+# 序列化：优先使用 orjson / msgpack，未安装时退回标准库json
+# 状态文件（历史记录、最后查询的城市等）写入临时文件后再原子替换，写到一半崩溃也不会损坏原文件
+import os
+import json
+import tempfile
+
+from . import config
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 可选依赖
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - 可选依赖
+    msgpack = None
+
+
+# 标准库json，输出UTF-8字节
+class StdJsonSerializer:
+    name = "json"
+    binary = False
+
+    @staticmethod
+    def dumps(obj):
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    @staticmethod
+    def loads(data):
+        return json.loads(data)
+
+
+# orjson：输出与标准库兼容的JSON，速度快数倍
+class OrjsonSerializer:
+    name = "orjson"
+    binary = False
+
+    @staticmethod
+    def dumps(obj):
+        return orjson.dumps(obj)
+
+    @staticmethod
+    def loads(data):
+        return orjson.loads(data)
+
+
+# msgpack：二进制格式，体积更小；只用于缓存数据库，状态文件仍使用JSON
+class MsgpackSerializer:
+    name = "msgpack"
+    binary = True
+
+    @staticmethod
+    def dumps(obj):
+        return msgpack.packb(obj, use_bin_type=True)
+
+    @staticmethod
+    def loads(data):
+        return msgpack.unpackb(data, raw=False)
+
+
+def get_json_serializer():
+    return OrjsonSerializer if orjson is not None else StdJsonSerializer
+
+def get_serializer(name=None):
+    # 按配置选择缓存数据的序列化方式；"auto" 优先 orjson，其次 msgpack，最后标准库json
+    # 指定的库未安装时退回标准库json
+    name = name or config.CACHE_SERIALIZER
+    if name == "auto":
+        if orjson is not None:
+            return OrjsonSerializer
+        if msgpack is not None:
+            return MsgpackSerializer
+        return StdJsonSerializer
+    if name == "orjson" and orjson is not None:
+        return OrjsonSerializer
+    if name == "msgpack" and msgpack is not None:
+        return MsgpackSerializer
+    return StdJsonSerializer
+
+def loads_any(data):
+    # 读取缓存数据库中的条目：文本为JSON，二进制为msgpack（切换序列化方式后旧数据仍可读取）
+    if isinstance(data, bytes):
+        if msgpack is None:
+            raise ValueError("缓存条目为msgpack格式，需要安装msgpack")
+        return MsgpackSerializer.loads(data)
+    return get_json_serializer().loads(data)
+
+def atomic_write(path, data):
+    # 写入同目录下的临时文件并刷到磁盘，再用 os.replace 原子替换目标文件
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=os.path.basename(path))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+def dump_json_file(path, obj):
+    atomic_write(path, get_json_serializer().dumps(obj))
+
+def load_json_file(path):
+    # 文件不存在时返回None，内容损坏时抛出ValueError
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    return get_json_serializer().loads(data)